@@ -3,7 +3,30 @@ import os
 import sys
 import logging
 import json
+import argparse
+from src.errors import UpdateError, UpToDate
 from src.file_handler import FileHandler
+from src.engine import UpdateEngine
+from src.watcher import Watcher, load_watch_settings
+from src.audit import audit_installed, print_audit_report
+from src.importer import import_appimages, print_import_report
+from src.locks import LOCK_POLICIES, LockBusy
+from src.peers import (
+    DEFAULT_PORT,
+    PeerClient,
+    PeerIndex,
+    load_peer_settings,
+    make_server,
+)
+from src.planner import format_eta, format_size
+from src.probe import load_probe_settings
+from src.progress import (
+    DEFAULT_INTERVAL,
+    PROGRESS_MODES,
+    configure_progress,
+    load_progress_settings,
+)
+from src.speculative import SpeculativeCheck
 import gettext
 from babel.support import Translations
 
@@ -141,11 +164,36 @@ def run_functions(file_handler, function_list):
             sys.exit()
 
 
-def choice_update(file_handler, functions):
+def run_locked(file_handler, function_list):
+    """Run the functions holding the lock of file_handler.repo, so they never
+    write {repo}.json while an update run works on the app"""
+    locks = UpdateEngine.from_file_handler(file_handler).locks
+    try:
+        with locks.editing(file_handler.repo):
+            run_functions(file_handler, function_list)
+    except LockBusy:
+        print(
+            _("{repo} is being updated by another run, try again later.").format(
+                repo=file_handler.repo
+            )
+        )
+        sys.exit(1)
+
+
+def choice_update(file_handler, speculation=None):
     """Handle choice 1: Update existing AppImage"""
     file_handler.list_json_files()
+    if speculation is not None:
+        # the release of the picked app is likely fetched already
+        speculation.cancel()
     if file_handler.choice in [3, 4]:
-        run_functions(file_handler, functions[file_handler.choice])
+        engine = (
+            speculation.engine
+            if speculation is not None
+            else UpdateEngine.from_file_handler(file_handler)
+        )
+        results = engine.run(engine.jobs([file_handler.repo], batch_mode=False))
+        print_results(results)
 
 
 def choice_download(file_handler, functions):
@@ -156,7 +204,416 @@ def choice_download(file_handler, functions):
     print(_("1. Backup old appimage and download new appimage"))
     print(_("2. Download new appimage and overwrite old appimage"))
     file_handler.choice = int(input(_("Enter your choice: ")))
-    run_functions(file_handler, functions[file_handler.choice])
+    function_list = functions[file_handler.choice]
+    # the repo is known from here on, its config is written under its lock
+    known = function_list.index("learn_owner_repo") + 1
+    run_functions(file_handler, function_list[:known])
+    run_locked(file_handler, function_list[known:])
+
+
+def ask_batch_mode(file_handler):
+    """Return the saved batch mode, ask for it and save it the first time"""
+    batch_mode = file_handler.load_batch_mode()
+
+    if batch_mode is None:  # If no saved value is found, prompt for it
+        batch_mode = (
+            input(
+                _("Enable batch mode to continue without asking for approval? (y/n): ")
+            ).lower()
+            == "y"
+        )
+        # Save the batch_mode value to a file
+        file_handler.save_batch_mode(batch_mode)
+
+    if batch_mode:
+        print(
+            _(
+                "Batch mode is enabled. All selected appimages will be updated without further prompts."
+            )
+        )
+    else:
+        print(
+            _("Batch mode is disabled. You will be prompted for each appimage update.")
+        )
+    return batch_mode
+
+
+def print_results(results):
+    """Print the outcome of an update"""
+    print("=================================================")
+    for result in results:
+        if result.status == "updated":
+            print(_("\033[42m{repo} updated\033[0m").format(repo=result.repo))
+        elif result.status == "up_to_date":
+            print(_("{repo} is up to date").format(repo=result.repo))
+        elif result.status == "staged":
+            print(
+                _(
+                    "\033[42m{repo} {version} downloaded and ready to install\033[0m"
+                ).format(repo=result.repo, version=result.version)
+            )
+        elif result.status == "skipped":
+            print(_("{repo} skipped").format(repo=result.repo))
+        else:
+            print(
+                _("\033[41;30m{repo} not updated ({message})\033[0m").format(
+                    repo=result.repo, message=result.message
+                )
+            )
+    print("=================================================")
+    print(_("Update process completed for all selected appimages."))
+
+
+def print_plan(plan):
+    """Print the update order, the total download size and the ETA"""
+    print("=================================================")
+    print(_("Update plan:"))
+    for idx, job in enumerate(plan.scheduled, start=1):
+        print(
+            _("{idx}. {repo} {version} ({size}, ~{eta})").format(
+                idx=idx,
+                repo=job.repo,
+                version=job.version,
+                size=("~" if job.estimated else "") + format_size(job.size),
+                eta=format_eta(job.eta),
+            )
+        )
+    print(
+        _("Total: {size}, estimated time: {eta}").format(
+            size=format_size(plan.total_bytes), eta=format_eta(plan.eta)
+        )
+    )
+    for job in plan.deferred:
+        print(
+            _(
+                "\033[43m{repo} ({size}) doesn't fit the budget, deferred to the next run\033[0m"
+            ).format(repo=job.repo, size=format_size(job.size))
+        )
+    print("=================================================")
+
+
+# INFO: Cause API RATE LIMIT EXCEEDED if used more than 15 - 20 times
+def choice_update_all(file_handler, speculation=None):
+    """Handle choice 4: Check all config files and update the selected ones"""
+    engine = (
+        speculation.engine
+        if speculation is not None
+        else UpdateEngine.from_file_handler(file_handler)
+    )
+    configs = engine.configs()
+    if engine.has_interrupted_run():
+        print(
+            _(
+                "\033[43mThe last update run was interrupted, run 'my-unicorn resume' to continue it\033[0m"
+            )
+        )
+
+    # Output the list of JSON files found
+    if configs:
+        print(
+            _("Found the following config files in the\n[{file_path}]:").format(
+                file_path=file_handler.file_path
+            )
+        )
+        for config in configs:
+            print(_("- {json_file}").format(json_file=f"{config.repo}.json"))
+    else:
+        print(_("No JSON files found in the directory."))
+
+    # A full check, every config is compared with its latest release and
+    # failures don't stop the rest. The check started with the menu is
+    # usually done by now.
+    results = speculation.results(configs) if speculation is not None else None
+    if results is None:
+        results = engine.check(configs)
+    appimages_to_update = []
+    outdated_results = {}
+    for config, result in zip(configs, results):
+        if result.status == "failed":
+            print(
+                _("\033[41;30mCouldn't check {repo}: {error}\033[0m").format(
+                    repo=config.repo, error=result.message
+                )
+            )
+        elif result.status == "up_to_date":
+            print(_("{appimage} is up to date").format(appimage=config.appimage))
+        else:
+            print("-------------------------------------------------")
+            print(_("{appimage} is not up to date").format(appimage=config.appimage))
+            print(
+                _("\033[42mLatest version: {version}\033[0m").format(
+                    version=result.version
+                )
+            )
+            print(_("Current version: {version}").format(version=config.version))
+            print("-------------------------------------------------")
+            appimages_to_update.append(config.repo)
+            outdated_results[config.repo] = result
+
+    # If all appimages are up to date
+    if not appimages_to_update:
+        print(_("All appimages are up to date"))
+        sys.exit()
+
+    # Display the list of appimages to update
+    print("=================================================")
+    print(_("Appimages that are not up to date:"))
+    for idx, appimage in enumerate(appimages_to_update, start=1):
+        print(
+            _("{idx}. {appimage} ({size})").format(
+                idx=idx,
+                appimage=appimage,
+                size=format_size(outdated_results[appimage].size),
+            )
+        )
+    print("=================================================")
+
+    # Ask the user to select which appimages to update or skip
+    user_input = (
+        input(
+            _(
+                "Enter the numbers of the appimages you want to update (comma-separated) or type 'skip' to skip updates: "
+            )
+        )
+        .strip()
+        .lower()
+    )
+
+    if user_input == "skip":
+        print(_("No updates will be performed."))
+        sys.exit()
+
+    selected_indices = [int(idx.strip()) - 1 for idx in user_input.split(",")]
+    selected_appimages = [appimages_to_update[idx] for idx in selected_indices]
+
+    # Smallest downloads first, whatever doesn't fit the budget waits
+    plan = engine.plan([outdated_results[repo] for repo in selected_appimages])
+    print_plan(plan)
+    if not plan.scheduled:
+        sys.exit()
+
+    # Update the selected appimages
+    batch_mode = ask_batch_mode(file_handler)
+    print_results(engine.run(engine.jobs(plan.repos, batch_mode=batch_mode)))
+
+
+def parse_arguments():
+    """Parse the command line, without a command the interactive menu is shown"""
+    parser = argparse.ArgumentParser(
+        prog="my-unicorn", description="Install and update AppImages"
+    )
+    parser.add_argument(
+        "--progress",
+        choices=PROGRESS_MODES,
+        help="progress output: bars, json lines or none (default: auto)",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    watch = subparsers.add_parser(
+        "watch", help="keep running and re-check the appimages on a schedule"
+    )
+    watch.add_argument("--interval", type=float, help="minutes between checks")
+    watch.add_argument(
+        "--jitter", type=float, help="random +/- seconds added to each interval"
+    )
+    watch.add_argument(
+        "--full-check",
+        action="store_true",
+        default=None,
+        help="check every repo on every cycle, ignore the release cadence",
+    )
+    watch.add_argument(
+        "--lock-policy",
+        choices=LOCK_POLICIES,
+        help="when another run is active: wait for it, skip this update or split the apps",
+    )
+    watch.add_argument(
+        "--auto-update",
+        action="store_true",
+        default=None,
+        help="apply updates without prompting",
+    )
+
+    audit = subparsers.add_parser(
+        "audit", help="verify the installed appimages against their install digests"
+    )
+    audit.add_argument(
+        "--full", action="store_true", help="re-hash every file, ignore the cache"
+    )
+    audit.add_argument("--workers", type=int, help="number of hashing processes")
+
+    importer = subparsers.add_parser(
+        "import", help="create config files for the appimages already in a folder"
+    )
+    importer.add_argument("folder", help="folder with the appimages")
+    importer.add_argument(
+        "--hash-type",
+        default="sha256",
+        choices=["sha256", "sha512"],
+        help="hash recorded as the installed digest",
+    )
+    importer.add_argument("--workers", type=int, help="number of scanning processes")
+    importer.add_argument(
+        "--dry-run", action="store_true", help="only show what would be imported"
+    )
+
+    serve = subparsers.add_parser(
+        "serve", help="share the verified appimages with other hosts on the LAN"
+    )
+    serve.add_argument("--bind", help="address to listen on (default 0.0.0.0)")
+    serve.add_argument("--port", type=int, help=f"port (default {DEFAULT_PORT})")
+
+    subparsers.add_parser(
+        "prefetch",
+        help="download and verify pending updates now, install them on the next update",
+    )
+    subparsers.add_parser("resume", help="continue an update run that was interrupted")
+    subparsers.add_parser("peers", help="list the LAN peers and their latency")
+    subparsers.add_parser(
+        "fleet", help="show the fleet members and the repos this host checks"
+    )
+    return parser.parse_args()
+
+
+def run_command(args):
+    """Run a non-interactive command from the command line"""
+    if args.command == "watch":
+        settings = load_watch_settings(file_handler.config_watch_path)
+        interval = args.interval or settings.get("interval_minutes", 60)
+        jitter = (
+            args.jitter
+            if args.jitter is not None
+            else settings.get("jitter_seconds", 300)
+        )
+        watcher = Watcher(
+            file_handler,
+            interval=interval * 60,
+            jitter=jitter,
+            auto_update=bool(args.auto_update or settings.get("auto_update", False)),
+            full_check=bool(args.full_check or settings.get("full_check", False)),
+            lock_policy=args.lock_policy,
+        )
+        watcher.run()
+    elif args.command == "audit":
+        results = audit_installed(
+            file_handler.file_path,
+            file_handler.digest_cache,
+            workers=args.workers,
+            full=args.full,
+        )
+        if not print_audit_report(results):
+            sys.exit(1)
+    elif args.command == "import":
+        locks = UpdateEngine.from_file_handler(file_handler).locks
+        try:
+            # renames files and writes configs, keep update runs out meanwhile
+            with locks.exclusive_lock():
+                results = import_appimages(
+                    args.folder,
+                    file_handler.file_path,
+                    file_handler.digest_cache,
+                    hash_type=args.hash_type,
+                    workers=args.workers,
+                    dry_run=args.dry_run,
+                )
+        except LockBusy:
+            print(_("Another my-unicorn run is active, try again later."))
+            sys.exit(1)
+        if not results:
+            print(_("No appimages found in {folder}").format(folder=args.folder))
+        print_import_report(results, dry_run=args.dry_run)
+    elif args.command == "prefetch":
+        engine = UpdateEngine.from_file_handler(file_handler)
+        print_results(engine.prefetch())
+    elif args.command == "resume":
+        results = UpdateEngine.from_file_handler(file_handler).resume()
+        if results is None:
+            print(_("No interrupted update run to resume."))
+        else:
+            print_results(results)
+    elif args.command == "serve":
+        serve_peers(args)
+    elif args.command == "peers":
+        list_peers()
+    elif args.command == "fleet":
+        show_fleet()
+
+
+def serve_peers(args):
+    """Serve the verified appimages until Ctrl+C"""
+    settings = load_peer_settings(file_handler.config_peers_path)
+    bind = args.bind or settings.get("bind", "0.0.0.0")
+    port = args.port or settings.get("port", DEFAULT_PORT)
+    index = PeerIndex(
+        file_handler.file_path,
+        file_handler.digest_cache,
+        artifact_cache=file_handler.artifact_cache,
+    )
+    server = make_server(index, bind, port)
+    print(
+        _("Serving {count} verified appimages on http://{bind}:{port}").format(
+            count=len(index.artifacts()), bind=bind, port=server.server_port
+        )
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def list_peers():
+    """Print the configured peers, nearest first"""
+    urls = load_peer_settings(file_handler.config_peers_path).get("peers", [])
+    if not urls:
+        print(_("No peers configured in peers.json"))
+        return
+    for peer in PeerClient(urls).probe():
+        if peer.latency is None:
+            print(_("\033[41;30m{url} unreachable\033[0m").format(url=peer.url))
+        else:
+            print(
+                _("{url} {latency} ms, {count} appimages").format(
+                    url=peer.url,
+                    latency=round(peer.latency * 1000),
+                    count=len(peer.digests),
+                )
+            )
+
+
+def show_fleet():
+    """Print the live fleet members and the repos this host checks"""
+    engine = UpdateEngine.from_file_handler(file_handler)
+    if engine.fleet is None:
+        print(_("This host is not in a fleet, see fleet.json"))
+        return
+    engine.fleet.join()
+    members = engine.fleet.ring.members
+    print(
+        _("Node {node}, {count} live members: {members}").format(
+            node=engine.fleet.node_id, count=len(members), members=", ".join(members)
+        )
+    )
+    for config in engine.configs():
+        key = f"{config.owner}/{config.repo}"
+        owner = engine.fleet.ring.owner(key)
+        print(_("{repo}: checked by {owner}").format(repo=config.repo, owner=owner))
+
+
+def start_speculative_check():
+    """Start checking the apps while the menu waits, None if turned off"""
+    settings = load_probe_settings(file_handler.config_probe_path)
+    if not settings.get("menu_prefetch", True):
+        return None
+    try:
+        engine = UpdateEngine.from_file_handler(file_handler)
+        if not engine.configs():
+            return None
+    except (OSError, ValueError) as error:
+        logging.error(f"Error: {error}", exc_info=True)
+        return None
+    return SpeculativeCheck(engine).start()
 
 
 def main():
@@ -173,6 +630,22 @@ def main():
     9. Make executable, delete version from appimage_name and move to directory
     """
     configure_logging()
+    args = parse_arguments()
+    settings = load_progress_settings(file_handler.config_progress_path)
+    configure_progress(
+        args.progress or settings.get("mode", "auto"),
+        settings.get("interval_seconds", DEFAULT_INTERVAL),
+    )
+
+    if args.command:
+        # commands run unattended, never prompt for the language
+        current_locale = get_locale_config(file_handler.file_path)
+        if current_locale:
+            load_translations(current_locale)
+        else:
+            gettext.install("messages")
+        run_command(args)
+        return
 
     if not os.path.isfile(os.path.join(file_handler.file_path, "locale.json")):
         select_language(file_handler.file_path)
@@ -180,7 +653,10 @@ def main():
         current_locale = get_locale_config(file_handler.file_path)
         if current_locale:
             load_translations(current_locale)
+    speculation = start_speculative_check()
     choice = get_user_choice()
+    if speculation is not None and choice not in (1, 4):
+        speculation.cancel(wait=False)
 
     functions = {
         1: [
@@ -203,32 +679,18 @@ def main():
             "make_executable",
             "handle_file_operations",
         ],
-        3: [
-            "get_response",
-            "download",
-            "verify_sha",
-            "make_executable",
-            "handle_file_operations",
-        ],
-        4: [
-            "get_response",
-            "download",
-            "verify_sha",
-            "make_executable",
-            "handle_file_operations",
-        ],
     }
 
     try:
         if choice == 1:
-            choice_update(file_handler, functions)
+            choice_update(file_handler, speculation)
         elif choice == 2:
             choice_download(file_handler, functions)
         elif choice == 3:
             file_handler.list_json_files()
-            file_handler.update_json()
+            run_locked(file_handler, ["update_json"])
         elif choice == 4:
-            file_handler.check_updates_json_all()
+            choice_update_all(file_handler, speculation)
         elif choice == 5:
             update_locale(file_handler)
         elif choice == 6:
@@ -237,7 +699,13 @@ def main():
         else:
             print(_("Invalid choice"))
             sys.exit()
-    except (ValueError, KeyboardInterrupt) as error:
+    except UpToDate:
+        print(_("Exiting..."))
+        sys.exit()
+    except UpdateError:
+        # the reason was already printed
+        sys.exit(1)
+    except (ValueError, IndexError, KeyboardInterrupt) as error:
         logging.error(f"Error: {error}", exc_info=True)
         print(_("Error: {error}. Exiting...").format(error=error))
         sys.exit(1)
@@ -1,11 +1,20 @@
 import os
 import json
 import sys
+import time
 import logging
 import requests
-from tqdm import tqdm
 from dataclasses import dataclass, field
+from src.assets import host_arch, rule_for, select_appimage_asset, select_sha_asset
 from src.decorators import handle_api_errors, handle_common_errors
+from src.errors import UpdateError, UpToDate
+from src.jobs import AppConfig
+from src.planner import ThroughputHistory
+from src.progress import get_reporter
+from src.watchdog import DownloadGuard
+from src.update_info import UpdateInfo, read_update_info
+from src.probe import probed_up_to_date
+from src.session import http_get
 
 
 @dataclass
@@ -17,6 +26,7 @@ class AppImageDownloader:
     api_url: str = None
     sha_name: str = None
     sha_url: str = None
+    asset_digest: str = None
     appimage_name: str = None
     version: str = None
     appimage_folder: str = field(default_factory=lambda: "~/Documents/appimages")
@@ -27,12 +37,27 @@ class AppImageDownloader:
     url: str = None
     choice: int = None
     appimages: dict = field(default_factory=dict)
-    file_path: str = field(init=False)
+    throughput: ThroughputHistory = None
+    update_info: UpdateInfo = None
+    sources: list = None
+    asset_size: int = None
+    tag: str = None
+    asset_pattern: str = None
+    sha_pattern: str = None
+    learned_asset_pattern: str = None
+    learned_sha_pattern: str = None
+    probe_backend: str = None
+    atom_fallback: bool = True
+    guard: DownloadGuard = None
+    prefetched_release: dict = None  # latest release json fetched moments ago
+    published_at: str = None  # publish time of the latest release
+    file_path: str = None  # config folder, {appimage_folder}/config_files/ if None
 
     def __post_init__(self):
         self.appimage_folder = os.path.expanduser(self.appimage_folder)
 
-        self.file_path = os.path.join(self.appimage_folder, "config_files/")
+        if self.file_path is None:
+            self.file_path = os.path.join(self.appimage_folder, "config_files/")
         os.makedirs(self.file_path, exist_ok=True)
 
         other_settings_folder = os.path.join(self.file_path, "other_settings")
@@ -40,6 +65,21 @@ class AppImageDownloader:
 
         self.config_batch_path = os.path.join(other_settings_folder, "batch_mode.json")
         self.config_path = os.path.join(other_settings_folder, "locale.json")
+        self.config_cache_path = os.path.join(other_settings_folder, "cache.json")
+        self.config_watch_path = os.path.join(other_settings_folder, "watch.json")
+        self.digest_cache_path = os.path.join(
+            other_settings_folder, "digest_cache.json"
+        )
+        self.throughput_path = os.path.join(other_settings_folder, "throughput.json")
+        self.config_planner_path = os.path.join(other_settings_folder, "planner.json")
+        self.config_peers_path = os.path.join(other_settings_folder, "peers.json")
+        self.config_watchdog_path = os.path.join(other_settings_folder, "watchdog.json")
+        self.host_timeouts_path = os.path.join(
+            other_settings_folder, "host_timeouts.json"
+        )
+        self.config_probe_path = os.path.join(other_settings_folder, "probe.json")
+        self.config_desktop_path = os.path.join(other_settings_folder, "desktop.json")
+        self.config_progress_path = os.path.join(other_settings_folder, "progress.json")
 
     @handle_common_errors
     def ask_user(self):
@@ -61,6 +101,15 @@ class AppImageDownloader:
 
     @handle_common_errors
     def learn_owner_repo(self):
+        # an AppImage already on disk says where it comes from
+        self.update_info = read_update_info(os.path.expanduser(self.url))
+        if self.update_info is not None and self.update_info.is_github:
+            print(_("Using the update information embedded in the AppImage"))
+            self.owner = self.update_info.owner
+            self.repo = self.update_info.repo
+            self.url = f"https://github.com/{self.owner}/{self.repo}"
+            return
+
         while True:
             print(_("Parsing the owner and repo from the url..."))
             self.owner = self.url.split("/")[3]
@@ -149,6 +198,7 @@ class AppImageDownloader:
         self.appimages["version"] = self.version
         self.appimages["sha"] = self.sha_name
         self.appimages["hash_type"] = self.hash_type
+        self.save_asset_patterns()
         self.appimages["choice"] = 3 if self.choice == 1 else 4
 
         self.appimage_folder_backup = os.path.join(self.appimage_folder_backup, "")
@@ -166,36 +216,22 @@ class AppImageDownloader:
         )
         self.load_credentials()
 
+    def save_asset_patterns(self):
+        """Record the asset rules learned by get_response in the config.
+
+        They go to their own keys, asset_pattern and sha_pattern are only
+        ever written by the user.
+        """
+        for key in ("learned_asset_pattern", "learned_sha_pattern"):
+            if getattr(self, key):
+                self.appimages[key] = getattr(self, key)
+
     @handle_common_errors
     def load_credentials(self):
         """Load the credentials from a json file"""
         json_path = f"{self.file_path}{self.repo}.json"
         if os.path.exists(json_path):
-            with open(
-                f"{self.file_path}{self.repo}.json", "r", encoding="utf-8"
-            ) as file:
-                self.appimages = json.load(file)
-            self.owner = self.appimages["owner"]
-            self.repo = self.appimages["repo"]
-            self.appimage_name = self.appimages["appimage"]
-            self.version = self.appimages["version"]
-            self.sha_name = self.appimages["sha"]
-            self.choice = self.appimages["choice"]
-            self.hash_type = self.appimages["hash_type"]
-
-            if self.appimages["appimage_folder"].startswith("~"):
-                self.appimage_folder = os.path.expanduser(
-                    self.appimages["appimage_folder"]
-                )
-            else:
-                self.appimage_folder = self.appimages["appimage_folder"]
-
-            if self.appimages["appimage_folder_backup"].startswith("~"):
-                self.appimage_folder_backup = os.path.expanduser(
-                    self.appimages["appimage_folder_backup"]
-                )
-            else:
-                self.appimage_folder_backup = self.appimages["appimage_folder_backup"]
+            self.apply_config(AppConfig.load(json_path))
         else:
             print(
                 _(
@@ -204,16 +240,46 @@ class AppImageDownloader:
             )
             self.ask_user()
 
-    @handle_api_errors
-    def get_response(self):
-        """get the api response from the github api"""
-        self.api_url = (
-            f"https://api.github.com/repos/{self.owner}/{self.repo}/releases/latest"
-        )
+    def apply_config(self, config):
+        """Take the app settings from an AppConfig"""
+        self.appimages = config.to_dict()
+        self.owner = config.owner
+        self.repo = config.repo
+        self.appimage_name = config.appimage
+        self.version = config.version
+        self.sha_name = config.sha
+        self.choice = config.choice
+        self.hash_type = config.hash_type
+        self.appimage_folder = config.folder
+        self.appimage_folder_backup = config.backup_folder
+        self.sources = config.sources
+        self.asset_pattern = config.asset_pattern
+        self.sha_pattern = config.sha_pattern
+        self.learned_asset_pattern = config.learned_asset_pattern
+        self.learned_sha_pattern = config.learned_sha_pattern
+
+    def fetch_release_data(self):
+        """Return the latest release json, raise UpToDate if the probe says
+        nothing changed"""
+        # ask github.com first, it costs no API quota
+        if (
+            self.choice in [3, 4]
+            and self.probe_backend == "web"
+            and probed_up_to_date(
+                self.owner,
+                self.repo,
+                self.appimages["version"],
+                self.update_info,
+                self.atom_fallback,
+            )
+        ):
+            print(_("{repo}.AppImage is up to date").format(repo=self.repo))
+            print(_("Version: {version}").format(version=self.appimages["version"]))
+            raise UpToDate(self.repo)
 
-        response = requests.get(self.api_url, timeout=10)
+        response = http_get(self.api_url, timeout=10)
 
-        if response is None:
+        if response is None or response.status_code != 200:
             print("-------------------------------------------------")
             print(
                 _("Failed to get response from API: {api_url}").format(
@@ -221,70 +287,84 @@ class AppImageDownloader:
                 )
             )
             print("-------------------------------------------------")
-            return
+            raise UpdateError(
+                f"GitHub API returned {getattr(response, 'status_code', None)}"
+            )
+
+        return json.loads(response.text)
 
-        if response.status_code == 200:
-            data = json.loads(response.text)
-            self.version = data["tag_name"].replace("v", "")
-
-            if self.choice in [3, 4]:
-                if self.version == self.appimages["version"]:
-                    print(_("{repo}.AppImage is up to date").format(repo=self.repo))
-                    print(_("Version: {version}").format(version=self.version))
-                    print(_("Exiting..."))
-                    sys.exit()
-                else:
-                    print("-------------------------------------------------")
-                    print(
-                        _("Current version: {version}").format(
-                            version=self.appimages["version"]
-                        )
+    @handle_api_errors
+    def get_response(self):
+        """get the api response from the github api"""
+        self.api_url = (
+            f"https://api.github.com/repos/{self.owner}/{self.repo}/releases/latest"
+        )
+        # The installed AppImage names its release and asset, use that rather
+        # than guessing. A new install may have it from learn_owner_repo.
+        installed_info = read_update_info(
+            os.path.join(self.appimage_folder, f"{self.repo}.AppImage")
+        )
+        if installed_info is not None:
+            self.update_info = installed_info
+        if self.update_info is not None and self.update_info.is_github:
+            self.api_url = self.update_info.api_url
+
+        data = self.prefetched_release or self.fetch_release_data()
+        self.published_at = data.get("published_at")
+        self.tag = data["tag_name"]
+        self.version = self.tag.replace("v", "")
+
+        if self.choice in [3, 4]:
+            if self.version == self.appimages["version"]:
+                print(_("{repo}.AppImage is up to date").format(repo=self.repo))
+                print(_("Version: {version}").format(version=self.version))
+                raise UpToDate(self.repo)
+            else:
+                print("-------------------------------------------------")
+                print(
+                    _("Current version: {version}").format(
+                        version=self.appimages["version"]
                     )
-                    print(
-                        _("\033[42mLatest version: {version}\033[0m").format(
-                            version=self.version
-                        )
+                )
+                print(
+                    _("\033[42mLatest version: {version}\033[0m").format(
+                        version=self.version
                     )
-                    print("-------------------------------------------------")
-
-            keywords = {
-                "linux",
-                "sum",
-                "sha",
-                "SHA",
-                "SHA256",
-                "SHA512",
-                "SHA-256",
-                "SHA-512",
-                "checksum",
-                "checksums",
-                "CHECKSUM",
-                "CHECKSUMS",
-            }
-            valid_extensions = {
-                ".sha256",
-                ".sha512",
-                ".yml",
-                ".yaml",
-                ".txt",
-                ".sum",
-                ".sha",
-            }
-
-            for asset in data["assets"]:
-                if asset["name"].endswith(".AppImage"):
-                    self.appimage_name = asset["name"]
-                    self.url = asset["browser_download_url"]
-                elif any(keyword in asset["name"] for keyword in keywords) and asset[
-                    "name"
-                ].endswith(tuple(valid_extensions)):
-                    self.sha_name = asset["name"]
-                    self.sha_url = asset["browser_download_url"]
-                    if self.sha_name is None:
-                        print(_("Couldn't find the sha file"))
-                        logging.error(_("Couldn't find the sha file"))
-                        self.sha_name = input(_("Enter the exact sha name: "))
-                        self.sha_url = asset["browser_download_url"]
+                )
+                print("-------------------------------------------------")
+
+        self.asset_digest = None
+        self.asset_size = None
+        appimage_asset = select_appimage_asset(
+            data["assets"],
+            self.update_info,
+            self.asset_pattern,
+            learned=self.learned_asset_pattern,
+        )
+        if appimage_asset is None:
+            raise UpdateError(
+                f"No AppImage for {host_arch()} in the latest {self.repo} release"
+            )
+        self.appimage_name = appimage_asset["name"]
+        self.url = appimage_asset["browser_download_url"]
+        # e.g. "sha256:ab12...", missing for older releases
+        self.asset_digest = appimage_asset.get("digest")
+        self.asset_size = appimage_asset.get("size")
+        # remember the choice, later releases skip the guessing; a rule of
+        # the user or the embedded pattern already says which asset it is
+        if not self.asset_pattern and not (
+            self.update_info is not None and self.update_info.asset_pattern
+        ):
+            self.learned_asset_pattern = rule_for(self.appimage_name, self.version)
+
+        sha_asset = select_sha_asset(
+            data["assets"], self.sha_pattern, learned=self.learned_sha_pattern
+        )
+        if sha_asset is not None:
+            self.sha_name = sha_asset["name"]
+            self.sha_url = sha_asset["browser_download_url"]
+            if not self.sha_pattern:
+                self.learned_sha_pattern = rule_for(self.sha_name, self.version)
 
     @handle_api_errors
     def download(self):
@@ -304,50 +384,38 @@ class AppImageDownloader:
                 "{repo} downloading... Grab a cup of coffee :), it will take some time depending on your internet speed."
             ).format(repo=self.repo)
         )
-        response = requests.get(self.url, timeout=10, stream=True)
-
-        total_size_in_bytes = int(response.headers.get("content-length", 0))
-
-        if response.status_code == 200:
-            with open(f"{self.appimage_name}", "wb") as file, tqdm(
-                desc=self.appimage_name,
-                total=total_size_in_bytes,
-                unit="iB",
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as progress_bar:
-                for data in response.iter_content(chunk_size=8192):
-                    size = file.write(data)
-                    progress_bar.update(size)
-        else:
+        # the guard reconnects and resumes stalled transfers from the offset
+        part_path = f"{self.appimage_name}.part"
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        started = time.monotonic()
+        try:
+            with get_reporter().task(self.appimage_name, self.asset_size) as progress:
+                self.guard.fetch(self.url, part_path, progress, self.asset_size)
+        except requests.exceptions.HTTPError as error:
             print(
                 _("\033[41;30mError downloading {appimage_name}\033[0m").format(
                     appimage_name=self.appimage_name
                 )
             )
-            logging.error(f"Error downloading {self.appimage_name}")
-            sys.exit()
+            logging.error(f"Error downloading {self.appimage_name}: {error}")
+            raise UpdateError(f"Error downloading {self.appimage_name}") from error
+        os.replace(part_path, self.appimage_name)
+        if self.throughput is not None:
+            self.throughput.record(
+                os.path.getsize(self.appimage_name), time.monotonic() - started
+            )
 
         with open(f"{self.file_path}{self.repo}.json", "w", encoding="utf-8") as file:
             json.dump(self.appimages, file, indent=4)
 
-        if response is not None:
-            response.close()
-            print("-------------------------------------------------")
-            print(
-                _(
-                    "\033[42mDownload completed! {appimage_name} installed.\033[0m"
-                ).format(appimage_name=self.appimage_name)
-            )
-            print("-------------------------------------------------")
-        else:
-            print("-------------------------------------------------")
-            print(
-                _("\033[41;30mError downloading {appimage_name}\033[0m").format(
-                    appimage_name=self.appimage_name
-                )
+        print("-------------------------------------------------")
+        print(
+            _("\033[42mDownload completed! {appimage_name} installed.\033[0m").format(
+                appimage_name=self.appimage_name
             )
-            print("-------------------------------------------------")
+        )
+        print("-------------------------------------------------")
 
     @handle_common_errors
     def update_json(self):
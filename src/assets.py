@@ -0,0 +1,153 @@
+import re
+import fnmatch
+import logging
+import platform
+from functools import lru_cache
+
+# names the same cpu goes by in release asset names
+ARCH_ALIASES = {
+    "x86_64": ("x86_64", "x86-64", "amd64", "x64"),
+    "aarch64": ("aarch64", "arm64"),
+    "armv7l": ("armv7l", "armv7", "armhf", "arm32"),
+    "i686": ("i686", "i386", "x86", "ia32"),
+}
+SHA_KEYWORDS = (
+    "linux",
+    "sum",
+    "sha",
+    "SHA",
+    "SHA256",
+    "SHA512",
+    "SHA-256",
+    "SHA-512",
+    "checksum",
+    "checksums",
+    "CHECKSUM",
+    "CHECKSUMS",
+)
+SHA_EXTENSIONS = (".sha256", ".sha512", ".yml", ".yaml", ".txt", ".sum", ".sha")
+# a config pattern starting with this is a regular expression, else a glob
+REGEX_PREFIX = "re:"
+
+
+@lru_cache(maxsize=None)
+def compile_rule(rule):
+    """Compile an asset rule once: "re:<regex>" or a glob like "*-x86_64.AppImage" """
+    if rule.startswith(REGEX_PREFIX):
+        return re.compile(rule[len(REGEX_PREFIX) :])
+    return re.compile(fnmatch.translate(rule))
+
+
+@lru_cache(maxsize=None)
+def _arch_regex(arch):
+    aliases = "|".join(re.escape(alias) for alias in ARCH_ALIASES[arch])
+    # not inside a longer word or number; "x86" also matches in "x86_64",
+    # asset_arch checks x86_64 first for that reason
+    return re.compile(rf"(?<![a-z0-9])(?:{aliases})(?![0-9])", re.I)
+
+
+def host_arch():
+    """Return the architecture of this machine as a key of ARCH_ALIASES"""
+    machine = platform.machine().lower()
+    for arch, aliases in ARCH_ALIASES.items():
+        if machine in aliases:
+            return arch
+    return machine
+
+
+def asset_arch(name):
+    """Return the architecture an asset name mentions, None if it names none"""
+    for arch in ARCH_ALIASES:
+        if _arch_regex(arch).search(name):
+            return arch
+    return None
+
+
+def _for_arch(assets, arch):
+    """Return the asset built for arch, else one that names no architecture.
+
+    Builds for other architectures are never returned.
+    """
+    native, generic = None, None
+    for asset in assets:
+        built_for = asset_arch(asset["name"])
+        if built_for == arch:
+            native = asset
+        elif built_for is None:
+            generic = asset
+    return native or generic
+
+
+def _matching(assets, rule):
+    pattern = compile_rule(rule)
+    return [asset for asset in assets if pattern.fullmatch(asset["name"])]
+
+
+def select_appimage_asset(assets, update_info=None, rule=None, arch=None, learned=None):
+    """Return the release asset to download.
+
+    In order: the rule the user wrote in the app's config, the pattern of the
+    update information embedded in the installed AppImage, the rule learned
+    from an earlier pick, then the .AppImage assets of the release. Among the
+    assets a rule or pattern matches, as among the .AppImage ones, the build
+    for this machine's architecture comes first and one that doesn't name an
+    architecture second. Builds for other architectures are never picked,
+    even when a learned rule like "App-*.AppImage" matches them too.
+    """
+    arch = arch or host_arch()
+    embedded = update_info.asset_pattern if update_info is not None else None
+    candidates = (
+        ("rule", rule),
+        ("embedded pattern", embedded),  # a glob, like the rules
+        ("learned rule", learned),
+    )
+    for kind, candidate in candidates:
+        if not candidate:
+            continue
+        asset = _for_arch(_matching(assets, candidate), arch)
+        if asset is not None:
+            return asset
+        logging.warning(f"No {arch} asset matches the {kind} {candidate}")
+
+    return _for_arch(
+        [asset for asset in assets if asset["name"].endswith(".AppImage")], arch
+    )
+
+
+def select_sha_asset(assets, rule=None, learned=None):
+    """Return the checksum asset: by the rule the user wrote, by the rule
+    learned from an earlier pick, else by name heuristics"""
+    for kind, candidate in (("sha rule", rule), ("learned sha rule", learned)):
+        if not candidate:
+            continue
+        matches = _matching(assets, candidate)
+        if matches:
+            return matches[0]
+        logging.warning(f"No asset matches the {kind} {candidate}")
+
+    selected = None
+    for asset in assets:
+        name = asset["name"]
+        if name.endswith(".AppImage"):
+            continue
+        if any(keyword in name for keyword in SHA_KEYWORDS) and name.endswith(
+            SHA_EXTENSIONS
+        ):
+            selected = asset
+    return selected
+
+
+def rule_for(name, version):
+    """Return a glob that matches name in later releases.
+
+    The version in the name becomes *, e.g. "Joplin-3.0.1-x86_64.AppImage"
+    with version 3.0.1 gives "Joplin-*-x86_64.AppImage".
+    """
+    if version and version in name:
+        return "*".join(fnmatch_escape(part) for part in name.split(version))
+    return fnmatch_escape(name)
+
+
+def fnmatch_escape(text):
+    """Escape the glob characters of text"""
+    return re.sub(r"([*?\[])", r"[\1]", text)
@@ -0,0 +1,107 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from src.config_store import ConfigStore
+from src.hashing import hash_file, split_digest
+
+
+@dataclass
+class AuditResult:
+    """Outcome of checking one installed appimage"""
+
+    repo: str
+    path: str
+    status: str  # "ok", "mismatch", "missing" or "unrecorded"
+    expected: str = None
+    actual: str = None
+    cached: bool = False
+
+
+def audit_installed(file_path, digest_cache, workers=None, full=False):
+    """Hash every installed {repo}.AppImage and compare it with its install digest.
+
+    Files whose inode, size and times are unchanged since the last run are
+    taken from the digest cache unless full is set; everything else is hashed
+    in parallel, one process per core.
+    """
+    config_store = ConfigStore(file_path)
+    config_store.refresh()
+
+    results = []
+    to_hash = []
+    for repo, config in sorted(config_store.configs().items()):
+        folder = os.path.expanduser(config.get("appimage_folder", ""))
+        path = os.path.join(folder, f"{repo}.AppImage")
+        recorded = config.get("installed_digest")
+
+        if not os.path.isfile(path):
+            results.append(AuditResult(repo, path, "missing", expected=recorded))
+            continue
+        if not recorded:
+            results.append(AuditResult(repo, path, "unrecorded"))
+            continue
+
+        hash_type, expected = split_digest(recorded)
+        actual = None if full else digest_cache.get(path, hash_type)
+        result = AuditResult(repo, path, "ok", expected=expected, actual=actual)
+        results.append(result)
+        if actual is None:
+            to_hash.append((result, hash_type))
+        else:
+            result.cached = True
+
+    if to_hash:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            digests = executor.map(
+                hash_file,
+                [result.path for result, _hash_type in to_hash],
+                [hash_type for _result, hash_type in to_hash],
+            )
+            for (result, hash_type), digest in zip(to_hash, digests):
+                result.actual = digest
+                digest_cache.put(result.path, hash_type, digest)
+        digest_cache.save()
+
+    for result in results:
+        if result.status == "ok" and result.actual != result.expected:
+            result.status = "mismatch"
+            logging.error(
+                f"Integrity mismatch for {result.path}: "
+                f"expected {result.expected}, got {result.actual}"
+            )
+
+    return results
+
+
+def print_audit_report(results):
+    """Print the audit results, return True if nothing is wrong"""
+    print("=================================================")
+    for result in results:
+        if result.status == "ok":
+            print(
+                _("\033[42mOK\033[0m {path}{cached}").format(
+                    path=result.path, cached=_(" (cached)") if result.cached else ""
+                )
+            )
+        elif result.status == "mismatch":
+            print(_("\033[41;30mMISMATCH\033[0m {path}").format(path=result.path))
+            print(_("  Recorded: {digest}").format(digest=result.expected))
+            print(_("  Actual:   {digest}").format(digest=result.actual))
+        elif result.status == "missing":
+            print(_("\033[41;30mMISSING\033[0m {path}").format(path=result.path))
+        else:
+            print(
+                _("NO DIGEST {path} (update it once to record a digest)").format(
+                    path=result.path
+                )
+            )
+    print("=================================================")
+
+    failed = [result for result in results if result.status in ("mismatch", "missing")]
+    print(
+        _("{total} appimages audited, {failed} failed").format(
+            total=len(results), failed=len(failed)
+        )
+    )
+    return not failed
@@ -0,0 +1,176 @@
+import os
+import json
+import fcntl
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# ioctl request number of FICLONE (linux/fs.h), used for reflink copies
+FICLONE = 0x40049409
+# setgid and group writable, files made inside keep the group of the cache
+# and every user of the group can add entries whatever their umask
+SHARED_DIR_MODE = 0o2775
+SHARED_LOCK_MODE = 0o664
+
+
+def _makedirs_shared(path):
+    """Create path and its missing parents with SHARED_DIR_MODE"""
+    if os.path.isdir(path):
+        return
+    parent = os.path.dirname(path)
+    if parent and parent != path:
+        _makedirs_shared(parent)
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        return
+    # the umask applies to mkdir, set the mode explicitly
+    os.chmod(path, SHARED_DIR_MODE)
+
+
+@dataclass
+class ArtifactCache:
+    """Shared, content-addressed cache of verified appimages.
+
+    Entries are stored as {cache_dir}/{hash_type}/{digest[:2]}/{digest}, so the
+    same release is downloaded once per host no matter how many users need it.
+    The directories and lock files are group writable, so every user of the
+    group that owns cache_dir can use it.
+    """
+
+    cache_dir: str
+    _locks: dict = field(default_factory=dict, init=False, repr=False)
+    _locks_guard: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.cache_dir = os.path.expanduser(self.cache_dir)
+        _makedirs_shared(self.cache_dir)
+
+    def path_for(self, hash_type, digest):
+        """Return the cache path of an artifact"""
+        digest = digest.lower()
+        return os.path.join(self.cache_dir, hash_type, digest[:2], digest)
+
+    def lookup(self, hash_type, digest):
+        """Return the cached artifact path or None if it is not cached"""
+        path = self.path_for(hash_type, digest)
+        return path if os.path.isfile(path) else None
+
+    def store(self, source, hash_type, digest):
+        """Add a verified file to the cache and return the cached path"""
+        path = self.path_for(hash_type, digest)
+        if os.path.isfile(path):
+            return path
+
+        _makedirs_shared(os.path.dirname(path))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        os.close(fd)
+        try:
+            self._clone_or_copy(source, tmp_path)
+            # entries are shared between users, nobody should write to them
+            os.chmod(tmp_path, 0o755)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logging.info(f"Stored {source} in artifact cache as {path}")
+        return path
+
+    def materialize(self, hash_type, digest, destination):
+        """Place a cached artifact at destination.
+
+        Reflink where the filesystem supports it, plain copy otherwise. Never
+        a hardlink: the destination is the user's file, changing it in place
+        would change the shared entry peers are served without re-hashing.
+        The destination is replaced atomically.
+        """
+        source = self.lookup(hash_type, digest)
+        if source is None:
+            return False
+
+        destination_dir = os.path.dirname(os.path.abspath(destination))
+        os.makedirs(destination_dir, exist_ok=True)
+        tmp_path = os.path.join(
+            destination_dir, f".{os.path.basename(destination)}.{os.getpid()}.tmp"
+        )
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        try:
+            method = self._clone_or_copy(source, tmp_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, destination)
+        logging.info(f"Materialized {source} at {destination} via {method}")
+        return True
+
+    @staticmethod
+    def _clone_or_copy(source, destination):
+        """Reflink source to destination, fall back to a regular copy"""
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                method = "reflink"
+            except OSError:
+                shutil.copyfileobj(src, dst, length=1024 * 1024)
+                method = "copy"
+        shutil.copymode(source, destination)
+        return method
+
+    @contextmanager
+    def fetching(self, hash_type, digest):
+        """Serialize fetches of the same artifact.
+
+        Threads of this process and other processes (other users) asking for the
+        same digest wait here; once the first one has stored the artifact, the
+        others find it with lookup() instead of downloading it again.
+        """
+        key = f"{hash_type}:{digest.lower()}"
+        with self._locks_guard:
+            thread_lock = self._locks.setdefault(key, threading.Lock())
+
+        lock_path = self.path_for(hash_type, digest) + ".lock"
+        _makedirs_shared(os.path.dirname(lock_path))
+        with thread_lock:
+            # flock works on a read-only descriptor, so a lock file created
+            # by another user can be opened as long as it is readable
+            fd = os.open(lock_path, os.O_RDONLY | os.O_CREAT, SHARED_LOCK_MODE)
+            try:
+                if os.fstat(fd).st_uid == os.getuid():
+                    os.fchmod(fd, SHARED_LOCK_MODE)
+            except OSError:
+                os.close(fd)
+                raise
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+def load_artifact_cache(config_path):
+    """Load the artifact cache from its settings file, None if it is disabled"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            settings = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    cache_dir = settings.get("cache_dir")
+    if not cache_dir or not settings.get("enabled", True):
+        return None
+
+    try:
+        return ArtifactCache(cache_dir)
+    except OSError as error:
+        logging.error(f"Artifact cache {cache_dir} unavailable: {error}")
+        return None
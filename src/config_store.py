@@ -0,0 +1,66 @@
+import os
+import json
+import logging
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ConfigStore:
+    """Keep the parsed app config files in memory.
+
+    refresh() only re-reads files whose size or mtime changed, so long running
+    processes see edits in config_files/ without restarting and without parsing
+    every file on each check.
+    """
+
+    file_path: str
+    _configs: dict = field(default_factory=dict, init=False, repr=False)
+    _stamps: dict = field(default_factory=dict, init=False, repr=False)
+
+    def refresh(self):
+        """Rescan the config folder, return the (added, changed, removed) names"""
+        try:
+            names = {
+                file
+                for file in os.listdir(self.file_path)
+                if file.endswith(".json") and file != "locale.json"
+            }
+        except FileNotFoundError:
+            names = set()
+
+        added, changed = [], []
+        for name in sorted(names):
+            path = os.path.join(self.file_path, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self._stamps.get(name) == stamp:
+                continue
+
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    config = json.load(file)
+            except (OSError, ValueError) as error:
+                # keep the last good copy while the file is being edited
+                logging.error(f"Error reading config {path}: {error}")
+                continue
+
+            (changed if name in self._configs else added).append(name)
+            self._configs[name] = config
+            self._stamps[name] = stamp
+
+        removed = [name for name in self._configs if name not in names]
+        for name in removed:
+            del self._configs[name]
+            del self._stamps[name]
+
+        return added, changed, removed
+
+    def configs(self):
+        """Return the cached configs as {repo: config}"""
+        return {
+            config.get("repo", name[: -len(".json")]): config
+            for name, config in self._configs.items()
+        }
@@ -1,16 +1,23 @@
 import sys
 import logging
 import requests
+from src.errors import UpdateError, UpToDate
 
 # Set up logging
 logging.basicConfig(level=logging.ERROR)
 
 
-def handle_error(func_name, error, exit_message):
-    """Handle the error by logging it and printing an exit message."""
+def handle_error(func_name, error, exit_message, fatal=False):
+    """Handle the error by logging it and printing an exit message.
+
+    Only fatal errors exit, anything else raises UpdateError so a batch can
+    carry on with the next appimage.
+    """
     logging.error(f"An error occurred in {func_name}: {str(error)}", exc_info=True)
     print(f"\033[41;30m{exit_message}\033[0m")
-    sys.exit()
+    if fatal:
+        sys.exit()
+    raise UpdateError(exit_message) from error
 
 
 def handle_common_errors(func):
@@ -18,12 +25,16 @@ def handle_common_errors(func):
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
+        except (UpdateError, UpToDate):
+            raise
         except ValueError as error:
             handle_error(
                 func.__name__, error, _("Invalid input or value error. Try again.")
             )
         except KeyboardInterrupt as error:
-            handle_error(func.__name__, error, _("Keyboard interrupt. Exiting..."))
+            handle_error(
+                func.__name__, error, _("Keyboard interrupt. Exiting..."), fatal=True
+            )
         except EOFError as error:
             handle_error(func.__name__, error, _("EOF error. Input cannot be empty."))
         except KeyError as error:
@@ -42,6 +53,12 @@ def handle_api_errors(func):
         try:
             response = func(*args, **kwargs)
             return response
+        except (UpdateError, UpToDate):
+            raise
+        except KeyboardInterrupt as error:
+            handle_error(
+                func.__name__, error, _("Keyboard interrupt. Exiting..."), fatal=True
+            )
         except requests.exceptions.TooManyRedirects as error:
             handle_error(func.__name__, error, _("Too many redirects. Try again."))
         except requests.exceptions.InvalidURL as error:
@@ -0,0 +1,277 @@
+import os
+import json
+import shutil
+import struct
+import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from src.importer import DESKTOP_LIMIT, parse_desktop_entry
+from src.squashfs import SquashfsError, open_appimage
+
+# an icon is a few KB, a broken or huge one isn't worth installing
+ICON_LIMIT = 4 * 1024 * 1024
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# the sizes hicolor/index.theme lists, other pngs go to the closest one
+HICOLOR_SIZES = (16, 22, 24, 32, 48, 64, 96, 128, 256, 512)
+# installed launchers and icons are named {PREFIX}{repo}, so they never
+# replace the files of a distribution package of the same app
+PREFIX = "my-unicorn-"
+
+
+def data_home():
+    """Return $XDG_DATA_HOME, ~/.local/share when it isn't set"""
+    return os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+
+
+def png_size(data):
+    """Return the width of a png icon, None if data isn't a png"""
+    if not data.startswith(PNG_SIGNATURE) or len(data) < 24:
+        return None
+    width, _height = struct.unpack(">II", data[16:24])
+    return width
+
+
+def icon_extension(data):
+    """Return ".png" or ".svg" for an icon, None for any other format"""
+    if png_size(data) is not None:
+        return ".png"
+    head = data[:1024].lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head.startswith((b"<?xml", b"<svg", b"<!--", b"<!DOCTYPE")) and b"<svg" in data:
+        return ".svg"
+    # xpm, jpeg, ico... the hicolor theme only takes png and svg
+    return None
+
+
+def icon_folder(data):
+    """Return the hicolor subfolder an icon belongs in"""
+    width = png_size(data)
+    if width is None:
+        return "scalable"
+    size = min(HICOLOR_SIZES, key=lambda known: abs(known - width))
+    return f"{size}x{size}"
+
+
+def quote_exec(path):
+    """Quote a path for an Exec key as the desktop entry spec wants"""
+    if not any(char in path for char in " \t\n\"'\\><~|&;$*?#()`"):
+        return path
+    escaped = "".join(f"\\{char}" if char in '"`$\\' else char for char in path)
+    return f'"{escaped}"'
+
+
+def exec_arguments(value):
+    """Return what follows the program of an Exec value, unchanged.
+
+    The program may be quoted as the desktop entry spec allows, e.g.
+    '"/opt/My App/run" %U' gives "%U". Inside the quotes a backslash
+    escapes the next character.
+    """
+    value = value.strip()
+    if not value.startswith('"'):
+        return value.partition(" ")[2].lstrip()
+    index = 1
+    while index < len(value) and value[index] != '"':
+        index += 2 if value[index] == "\\" else 1
+    return value[index + 1 :].lstrip()
+
+
+def rewrite_desktop_entry(text, appimage, icon=None):
+    """Point Exec, TryExec and Icon of a .desktop file at the installed files.
+
+    Exec keeps the arguments of the original (e.g. "AppRun %U" becomes
+    "/path/app.AppImage %U"), in the [Desktop Entry] group and in every
+    action group. Icon is left as it is when icon is None.
+    """
+    lines = []
+    for line in text.splitlines():
+        key, separator, value = line.partition("=")
+        key = key.strip()
+        if separator and key == "Exec":
+            arguments = exec_arguments(value)
+            line = f"Exec={quote_exec(appimage)} {arguments}".rstrip()
+        elif separator and key == "TryExec":
+            line = f"TryExec={appimage}"
+        elif separator and key == "Icon" and icon is not None:
+            line = f"Icon={icon}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def _write_if_changed(path, data):
+    """Atomically write data to path, return False if it already holds it"""
+    try:
+        with open(path, "rb") as file:
+            if file.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as file:
+        file.write(data)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_integration(path):
+    """Return (desktop entry text, icon bytes, icon extension) of an AppImage.
+
+    Only the directory of the image root, the .desktop file and the icon are
+    read, the rest of the squashfs payload is never decompressed.
+    """
+    with open_appimage(path) as image:
+        names = sorted(image.listdir(image.root()))
+        desktop_name = next((name for name in names if name.endswith(".desktop")), None)
+        if desktop_name is None:
+            return None, None, None
+        inode = image.lookup(desktop_name)
+        if inode is None or not inode.is_file:
+            return None, None, None
+        text = image.read_file(inode, DESKTOP_LIMIT).decode("utf-8", errors="replace")
+
+        icon_name = parse_desktop_entry(text).get("Icon", "")
+        candidates = [f"{icon_name}.svg", f"{icon_name}.png"] if icon_name else []
+        # .DirIcon is the icon of every AppImage, usually a link to the png
+        for candidate in candidates + [".DirIcon"]:
+            inode = image.lookup(candidate)
+            if inode is not None and inode.is_file and inode.size <= ICON_LIMIT:
+                icon = image.read_file(inode)
+                extension = icon_extension(icon)
+                if extension is not None:
+                    return text, icon, extension
+                logging.info(f"Skipping {candidate} of {path}, not a png or svg")
+        return text, None, None
+
+
+@dataclass
+class DesktopIntegrator:
+    """Install the launcher and icon of updated AppImages for the desktop.
+
+    The .desktop entry and icon are read from the squashfs payload of the
+    AppImage and written to $XDG_DATA_HOME/applications and the hicolor icon
+    theme, only when they changed. Menus pick them up once the desktop
+    database and the icon cache are refreshed. Both tools take a while on a
+    full icon theme, so inside batch() the refresh runs once when the whole
+    batch is done instead of once per app.
+    """
+
+    data_home: str = None
+    # opt-in: menus of people who manage their launchers themselves are left alone
+    enabled: bool = False
+    changed: bool = field(default=False, init=False)
+    batching: bool = field(default=False, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        self.data_home = os.path.expanduser(self.data_home or data_home())
+
+    @property
+    def applications(self):
+        return os.path.join(self.data_home, "applications")
+
+    @property
+    def icons(self):
+        return os.path.join(self.data_home, "icons", "hicolor")
+
+    def install(self, repo, appimage):
+        """Install the launcher and icon of the AppImage at appimage.
+
+        Returns True if anything changed. For broken images a warning is
+        printed and nothing is installed, the update itself already succeeded.
+        """
+        if not self.enabled:
+            return False
+        appimage = os.path.abspath(os.path.expanduser(appimage))
+        try:
+            text, icon, extension = read_integration(appimage)
+        except (SquashfsError, OSError, ValueError) as error:
+            logging.error(f"Couldn't read the desktop entry of {repo}: {error}")
+            print(
+                _(
+                    "\033[43mCouldn't install the launcher and icon of {repo}: {error}\033[0m"
+                ).format(repo=repo, error=error)
+            )
+            return False
+        if text is None:
+            logging.info(f"{repo}.AppImage has no desktop entry")
+            return False
+
+        name = f"{PREFIX}{repo}"
+        changed = False
+        try:
+            if icon is not None:
+                path = os.path.join(
+                    self.icons, icon_folder(icon), "apps", f"{name}{extension}"
+                )
+                changed |= _write_if_changed(path, icon)
+            entry = rewrite_desktop_entry(
+                text, appimage, name if icon is not None else None
+            )
+            path = os.path.join(self.applications, f"{name}.desktop")
+            changed |= _write_if_changed(path, entry.encode("utf-8"))
+        except OSError as error:
+            logging.error(f"Couldn't install the desktop entry of {repo}: {error}")
+            print(
+                _(
+                    "\033[43mCouldn't install the launcher and icon of {repo}: {error}\033[0m"
+                ).format(repo=repo, error=error)
+            )
+            return False
+
+        with self._lock:
+            self.changed |= changed
+            batching = self.batching
+        if changed and not batching:
+            self.refresh()
+        return changed
+
+    def refresh(self):
+        """Refresh the desktop database and the icon cache if anything changed"""
+        with self._lock:
+            if not self.changed:
+                return
+            self.changed = False
+        commands = [
+            ["update-desktop-database", "-q", self.applications],
+            ["gtk-update-icon-cache", "-q", "-t", "-f", self.icons],
+        ]
+        for command in commands:
+            if shutil.which(command[0]) is None:
+                continue
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                logging.warning(f"{command[0]} failed: {result.stderr.strip()}")
+
+    @contextmanager
+    def batch(self):
+        """Install any number of apps, refreshing the caches once at the end"""
+        with self._lock:
+            self.batching = True
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.batching = False
+            self.refresh()
+
+
+def load_desktop_settings(config_path):
+    """Load the desktop integration settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def load_desktop_integrator(config_path):
+    """Return a DesktopIntegrator from desktop.json, disabled without one"""
+    settings = load_desktop_settings(config_path)
+    return DesktopIntegrator(
+        settings.get("data_home"), enabled=settings.get("enabled", False)
+    )
@@ -0,0 +1,111 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from src.errors import UpdateError
+from src.planner import format_size
+
+# left free on every filesystem, the rest of the system needs room too
+DEFAULT_MARGIN = 100 * 1024 * 1024
+# seconds a queued job waits for other jobs to give their space back
+WAIT_TIMEOUT = 600
+
+
+class NotEnoughSpace(UpdateError):
+    """A job doesn't fit on one of the filesystems it writes to"""
+
+
+def existing_parent(path):
+    """Return path or its nearest parent that exists"""
+    path = os.path.abspath(os.path.expanduser(path))
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def free_bytes(path):
+    """Bytes an unprivileged user can still write on the filesystem of path"""
+    stat = os.statvfs(existing_parent(path))
+    return stat.f_bavail * stat.f_frsize
+
+
+@dataclass
+class Reservation:
+    repo: str
+    needs: dict  # {st_dev: bytes}
+    paths: dict  # {st_dev: a path on that filesystem, for messages}
+
+
+@dataclass
+class SpaceLedger:
+    """Admission control for the disk writes of concurrent jobs.
+
+    A job states how many bytes it will write where (download, install and
+    backup folders) before it downloads anything. The needs are added up per
+    filesystem and checked against statvfs minus the space already promised
+    to running jobs and a safety margin. A job that doesn't fit waits while
+    other jobs still hold reservations, since they give space back when they
+    finish, and is refused with NotEnoughSpace when nothing is running.
+    """
+
+    margin: int = DEFAULT_MARGIN
+    wait_timeout: float = WAIT_TIMEOUT
+    reserved: dict = field(default_factory=dict, init=False)
+    held: dict = field(default_factory=dict, init=False)
+    _condition: threading.Condition = field(
+        default_factory=threading.Condition, init=False
+    )
+
+    def _group(self, repo, needs):
+        by_device, paths = {}, {}
+        for path, size in needs:
+            if not size:
+                continue
+            device = os.stat(existing_parent(path)).st_dev
+            by_device[device] = by_device.get(device, 0) + size
+            paths.setdefault(device, path)
+        return Reservation(repo, by_device, paths)
+
+    def _shortfall(self, reservation):
+        """Return (path, needed, available) of the first filesystem that is
+        too small, None if the reservation fits"""
+        for device, size in reservation.needs.items():
+            path = reservation.paths[device]
+            available = free_bytes(path) - self.reserved.get(device, 0) - self.margin
+            if size > available:
+                return path, size, max(available, 0)
+        return None
+
+    def reserve(self, repo, needs):
+        """Reserve [(path, bytes)] for repo, waiting for running jobs if needed.
+
+        Raises NotEnoughSpace when the job can't fit.
+        """
+        reservation = self._group(repo, needs)
+        with self._condition:
+            while True:
+                shortfall = self._shortfall(reservation)
+                if shortfall is None:
+                    for device, size in reservation.needs.items():
+                        self.reserved[device] = self.reserved.get(device, 0) + size
+                    self.held[repo] = reservation
+                    return reservation
+                # only space promised to other jobs can come back
+                if not self.held or not self._condition.wait(self.wait_timeout):
+                    path, size, available = shortfall
+                    raise NotEnoughSpace(
+                        f"not enough disk space in {path}: needs "
+                        f"{format_size(size)}, {format_size(available)} free"
+                    )
+
+    def release(self, repo):
+        """Give the space reserved for repo back, if any"""
+        with self._condition:
+            reservation = self.held.pop(repo, None)
+            if reservation is None:
+                return
+            for device, size in reservation.needs.items():
+                self.reserved[device] -= size
+            self._condition.notify_all()
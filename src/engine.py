@@ -0,0 +1,790 @@
+import os
+import time
+import shutil
+import logging
+from functools import partial
+from dataclasses import dataclass, field
+import requests
+from src.assets import select_appimage_asset
+from src.cache import ArtifactCache
+from src.config_store import ConfigStore
+from src.desktop import DesktopIntegrator, load_desktop_integrator
+from src.diskspace import DEFAULT_MARGIN, NotEnoughSpace, SpaceLedger
+from src.errors import UpdateError, UpToDate
+from src.file_handler import FileHandler
+from src.hashing import DigestCache, hash_file, split_digest
+from src.jobs import AppConfig, JobResult, UpdateJob
+from src.fleet import Fleet, load_fleet
+from src.journal import (
+    INSTALL_STAGES,
+    UNTOUCHED_STAGES,
+    RunJournal,
+    interrupted,
+    merge_unfinished,
+)
+from src.locks import LockBusy, LockManager, load_lock_settings
+from src.peers import PeerClient
+from src.pipeline import UpdatePipeline
+from src.planner import (
+    ThroughputHistory,
+    budget_from_settings,
+    load_planner_settings,
+    plan_updates,
+)
+from src.progress import get_reporter
+from src.probe import load_probe_settings, probed_up_to_date
+from src.schedule import ReleaseSchedule
+from src.staging import StagingArea
+from src.session import http_get
+from src.watchdog import DownloadGuard, load_download_guard
+from src.update_info import read_update_info
+
+# message of the results of apps another run holds
+LOCKED_MESSAGE = "locked by another run"
+# seconds a release fetched by check() is reused by the update that follows
+RELEASE_TTL = 300
+
+
+def appimage_size(release, update_info=None, rule=None, learned=None):
+    """Return the size of the asset get_response would download, None if unknown"""
+    asset = select_appimage_asset(
+        release.get("assets", []), update_info, rule, learned=learned
+    )
+    return asset.get("size") if asset is not None else None
+
+
+def _matches(path, digest):
+    """True if the file at path has the "hash_type:hex" digest"""
+    if not os.path.isfile(path):
+        return False
+    hash_type, expected = split_digest(digest)
+    return hash_file(path, hash_type) == expected
+
+
+def _put_in_place(source, destination):
+    """Copy source over destination, renamed into place in one step"""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    tmp_path = os.path.join(
+        os.path.dirname(destination),
+        f".{os.path.basename(destination)}.{os.getpid()}.tmp",
+    )
+    shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def _none_locked(results):
+    """True unless another run held one of the apps of the results"""
+    return not any(result.message == LOCKED_MESSAGE for result in results)
+
+
+def _settle_journals(journals, done):
+    """Remove adopted journals once their apps are settled, else keep them
+    for the next resume"""
+    for journal in journals:
+        if done:
+            journal.close()
+        else:
+            journal.release()
+
+
+@dataclass
+class UpdateEngine:
+    """Check and update appimages described by immutable AppConfig/UpdateJob.
+
+    The engine only holds shared, thread-safe resources (config store and
+    caches). Every job gets a fresh FileHandler worker, so one engine can run
+    any number of batches and be embedded in other tools:
+
+        engine = UpdateEngine(file_path)
+        outdated = [r for r in engine.check() if r.status == "outdated"]
+        results = engine.run(engine.jobs([r.repo for r in outdated]))
+    """
+
+    file_path: str
+    artifact_cache: ArtifactCache = None
+    digest_cache: DigestCache = None
+    throughput: ThroughputHistory = None
+    schedule: ReleaseSchedule = None
+    locks: LockManager = None
+    peers: PeerClient = None
+    fleet: Fleet = None
+    guard: DownloadGuard = None
+    space: SpaceLedger = None
+    journal_dir: str = None  # one RunJournal per run, see src/journal.py
+    desktop: DesktopIntegrator = None
+    probe_backend: str = None  # "web" or "api", see src/probe.py
+    atom_fallback: bool = True
+    queue_size: int = 2
+    config_store: ConfigStore = field(init=False)
+    # {repo: (monotonic time, release json)} of the releases check() fetched
+    releases: dict = field(default_factory=dict, init=False)
+
+    def __post_init__(self):
+        self.file_path = os.path.join(os.path.expanduser(self.file_path), "")
+        self.config_store = ConfigStore(self.file_path)
+        if self.digest_cache is None:
+            self.digest_cache = DigestCache(
+                os.path.join(self.file_path, "other_settings", "digest_cache.json")
+            )
+        if self.throughput is None:
+            self.throughput = ThroughputHistory(
+                os.path.join(self.file_path, "other_settings", "throughput.json")
+            )
+        if self.schedule is None:
+            self.schedule = ReleaseSchedule(
+                os.path.join(self.file_path, "other_settings", "release_history.json")
+            )
+        if self.fleet is None:
+            self.fleet = load_fleet(
+                os.path.join(self.file_path, "other_settings", "fleet.json")
+            )
+        if self.journal_dir is None:
+            self.journal_dir = os.path.join(self.file_path, "other_settings", "journal")
+        if self.desktop is None:
+            self.desktop = load_desktop_integrator(
+                os.path.join(self.file_path, "other_settings", "desktop.json")
+            )
+        if self.probe_backend is None:
+            settings = load_probe_settings(
+                os.path.join(self.file_path, "other_settings", "probe.json")
+            )
+            self.probe_backend = settings.get("backend", "web")
+            self.atom_fallback = settings.get("atom_fallback", True)
+        if self.space is None:
+            settings = load_planner_settings(
+                os.path.join(self.file_path, "other_settings", "planner.json")
+            )
+            self.space = SpaceLedger(
+                margin=settings.get("min_free_megabytes", DEFAULT_MARGIN // 2**20)
+                * 2**20
+            )
+        if self.guard is None:
+            self.guard = load_download_guard(
+                os.path.join(self.file_path, "other_settings", "watchdog.json"),
+                os.path.join(self.file_path, "other_settings", "host_timeouts.json"),
+            )
+        if self.locks is None:
+            settings = load_lock_settings(
+                os.path.join(self.file_path, "other_settings", "locks.json")
+            )
+            self.locks = LockManager(
+                os.path.join(self.file_path, "other_settings", "locks"),
+                policy=settings.get("policy", "split"),
+                timeout=settings.get("timeout_seconds"),
+            )
+
+    @classmethod
+    def from_file_handler(cls, file_handler):
+        """Build an engine sharing the folders and caches of a FileHandler"""
+        return cls(
+            file_handler.file_path,
+            artifact_cache=file_handler.artifact_cache,
+            digest_cache=file_handler.digest_cache,
+            throughput=file_handler.throughput,
+            peers=file_handler.peers,
+            guard=file_handler.guard,
+            desktop=file_handler.desktop,
+        )
+
+    def configs(self, refresh=True):
+        """Return the AppConfig of every valid config file, sorted by repo"""
+        if refresh:
+            self.config_store.refresh()
+        configs = []
+        for repo, data in sorted(self.config_store.configs().items()):
+            try:
+                configs.append(AppConfig.from_dict(data, f"{repo}.json"))
+            except ValueError as error:
+                # one broken file doesn't stop the other apps
+                logging.error(f"Skipping config: {error}")
+        return configs
+
+    def jobs(self, repos, batch_mode=True):
+        """Return an UpdateJob for each repo from the current configs"""
+        configs = {config.repo: config for config in self.configs()}
+        return [UpdateJob(configs[repo], batch_mode=batch_mode) for repo in repos]
+
+    def latest_release(self, config, update_info=None):
+        """Return the latest release of an app from the GitHub API.
+
+        update_info embedded in the installed AppImage picks the release.
+        """
+        url = (
+            f"https://api.github.com/repos/{config.owner}/{config.repo}/releases/latest"
+        )
+        if update_info is not None and update_info.is_github:
+            url = update_info.api_url
+        response = http_get(url, timeout=10)
+        if response.status_code != 200:
+            # 403 here usually means the API rate limit is exceeded
+            raise UpdateError(
+                f"GitHub API returned {response.status_code} for {config.owner}/{config.repo}"
+            )
+        return response.json()
+
+    def fleet_release(self, config, update_info=None):
+        """Return the latest release, from the fleet store if another host checks it"""
+        if self.fleet is None:
+            return self.latest_release(config, update_info)
+        return self.fleet.release(
+            f"{config.owner}/{config.repo}",
+            lambda: self.latest_release(config, update_info),
+        )
+
+    def latest_version(self, config):
+        """Return the latest release version of an app from the GitHub API"""
+        return self.latest_release(config)["tag_name"].replace("v", "")
+
+    def fresh_release(self, repo):
+        """Return the release check() fetched for repo recently, else None"""
+        fetched_at, release = self.releases.get(repo, (0, None))
+        if time.monotonic() - fetched_at > RELEASE_TTL:
+            return None
+        return release
+
+    def check(self, configs=None, scheduled=False, cancel=None):
+        """Compare every config with its latest release.
+
+        Returns one JobResult per app: "outdated" or "up_to_date" with the
+        latest version, or "failed" if the repo couldn't be checked.
+
+        scheduled=True is a routine check: repos that aren't due yet according
+        to their release cadence are not queried and come back as "skipped".
+        With the "web" probe backend only repos whose latest tag on github.com
+        changed cost an API call. In a fleet, repos another host checks are
+        read from the shared store and neither probed nor queried. The
+        releases fetched are reused by an update started within RELEASE_TTL
+        seconds. Setting the cancel event
+        stops the check before the next repo.
+        """
+        results = []
+        now = time.time()
+        if self.fleet is not None:
+            # heartbeat, and learn which repos are ours this round
+            self.fleet.join()
+        for config in self.configs() if configs is None else configs:
+            if cancel is not None and cancel.is_set():
+                break
+            if scheduled and not self.schedule.is_due(
+                config.repo, config.check_interval_hours, now
+            ):
+                wait = self.schedule.next_check(
+                    config.repo, config.check_interval_hours
+                )
+                results.append(
+                    JobResult(
+                        config.repo,
+                        "skipped",
+                        f"next check in {(wait - now) / 3600:.1f}h",
+                        config.version,
+                    )
+                )
+                continue
+            update_info = read_update_info(config.installed_path)
+            key = f"{config.owner}/{config.repo}"
+            # a release another host published costs no request at all
+            release = None
+            if self.fleet is not None:
+                release = self.fleet.shared_release(key)
+            # the API is only needed for the details of a new release
+            if (
+                release is None
+                and self.probe_backend == "web"
+                and probed_up_to_date(
+                    config.owner,
+                    config.repo,
+                    config.version,
+                    update_info,
+                    self.atom_fallback,
+                )
+            ):
+                # a probe has no publish date, it only counts as a check; the
+                # release was recorded when the API was asked for it
+                self.schedule.record(config.repo)
+                if self.fleet is not None:
+                    self.fleet.confirm(key, config.version)
+                results.append(
+                    JobResult(config.repo, "up_to_date", version=config.version)
+                )
+                continue
+            try:
+                if release is None:
+                    release = self.fleet_release(config, update_info)
+                latest_version = release["tag_name"].replace("v", "")
+                self.releases[config.repo] = (time.monotonic(), release)
+            except (
+                UpdateError,
+                KeyError,
+                ValueError,
+                requests.exceptions.RequestException,
+            ) as error:
+                logging.error(f"Error checking {config.repo}: {error}")
+                results.append(JobResult(config.repo, "failed", str(error)))
+                continue
+
+            status = "up_to_date" if latest_version == config.version else "outdated"
+            self.schedule.record(
+                config.repo, release.get("published_at"), status == "up_to_date"
+            )
+            results.append(
+                JobResult(
+                    config.repo,
+                    status,
+                    version=latest_version,
+                    size=appimage_size(
+                        release,
+                        update_info,
+                        config.asset_pattern,
+                        config.learned_asset_pattern,
+                    ),
+                )
+            )
+        self.schedule.save()
+        return results
+
+    def plan(self, results, settings=None):
+        """Order the "outdated" results and fit them into the budget.
+
+        settings default to other_settings/planner.json: "order" ("size" or
+        "priority"), "max_megabytes" and "max_minutes".
+        """
+        if settings is None:
+            settings = load_planner_settings(
+                os.path.join(self.file_path, "other_settings", "planner.json")
+            )
+        max_bytes, max_seconds = budget_from_settings(settings)
+        configs = {config.repo: config for config in self.configs(refresh=False)}
+        return plan_updates(
+            [result for result in results if result.status == "outdated"],
+            configs,
+            rate=self.throughput.rate(),
+            order=settings.get("order", "size"),
+            max_bytes=max_bytes,
+            max_seconds=max_seconds,
+        )
+
+    def worker(self, job, journal=None):
+        """Return a FileHandler holding the state of one job, recording its
+        stages in the journal of its run if given"""
+        worker = FileHandler(
+            file_path=self.file_path,
+            artifact_cache=self.artifact_cache,
+            digest_cache=self.digest_cache,
+            throughput=self.throughput,
+            peers=self.peers,
+            guard=self.guard,
+            journal=journal,
+            desktop=self.desktop,
+            probe_backend=self.probe_backend,
+            atom_fallback=self.atom_fallback,
+            batch_mode=job.batch_mode,
+        )
+        worker.apply_config(job.config)
+        worker.prefetched_release = self.fresh_release(job.repo)
+        return worker
+
+    def run_job(self, job, journal=None):
+        """Update one appimage and return its JobResult"""
+        worker = self.worker(job, journal)
+        try:
+            worker.get_response()
+            worker.journal_stage("checked")
+            self.space.reserve(job.repo, worker.space_needed())
+            worker.download()
+            worker.journal_stage("downloaded")
+            if not worker.verify_sha():
+                return JobResult(job.repo, "failed", "verify")
+            worker.journal_stage("verified")
+            worker.make_executable()
+            if worker.handle_file_operations(batch_mode=job.batch_mode) is False:
+                return JobResult(job.repo, "skipped", version=worker.version)
+        except UpToDate:
+            return JobResult(
+                job.repo,
+                "up_to_date",
+                version=worker.version,
+                published_at=worker.published_at,
+            )
+        except NotEnoughSpace as error:
+            print(f"\033[41;30m{job.repo}: {error}\033[0m")
+            return JobResult(job.repo, "skipped", str(error))
+        except UpdateError as error:
+            # keep going, every other appimage can still be updated
+            return JobResult(job.repo, "failed", str(error))
+        finally:
+            self.space.release(job.repo)
+        return JobResult(
+            job.repo,
+            "updated",
+            version=worker.version,
+            published_at=worker.published_at,
+        )
+
+    def activate(self, job, staged, journal=None):
+        """Install a prefetched release by renaming it into place"""
+        worker = self.worker(job, journal)
+        if not job.batch_mode:
+            print(
+                _("{repo} {version} is downloaded and verified.").format(
+                    repo=job.repo, version=staged.version
+                )
+            )
+            if input(_("Do you want to continue? (y/n): ")).lower() != "y":
+                return JobResult(job.repo, "skipped", version=staged.version)
+        backup = None
+        if job.config.backs_up:
+            backup = os.path.join(job.config.backup_folder, f"{job.repo}.AppImage")
+        try:
+            StagingArea(job.config.folder).activate(
+                staged, job.config.installed_path, backup
+            )
+        except OSError as error:
+            logging.error(f"Couldn't activate staged {job.repo}: {error}")
+            return JobResult(job.repo, "failed", f"activate: {error}")
+        worker.version = staged.version
+        worker.verified_digest = staged.digest
+        worker.journal_stage("installed")
+        worker.integrate_desktop()
+        worker.update_version()
+        worker.journal_stage("config_written")
+        print(
+            _(
+                "\033[42m{repo} updated to {version} from the staging area\033[0m"
+            ).format(repo=job.repo, version=staged.version)
+        )
+        return JobResult(job.repo, "updated", "staged", staged.version)
+
+    def prefetch_job(self, job):
+        """Download and verify the latest release of one app into its staging
+        area without installing it"""
+        worker = self.worker(job)
+        staging = StagingArea(job.config.folder)
+        try:
+            worker.get_response()
+            staged = staging.get(job.repo, job.config.version)
+            if staged is not None and staged.version == worker.version:
+                return JobResult(job.repo, "skipped", "already staged", worker.version)
+            self.space.reserve(job.repo, worker.space_needed(backup=False))
+            worker.download()
+            if not worker.verify_sha():
+                return JobResult(job.repo, "failed", "verify")
+            if worker.release_installed:
+                # the installed file is already this release, nothing to stage
+                return JobResult(
+                    job.repo, "skipped", "already installed", worker.version
+                )
+            worker.make_executable()
+            staging.stage(
+                job.repo,
+                worker.appimage_name,
+                worker.version,
+                job.config.version,
+                worker.verified_digest,
+            )
+        except UpToDate:
+            return JobResult(job.repo, "up_to_date", version=worker.version)
+        except NotEnoughSpace as error:
+            return JobResult(job.repo, "skipped", str(error))
+        except (UpdateError, OSError) as error:
+            return JobResult(job.repo, "failed", str(error))
+        except (EOFError, SystemExit):
+            # a helper prompted, nobody is there to answer a prefetch
+            return JobResult(job.repo, "failed", "verify")
+        finally:
+            self.space.release(job.repo)
+        return JobResult(
+            job.repo, "staged", version=worker.version, published_at=worker.published_at
+        )
+
+    def prefetch(self, configs=None):
+        """Stage every pending update for a later, instant run().
+
+        Returns one JobResult per app, "staged" for the ones prefetched now.
+        """
+        outdated = [
+            result.repo for result in self.check(configs) if result.status == "outdated"
+        ]
+        jobs = self.jobs(outdated)
+
+        def work(jobs, claims):
+            get_reporter().start_batch()
+            results = []
+            for job in jobs:
+                print(_("Prefetching {repo}...").format(repo=job.repo))
+                results.append(self._claimed(job, claims, self.prefetch_job))
+            return results
+
+        results = self._locked(jobs, work)
+        self._record_schedule(results)
+        return results
+
+    def _run(self, jobs, claims, journal=None):
+        if all(job.batch_mode for job in jobs):
+            return UpdatePipeline(
+                partial(self.worker, journal=journal),
+                queue_size=self.queue_size,
+                space=self.space,
+                claim=partial(self._claim, claims=claims),
+            ).run(jobs)
+
+        results = []
+        for job in jobs:
+            print(_("Updating {appimage}...").format(appimage=job.repo))
+            results.append(
+                self._claimed(job, claims, partial(self.run_job, journal=journal))
+            )
+        return results
+
+    def _claim(self, job, claims):
+        """Lock the app of a job just before it starts.
+
+        Returns (FileLock, the job with the config re-read under the lock),
+        or (None, JobResult) when another run holds the app or its config is
+        gone.
+        """
+        try:
+            lock = claims.claim(job.repo)
+        except LockBusy:
+            print(
+                _("{repo} is being updated by another run, skipped").format(
+                    repo=job.repo
+                )
+            )
+            return None, JobResult(job.repo, "skipped", LOCKED_MESSAGE)
+        # another run may have updated it since the job was made
+        path = os.path.join(self.file_path, f"{job.repo}.json")
+        try:
+            config = AppConfig.load(path)
+        except (OSError, ValueError) as error:
+            lock.release()
+            logging.error(f"Couldn't read {path}: {error}")
+            return None, JobResult(job.repo, "skipped", f"config: {error}")
+        return lock, UpdateJob(config, job.batch_mode)
+
+    def _claimed(self, job, claims, func):
+        """Return func(job) run with the app of the job locked"""
+        lock, claimed = self._claim(job, claims)
+        if lock is None:
+            return claimed
+        try:
+            return func(claimed)
+        finally:
+            lock.release()
+
+    def _locked(self, jobs, work):
+        """Return work(jobs, claims) run under the config directory lock.
+
+        work claims each app from claims right before its job starts. Apps
+        another process is working on are waited for or skipped by the lock
+        policy, they come back as "skipped" results.
+        """
+        try:
+            run_lock = self.locks.run_lock()
+        except LockBusy:
+            print(_("Another my-unicorn run is active, not updating now."))
+            return [
+                JobResult(job.repo, "skipped", "another run is active") for job in jobs
+            ]
+
+        claims = self.locks.claims([job.repo for job in jobs])
+        try:
+            return work(jobs, claims)
+        finally:
+            claims.release()
+            run_lock.release()
+
+    def recover(self, job, entry):
+        """Bring an app an interrupted run left half installed back to a
+        consistent state.
+
+        The update is rolled forward when the new release is already in place
+        or its verified download is still there, else the old appimage is put
+        back from the backup. Returns None when the app is unchanged (nothing
+        outside the download folder was touched, or it was rolled back) and
+        the job can simply run again.
+        """
+        stage = entry.get("stage", "pending")
+        version, digest = entry.get("version"), entry.get("digest")
+        if stage == "config_written" or (version and job.config.version == version):
+            return JobResult(job.repo, "updated", "before the interruption", version)
+        if stage in UNTOUCHED_STAGES:
+            return None
+
+        installed = job.config.installed_path
+        # without a digest only a finished install can be trusted
+        in_place = _matches(installed, digest) if digest else stage == "installed"
+        if not in_place and digest:
+            download = entry.get("download") or ""
+            candidates = (
+                download,
+                os.path.join(os.path.dirname(download), f"{job.repo}.AppImage"),
+            )
+            for candidate in candidates:
+                if _matches(candidate, digest):
+                    _put_in_place(candidate, installed)
+                    os.remove(candidate)
+                    in_place = True
+                    break
+
+        if not in_place:
+            backup = entry.get("backup")
+            if job.config.backs_up and backup and os.path.isfile(backup):
+                _put_in_place(backup, installed)
+                print(_("{repo}: interrupted update rolled back").format(repo=job.repo))
+                return None
+            if os.path.isfile(installed):
+                # the rename into place never happened, the old file is intact
+                return None
+            return JobResult(
+                job.repo, "failed", "interrupted install, no backup to restore"
+            )
+
+        worker = self.worker(job)
+        worker.version = version
+        worker.verified_digest = digest
+        worker.update_version()
+        print(
+            _("\033[42m{repo}: interrupted update to {version} finished\033[0m").format(
+                repo=job.repo, version=version
+            )
+        )
+        return JobResult(job.repo, "updated", "resumed", version)
+
+    def _recover_job(self, job, entries):
+        try:
+            return self.recover(job, entries.get(job.repo, {}))
+        except OSError as error:
+            logging.error(f"Couldn't recover {job.repo}: {error}")
+            return JobResult(job.repo, "failed", f"recover: {error}")
+
+    def _recover(self, jobs, entries, claims):
+        """Recover the jobs from their journal entries, return the results of
+        the ones that are settled and the jobs to run again"""
+        results, pending = [], []
+        for job in jobs:
+            result = self._claimed(
+                job, claims, partial(self._recover_job, entries=entries)
+            )
+            if result is None:
+                pending.append(job)
+            else:
+                results.append(result)
+        return results, pending
+
+    def _activate_staged(self, job, journal):
+        staged = StagingArea(job.config.folder).get(job.repo, job.config.version)
+        if staged is None:
+            # another run installed it in the meantime
+            return self.run_job(job, journal)
+        return self.activate(job, staged, journal)
+
+    def _update(self, jobs, claims):
+        get_reporter().start_batch()
+        # written before anything changes, an interrupted run leaves it behind
+        journal = RunJournal(self.journal_dir)
+        journal.begin(jobs)
+        results = []
+        pending = []
+        # the desktop database and icon cache are refreshed once per run
+        with self.desktop.batch():
+            for job in jobs:
+                if StagingArea(job.config.folder).get(job.repo, job.config.version):
+                    results.append(
+                        self._claimed(
+                            job,
+                            claims,
+                            partial(self._activate_staged, journal=journal),
+                        )
+                    )
+                else:
+                    pending.append(job)
+            results += self._run(pending, claims, journal)
+        journal.close()
+        return results
+
+    def _journaled_jobs(self, entries):
+        """Return the jobs of the journal entries whose apps still have a config"""
+        configs = {config.repo: config for config in self.configs()}
+        return [
+            UpdateJob(configs[repo], entry.get("batch_mode", True))
+            for repo, entry in entries.items()
+            if repo in configs
+        ]
+
+    def _record_schedule(self, results):
+        # an updated app is up to date, its next check follows its cadence
+        for result in results:
+            if result.status in ("updated", "up_to_date"):
+                self.schedule.record(result.repo, result.published_at)
+            elif result.published_at:
+                # a release seen on the way, e.g. by a prefetch
+                self.schedule.record(result.repo, result.published_at, False)
+        self.schedule.save()
+
+    def has_interrupted_run(self):
+        """True if a run died and left a journal to resume"""
+        journals = interrupted(self.journal_dir)
+        for journal in journals:
+            journal.release()
+        return bool(journals)
+
+    def resume(self):
+        """Continue the update runs the journals say were interrupted.
+
+        Apps they left half installed are rolled forward or back, the ones
+        they didn't get to (or that were rolled back) are updated now, without
+        checking every repo or asking for the selection again. Returns None
+        when there is no interrupted run. Runs that are still going are left
+        alone.
+        """
+        journals = interrupted(self.journal_dir)
+        if not journals:
+            return None
+        entries = merge_unfinished(journals)
+
+        def work(jobs, claims):
+            results, pending = self._recover(jobs, entries, claims)
+            return results + self._update(pending, claims)
+
+        try:
+            results = self._locked(self._journaled_jobs(entries), work)
+        except BaseException:
+            # interrupted again, keep the old journals for the next resume
+            _settle_journals(journals, done=False)
+            raise
+        _settle_journals(journals, done=_none_locked(results))
+        self._record_schedule(results)
+        return results
+
+    def run(self, jobs):
+        """Update the jobs and return one JobResult per job.
+
+        Releases prefetched into the staging area are activated right away,
+        unattended jobs go through the overlapped pipeline, and jobs that
+        prompt run one after another. Each app is locked while its job runs, and
+        every stage is written to the journal of the run so resume() can
+        continue it if it is interrupted.
+        """
+        journals = interrupted(self.journal_dir)
+        if journals:
+            # this run replaces the interrupted ones, settle what they left
+            # half installed first, under the locks of those apps
+            entries = {
+                repo: entry
+                for repo, entry in merge_unfinished(journals).items()
+                if entry["stage"] in INSTALL_STAGES
+            }
+            leftovers = self._journaled_jobs(entries)
+            if leftovers:
+                print(_("Recovering apps an interrupted run left half installed..."))
+                recovered = self._locked(
+                    leftovers,
+                    lambda jobs, claims: self._recover(jobs, entries, claims)[0],
+                )
+            else:
+                recovered = []
+            _settle_journals(journals, done=_none_locked(recovered))
+
+        results = self._locked(jobs, self._update)
+        self._record_schedule(results)
+        return results
@@ -0,0 +1,10 @@
+class UpdateError(Exception):
+    """An appimage could not be updated, the message was already shown.
+
+    Raised instead of exiting so a batch can record the failure and carry on
+    with the next appimage.
+    """
+
+
+class UpToDate(Exception):
+    """The appimage already runs the latest release, nothing to update"""
@@ -1,16 +1,29 @@
 import base64
-import hashlib
 import os
 import subprocess
-import sys
 import logging
 import json
 import shutil
-from dataclasses import dataclass
-import requests
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 import yaml
 from src.decorators import handle_api_errors, handle_common_errors
+from src.desktop import DesktopIntegrator, load_desktop_integrator
 from src.app_image_downloader import AppImageDownloader
+from src.cache import ArtifactCache, load_artifact_cache
+from src.hashing import DigestCache, format_digest, hash_file, split_digest
+from src.errors import UpdateError
+from src.journal import RunJournal
+from src.mirrors import MirrorDownloader, source_urls
+from src.probe import load_probe_settings
+from src.peers import PeerClient, load_peer_client
+from src.planner import ThroughputHistory
+from src.session import http_get
+from src.watchdog import load_download_guard
+
+# small pool for sha files fetched while the appimages download
+SHA_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sha")
 
 
 @dataclass
@@ -19,98 +32,92 @@ class FileHandler(AppImageDownloader):
 
     sha_name: str = None
     sha_url: str = None
-
-    @staticmethod
-    def sha_response_error(func):
-        """Handle response errors"""
-
-        def wrapper(self, response):
-            if response.status_code == 200:
-                self.download_sha(response=response)
-                result = func(self, response)
-            else:
-                response.close()
-                self.handle_connection_error()
-                result = None
-            return result
-
-        return wrapper
+    artifact_cache: ArtifactCache = None
+    verified_digest: str = field(default=None, init=False)
+    # digest the download was hashed to on its way in (peer or cache store),
+    # so verify_sha doesn't read the file again
+    downloaded_digest: str = field(default=None, init=False)
+    digest_cache: DigestCache = None
+    release_installed: bool = field(default=False, init=False)
+    sha_future: Future = field(default=None, init=False, repr=False)
+    peers: PeerClient = None
+    journal: RunJournal = None
+    desktop: DesktopIntegrator = None
+    batch_mode: bool = False  # unattended, nothing may prompt
+
+    def __post_init__(self):
+        super().__post_init__()
+        # workers of a batch share the caches of the engine that created them
+        if self.artifact_cache is None:
+            self.artifact_cache = load_artifact_cache(self.config_cache_path)
+        if self.digest_cache is None:
+            self.digest_cache = DigestCache(self.digest_cache_path)
+        if self.throughput is None:
+            self.throughput = ThroughputHistory(self.throughput_path)
+        if self.peers is None:
+            self.peers = load_peer_client(self.config_peers_path)
+        if self.probe_backend is None:
+            settings = load_probe_settings(self.config_probe_path)
+            self.probe_backend = settings.get("backend", "web")
+            self.atom_fallback = settings.get("atom_fallback", True)
+        if self.guard is None:
+            self.guard = load_download_guard(
+                self.config_watchdog_path, self.host_timeouts_path
+            )
+        if self.desktop is None:
+            self.desktop = load_desktop_integrator(self.config_desktop_path)
 
     @handle_api_errors
     def get_sha(self):
         """Get the sha name and url"""
         print("************************************")
         print(_("Downloading {sha_name}...").format(sha_name=self.sha_name))
-        response = requests.get(self.sha_url, timeout=10)
+        response = http_get(self.sha_url, timeout=10)
         return response
 
-    def download_sha(self, response):
-        """Install the sha file"""
-        # Check if the sha file already exists
-        if not os.path.exists(self.sha_name):
-            with open(self.sha_name, "w", encoding="utf-8") as file:
-                file.write(response.text)
-            print(
-                _("\033[42mDownloaded {sha_name}\033[0m").format(sha_name=self.sha_name)
-            )
-        else:
-            # If the sha file already exists, check if it is the same as the downloaded one
-            with open(self.sha_name, "r", encoding="utf-8") as file:
-                if response.text == file.read():
-                    print(_("{sha_name} already exists").format(sha_name=self.sha_name))
-                else:
-                    print(
-                        _(
-                            "{sha_name} already exists but it is different from the downloaded one"
-                        ).format(sha_name=self.sha_name)
-                    )
-                    if input(_("Do you want to overwrite it? (y/n): ")).lower() == "y":
-                        with open(self.sha_name, "w", encoding="utf-8") as file:
-                            file.write(response.text)
-                        print(
-                            _("\033[42mDownloaded {sha_name}\033[0m").format(
-                                sha_name=self.sha_name
-                            )
-                        )
-                    else:
-                        print(_("Exiting..."))
-                        sys.exit()
+    def prefetch_sha(self):
+        """Start fetching the sha file in the background"""
+        if self.sha_future is None and self.sha_url and not self.asset_digest:
+            self.sha_future = SHA_EXECUTOR.submit(self.get_sha)
+
+    def sha_text(self):
+        """Return the sha file contents, waiting for a running prefetch"""
+        if self.sha_future is None:
+            self.sha_future = SHA_EXECUTOR.submit(self.get_sha)
+        response = self.sha_future.result()
+        if response is None or response.status_code != 200:
+            if response is not None:
+                response.close()
+            self.handle_connection_error()
+        print(_("\033[42mDownloaded {sha_name}\033[0m").format(sha_name=self.sha_name))
+        return response.text
 
     def handle_verification_error(self):
-        """Handle verification errors"""
+        """Handle verification errors.
+
+        In batch mode the bad download is deleted and the job fails without
+        asking, nobody may be there to answer.
+        """
         print(
             _("\033[41;30mError verifying {appimage_name}\033[0m").format(
                 appimage_name=self.appimage_name
             )
         )
         logging.error(f"Error verifying {self.appimage_name}")
+        if self.batch_mode:
+            try:
+                os.remove(self.appimage_name)
+            except FileNotFoundError:
+                pass
+            print(_("Deleted {appimage_name}").format(appimage_name=self.appimage_name))
+            raise UpdateError(f"Error verifying {self.appimage_name}")
         if (
             input(_("Do you want to delete the downloaded appimage? (y/n): ")).lower()
             == "y"
         ):
             os.remove(self.appimage_name)
             print(_("Deleted {appimage_name}").format(appimage_name=self.appimage_name))
-            # Delete the downloaded sha file too
-            if (
-                input(
-                    _("Do you want to delete the downloaded sha file? (y/n): ")
-                ).lower()
-                == "y"
-            ):
-                os.remove(self.sha_name)
-                print(_("Deleted {sha_name}").format(sha_name=self.sha_name))
-                sys.exit()
-            else:
-                if (
-                    input(
-                        _("Do you want to continue without verification? (y/n): ")
-                    ).lower()
-                    == "y"
-                ):
-                    self.make_executable()
-                else:
-                    print(_("Exiting..."))
-                    sys.exit()
+            raise UpdateError(f"Error verifying {self.appimage_name}")
 
     def handle_connection_error(self):
         """Handle connection errors"""
@@ -120,7 +127,7 @@ class FileHandler(AppImageDownloader):
             )
         )
         logging.error(f"Error connecting to {self.sha_url}")
-        sys.exit()
+        raise UpdateError(f"Error connecting to {self.sha_url}")
 
     def ask_delete_appimage(self):
         """Delete the downloaded appimage"""
@@ -149,23 +156,29 @@ class FileHandler(AppImageDownloader):
                 )
             )
 
-    @sha_response_error
-    def verify_yml(self, response):
-        """Verify yml/yaml sha files"""
-        # parse the sha file
-        with open(self.sha_name, "r", encoding="utf-8") as file:
-            sha = yaml.safe_load(file)
+    def parse_sha(self, text):
+        """Return the expected appimage hash from the sha file contents"""
+        if self.sha_name.endswith(".yml") or self.sha_name.endswith(".yaml"):
+            # electron-builder files keep the hash base64 encoded
+            sha = yaml.safe_load(text)
+            return base64.b64decode(sha[self.hash_type]).hex()
 
-        # get the sha from the sha file
-        sha = sha[self.hash_type]
-        decoded_hash = base64.b64decode(sha).hex()
+        for line in text.splitlines():
+            if self.appimage_name in line:
+                return line.split()[0]
+        return None
 
-        # find appimage sha
-        with open(self.appimage_name, "rb") as file:
-            appimage_sha = hashlib.new(self.hash_type, file.read()).hexdigest()
+    def verify_sha_file(self):
+        """Verify the appimage against the published sha file"""
+        # Parse the sha file, usually fetched while the appimage downloaded
+        decoded_hash = self.parse_sha(self.sha_text())
+
+        # Find appimage sha
+        appimage_hash = self.appimage_hash(self.hash_type)
 
-        # compare the two hashes
-        if appimage_sha == decoded_hash:
+        # Compare the two hashes
+        if appimage_hash == decoded_hash:
+            self.verified_digest = format_digest(self.hash_type, appimage_hash)
             print(
                 _("\033[42m{appimage_name} verified.\033[0m").format(
                     appimage_name=self.appimage_name
@@ -173,7 +186,9 @@ class FileHandler(AppImageDownloader):
             )
             print("************************************")
             print(_("--------------------- HASHES ----------------------"))
-            print(_("AppImage Hash: {appimage_sha}").format(appimage_sha=appimage_sha))
+            print(
+                _("AppImage Hash: {appimage_hash}").format(appimage_hash=appimage_hash)
+            )
             print(_("Parsed Hash: {decoded_hash}").format(decoded_hash=decoded_hash))
             print("----------------------------------------------------")
             return True
@@ -181,25 +196,232 @@ class FileHandler(AppImageDownloader):
             self.handle_verification_error()
             return False
 
-        # close response
-        response.close()
+    def appimage_hash(self, hash_type):
+        """Return the hex digest of the download, hashing it only if it
+        wasn't hashed on its way in"""
+        if self.downloaded_digest is not None:
+            known_type, digest = split_digest(self.downloaded_digest)
+            if known_type == hash_type.lower():
+                return digest
+        return hash_file(self.appimage_name, hash_type)
+
+    def expected_digest(self):
+        """Return the expected 'hash_type:hex' digest of the appimage.
+
+        GitHub publishes a digest for every release asset, use it when present.
+        Otherwise fetch the sha file ahead of the appimage and parse it.
+        """
+        if self.asset_digest:
+            return self.asset_digest.lower()
+        if not self.sha_name or not self.sha_url:
+            return None
+
+        digest = self.parse_sha(self.sha_text())
+        return format_digest(self.hash_type, digest) if digest else None
+
+    def installed_path(self):
+        """Return the path of the installed {repo}.AppImage"""
+        return os.path.join(
+            os.path.expanduser(self.appimage_folder), f"{self.repo}.AppImage"
+        )
 
-    @sha_response_error
-    def verify_other(self, response):
-        """Verify other sha files"""
-        # Parse the sha file
-        with open(self.sha_name, "r", encoding="utf-8") as file:
-            for line in file:
-                if self.appimage_name in line:
-                    decoded_hash = line.split()[0]
-                    break
+    def journal_stage(self, stage):
+        """Record a completed stage in the run journal, if this is a run"""
+        if self.journal is None:
+            return
+        self.journal.mark(
+            self.repo,
+            stage,
+            version=self.version,
+            digest=self.verified_digest,
+            download=os.path.abspath(self.appimage_name),
+            installed=self.installed_path(),
+            backup=os.path.join(
+                os.path.expanduser(self.appimage_folder_backup),
+                f"{self.repo}.AppImage",
+            ),
+        )
 
-        # Find appimage sha
-        with open(self.appimage_name, "rb") as file:
-            appimage_hash = hashlib.new(self.hash_type, file.read()).hexdigest()
+    def integrate_desktop(self):
+        """Install the launcher and icon of the installed appimage"""
+        if self.desktop.install(self.repo, self.installed_path()):
+            print(_("Desktop entry of {repo} installed").format(repo=self.repo))
+
+    def installed_digest(self, hash_type):
+        """Return the digest of the installed appimage, hashing it only if changed"""
+        installed = self.installed_path()
+        if not os.path.isfile(installed):
+            return None
+        digest = self.digest_cache.digest(installed, hash_type)
+        self.digest_cache.save()
+        return format_digest(hash_type, digest)
+
+    def space_needed(self, backup=True):
+        """Return [(path, bytes)] this update will write, empty if the asset
+        size is unknown.
+
+        The download lands in the current directory and is copied into the
+        appimage folder, the old appimage is copied to the backup folder.
+        A release that isn't in the artifact cache yet is copied there too,
+        unless the filesystem can reflink it, which isn't known in advance.
+        """
+        if not self.asset_size:
+            return []
+        needs = [
+            (os.getcwd(), self.asset_size),
+            (self.appimage_folder, self.asset_size),
+        ]
+        if self.artifact_cache and not (
+            self.asset_digest
+            and self.artifact_cache.lookup(*split_digest(self.asset_digest.lower()))
+        ):
+            needs.append((self.artifact_cache.cache_dir, self.asset_size))
+        installed = self.installed_path()
+        if backup and self.choice in (1, 3) and os.path.isfile(installed):
+            needs.append((self.appimage_folder_backup, os.path.getsize(installed)))
+        return needs
 
-        # Compare the two hashes
-        if appimage_hash == decoded_hash:
+    @handle_api_errors
+    def download(self):
+        """Download the appimage, reusing the shared artifact cache if enabled"""
+        self.verified_digest = None
+        self.downloaded_digest = None
+        self.release_installed = False
+        # the sha file is small, fetch it while the appimage downloads
+        self.sha_future = None
+        self.prefetch_sha()
+
+        digest = None
+        if (
+            self.asset_digest
+            or self.artifact_cache
+            or self.peers
+            or os.path.isfile(self.installed_path())
+        ):
+            digest = self.expected_digest()
+
+        # The version differs but the binary may not: same asset re-tagged, or
+        # the config was edited or recreated. Don't download it again then.
+        if digest and self.installed_digest(split_digest(digest)[0]) == digest:
+            print(
+                _(
+                    "\033[42m{repo}.AppImage already matches the latest release, skipping download\033[0m"
+                ).format(repo=self.repo)
+            )
+            self.release_installed = True
+            self.verified_digest = digest
+            return
+
+        if digest is None or not self.artifact_cache:
+            return self.fetch_release(digest)
+
+        try:
+            return self.fetch_through_cache(digest)
+        except PermissionError as error:
+            # a cache set up by another user without group access
+            logging.warning(f"Artifact cache not usable: {error}")
+            print(_("Artifact cache not writable, downloading directly"))
+            if not os.path.exists(self.appimage_name):
+                return self.fetch_release(digest)
+
+    def fetch_through_cache(self, digest):
+        """Take the appimage from the artifact cache, or download and store it.
+
+        Only one process/thread fetches a given digest, the others wait for it
+        and then pick the artifact up from the cache.
+        """
+        hash_type, hex_digest = split_digest(digest)
+        with self.artifact_cache.fetching(hash_type, hex_digest):
+            if self.artifact_cache.materialize(
+                hash_type, hex_digest, self.appimage_name
+            ):
+                print(
+                    _(
+                        "\033[42m{appimage_name} found in the artifact cache\033[0m"
+                    ).format(appimage_name=self.appimage_name)
+                )
+                self.verified_digest = digest
+                return
+
+            self.fetch_release(digest)
+            if not os.path.exists(self.appimage_name):
+                return
+            if self.downloaded_digest is None:
+                self.downloaded_digest = format_digest(
+                    hash_type, hash_file(self.appimage_name, hash_type)
+                )
+            if self.downloaded_digest == digest:
+                self.verified_digest = digest
+                self.artifact_cache.store(self.appimage_name, hash_type, hex_digest)
+
+    def fetch_release(self, digest):
+        """Download the appimage from a LAN peer that has it, else from the
+        fastest configured source or GitHub"""
+        if digest and self.peers and self.peers.fetch(digest, self.appimage_name):
+            # the peer client only keeps a file matching digest
+            self.downloaded_digest = digest
+            print(
+                _("\033[42m{appimage_name} downloaded from a LAN peer\033[0m").format(
+                    appimage_name=self.appimage_name
+                )
+            )
+            return None
+        if self.sources:
+            return self.download_from_sources()
+        return super().download()
+
+    def download_from_sources(self):
+        """Download the release asset from the configured sources.
+
+        The sources only replace the download url, the version and digest
+        still come from the GitHub release, so the file is verified the same
+        way whichever source sent it.
+        """
+        if os.path.exists(self.appimage_name):
+            print(
+                _("{appimage_name} already exists in the current directory").format(
+                    appimage_name=self.appimage_name
+                )
+            )
+            return
+        urls = source_urls(
+            self.sources,
+            self.url,
+            {
+                "owner": self.owner,
+                "repo": self.repo,
+                "tag": self.tag or self.version,
+                "version": self.version,
+                "asset": self.appimage_name,
+            },
+        )
+        downloader = MirrorDownloader(urls, size=self.asset_size, guard=self.guard)
+        print(
+            _("{repo} downloading from {count} sources...").format(
+                repo=self.repo, count=len(urls)
+            )
+        )
+        started = time.monotonic()
+        url = downloader.download(self.appimage_name)
+        if self.throughput is not None:
+            self.throughput.record(
+                os.path.getsize(self.appimage_name), time.monotonic() - started
+            )
+        print("-------------------------------------------------")
+        print(
+            _("\033[42mDownload completed! {appimage_name} from {url}\033[0m").format(
+                appimage_name=self.appimage_name, url=url
+            )
+        )
+        print("-------------------------------------------------")
+
+    def verify_asset_digest(self):
+        """Verify the appimage against the digest from the release metadata"""
+        hash_type, expected = split_digest(self.asset_digest)
+        appimage_hash = self.appimage_hash(hash_type)
+
+        if appimage_hash == expected:
+            self.verified_digest = format_digest(hash_type, appimage_hash)
             print(
                 _("\033[42m{appimage_name} verified.\033[0m").format(
                     appimage_name=self.appimage_name
@@ -210,7 +432,7 @@ class FileHandler(AppImageDownloader):
             print(
                 _("AppImage Hash: {appimage_hash}").format(appimage_hash=appimage_hash)
             )
-            print(_("Parsed Hash: {decoded_hash}").format(decoded_hash=decoded_hash))
+            print(_("Release Digest: {digest}").format(digest=expected))
             print("----------------------------------------------------")
             return True
         else:
@@ -219,14 +441,24 @@ class FileHandler(AppImageDownloader):
 
     def verify_sha(self):
         """Verify the downloaded appimage"""
-        if self.sha_name.endswith(".yml") or self.sha_name.endswith(".yaml"):
-            return self.verify_yml(response=self.get_sha())
-        else:
-            return self.verify_other(response=self.get_sha())
+        if self.release_installed:
+            return True
+        if self.asset_digest:
+            return self.verify_asset_digest()
+        return self.verify_sha_file()
 
     @handle_common_errors
     def handle_file_operations(self, batch_mode=False):
-        """Handle the file operations with one user's approval"""
+        """Handle the file operations with one user's approval.
+
+        Returns False if the user declined, True once the appimage is installed.
+        """
+        if self.release_installed:
+            print(_("Updating credentials in {repo}.json").format(repo=self.repo))
+            self.update_version()
+            self.journal_stage("config_written")
+            return True
+
         # 1. backup old appimage
         print(_("--------------------- CHANGES  ----------------------"))
         if self.choice == 1 or self.choice == 3:
@@ -245,7 +477,6 @@ class FileHandler(AppImageDownloader):
             _("Moving updated appimage to {folder}").format(folder=self.appimage_folder)
         )
         print(_("Updating credentials in {repo}.json").format(repo=self.repo))
-        print(_("Deleting {sha_name}").format(sha_name=self.sha_name))
         print("-----------------------------------------------------")
 
         # 6. Ask user for approval if not in batch mode
@@ -257,20 +488,24 @@ class FileHandler(AppImageDownloader):
                         appimage_name=self.appimage_name, cwd=os.getcwd()
                     )
                 )
-                return
+                return False
 
         if self.choice == 1 or self.choice == 3:
-            self.backup_old_appimage()
+            self.backup_old_appimage(batch_mode=batch_mode)
+            self.journal_stage("backed_up")
 
         self.change_name()
         self.move_appimage()
+        self.journal_stage("installed")
+        self.integrate_desktop()
         self.update_version()
-        os.remove(self.sha_name)
+        self.journal_stage("config_written")
+        return True
 
     def make_executable(self):
         """Make the appimage executable"""
-        # if already executable, return
-        if os.access(self.appimage_name, os.X_OK):
+        # if already executable or nothing was downloaded, return
+        if self.release_installed or os.access(self.appimage_name, os.X_OK):
             return
 
         print("************************************")
@@ -280,7 +515,7 @@ class FileHandler(AppImageDownloader):
         print("************************************")
 
     @handle_common_errors
-    def backup_old_appimage(self):
+    def backup_old_appimage(self, batch_mode=False):
         """Save old {self.repo}.AppImage to a backup folder"""
         backup_folder = os.path.expanduser(f"{self.appimage_folder_backup}")
         old_appimage = os.path.expanduser(f"{self.appimage_folder}{self.repo}.AppImage")
@@ -295,7 +530,8 @@ class FileHandler(AppImageDownloader):
             )
         else:
             if (
-                input(
+                batch_mode
+                or input(
                     _(
                         "Backup folder {backup_folder} not found, do you want to create it (y/n): "
                     ).format(backup_folder=backup_folder)
@@ -364,9 +600,32 @@ class FileHandler(AppImageDownloader):
         """Move appimages to a appimage folder"""
         # check if appimage folder exists
         os.makedirs(os.path.dirname(self.appimage_folder), exist_ok=True)
-        # move appimage to appimage folder
+
+        # reflink the verified artifact from the shared cache where possible
+        destination = os.path.join(self.appimage_folder, f"{self.repo}.AppImage")
+        if (
+            self.artifact_cache
+            and self.verified_digest
+            and self.artifact_cache.materialize(
+                *split_digest(self.verified_digest), destination
+            )
+        ):
+            os.remove(f"{self.repo}.AppImage")
+            print(
+                _("Moved {repo}.AppImage to {folder}").format(
+                    repo=self.repo, folder=self.appimage_folder
+                )
+            )
+            return
+
+        # copy next to the destination and rename it into place, an
+        # interrupted copy never leaves a truncated appimage installed
+        tmp_path = os.path.join(
+            os.path.dirname(destination), f".{self.repo}.AppImage.{os.getpid()}.tmp"
+        )
         try:
-            shutil.copy2(f"{self.repo}.AppImage", self.appimage_folder)
+            shutil.copy2(f"{self.repo}.AppImage", tmp_path)
+            os.replace(tmp_path, destination)
         except shutil.Error as error:
             logging.error(f"Error: {error}", exc_info=True)
             print(
@@ -391,6 +650,17 @@ class FileHandler(AppImageDownloader):
         # update the version, appimage_name
         self.appimages["version"] = self.version
         self.appimages["appimage"] = self.repo + "-" + self.version + ".AppImage"
+        self.save_asset_patterns()
+
+        # record the digest of the installed appimage for later audits
+        if self.verified_digest:
+            self.appimages["installed_digest"] = self.verified_digest
+            installed = self.installed_path()
+            if os.path.exists(installed):
+                self.digest_cache.put(installed, *split_digest(self.verified_digest))
+                self.digest_cache.save()
+        else:
+            self.appimages.pop("installed_digest", None)
 
         # write the updated version and appimage_name to the json file
         with open(f"{self.file_path}{self.repo}.json", "w", encoding="utf-8") as file:
@@ -401,151 +671,6 @@ class FileHandler(AppImageDownloader):
             )
         )
 
-    # INFO: Cause API RATE LIMIT EXCEEDED if used more than 15 - 20 times
-    # KeyError: 'tag_name' means that API RATE LIMIT EXCEEDED.
-    @handle_common_errors
-    def check_updates_json_all(self):
-        """Check for updates for all JSON files"""
-        json_files = [
-            file for file in os.listdir(self.file_path) if file.endswith(".json")
-        ]
-
-        # Output the list of JSON files found
-        if json_files:
-            print(
-                _("Found the following config files in the\n[{file_path}]:").format(
-                    file_path=self.file_path
-                )
-            )
-            for json_file in json_files:
-                print(_("- {json_file}").format(json_file=json_file))
-        else:
-            print(_("No JSON files found in the directory."))
-
-        # Create a queue for not up-to-date appimages
-        appimages_to_update = []
-
-        # Print appimages name and versions from JSON files
-        for file in json_files:
-            with open(f"{self.file_path}{file}", "r", encoding="utf-8") as file:
-                appimages = json.load(file)
-
-            # Check version via GitHub API
-            response = requests.get(
-                f"https://api.github.com/repos/{appimages['owner']}/{appimages['repo']}/releases/latest"
-            )
-            latest_version = response.json()["tag_name"].replace("v", "")
-
-            # Compare with above versions
-            if latest_version == appimages["version"]:
-                print(
-                    _("{appimage} is up to date").format(appimage=appimages["appimage"])
-                )
-            else:
-                print("-------------------------------------------------")
-                print(
-                    _("{appimage} is not up to date").format(
-                        appimage=appimages["appimage"]
-                    )
-                )
-                print(
-                    _("\033[42mLatest version: {version}\033[0m").format(
-                        version=latest_version
-                    )
-                )
-                print(
-                    _("Current version: {version}").format(version=appimages["version"])
-                )
-                print("-------------------------------------------------")
-                # Append to queue appimages that are not up to date
-                appimages_to_update.append(appimages["repo"])
-
-        # If all appimages are up to date
-        if not appimages_to_update:
-            print(_("All appimages are up to date"))
-            sys.exit()
-        else:
-            # Display the list of appimages to update
-            print("=================================================")
-            print(_("Appimages that are not up to date:"))
-            for idx, appimage in enumerate(appimages_to_update, start=1):
-                print(_("{idx}. {appimage}").format(idx=idx, appimage=appimage))
-            print("=================================================")
-
-            # Ask the user to select which appimages to update or skip
-            user_input = (
-                input(
-                    _(
-                        "Enter the numbers of the appimages you want to update (comma-separated) or type 'skip' to skip updates: "
-                    )
-                )
-                .strip()
-                .lower()
-            )
-
-            if user_input == "skip":
-                print(_("No updates will be performed."))
-                sys.exit()
-
-            selected_indices = [int(idx.strip()) - 1 for idx in user_input.split(",")]
-
-            selected_appimages = [appimages_to_update[idx] for idx in selected_indices]
-
-            # Update the selected appimages
-            self.update_selected_appimages(selected_appimages)
-
-    @handle_common_errors
-    def update_selected_appimages(self, appimages_to_update):
-        """Update all appimages"""
-        batch_mode = self.load_batch_mode()
-
-        if batch_mode is None:  # If no saved value is found, prompt for it
-            if (
-                input(
-                    _(
-                        "Enable batch mode to continue without asking for approval? (y/n): "
-                    )
-                ).lower()
-                != "y"
-            ):
-                batch_mode = False
-            else:
-                batch_mode = True
-            # Save the batch_mode value to a file
-            self.save_batch_mode(batch_mode)
-
-        if batch_mode:
-            print(
-                _(
-                    "Batch mode is enabled. All selected appimages will be updated without further prompts."
-                )
-            )
-        else:
-            print(
-                _(
-                    "Batch mode is disabled. You will be prompted for each appimage update."
-                )
-            )
-
-        for appimage in appimages_to_update:
-            print(_("Updating {appimage}...").format(appimage=appimage))
-            self.repo = appimage
-            self.load_credentials()
-            self.get_response()
-            self.download()
-
-            # Verify SHA and handle errors (now handled by verify_yml)
-            if not self.verify_sha():  # Will return False if verification fails
-                if batch_mode:
-                    print(_("Batch mode is being disabled due to an error."))
-                    batch_mode = False
-                continue  # Skip the current AppImage if verification fails
-
-            self.make_executable()
-            self.handle_file_operations(batch_mode=batch_mode)
-
-        print(_("Update process completed for all selected appimages."))
-
     def save_batch_mode(self, batch_mode):
         """Save batch_mode to a JSON file"""
 
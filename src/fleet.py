@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import bisect
+import socket
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from src.locks import FileLock
+
+# points per member on the ring, enough to spread a few hundred repos evenly
+VIRTUAL_NODES = 64
+
+
+def _ring_hash(value):
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+def _write_json(path, data):
+    """Write json atomically, readers on other hosts never see half a file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class HashRing:
+    """Consistent hashing of repos onto members.
+
+    When a member joins or leaves only the repos next to its points move,
+    every other repo keeps its member.
+    """
+
+    members: list
+    virtual_nodes: int = VIRTUAL_NODES
+    _points: list = field(default_factory=list, init=False)
+    _owners: list = field(default_factory=list, init=False)
+
+    def __post_init__(self):
+        ring = sorted(
+            (_ring_hash(f"{member}#{index}"), member)
+            for member in self.members
+            for index in range(self.virtual_nodes)
+        )
+        self._points = [point for point, _member in ring]
+        self._owners = [member for _point, member in ring]
+
+    def owner(self, key):
+        """Return the member responsible for key, None without members"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _ring_hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+@dataclass
+class Membership:
+    """Members of the fleet, kept in a json file on shared storage.
+
+    Every node writes its heartbeat into the file when it checks. Members
+    whose heartbeat is older than ttl are considered gone, their repos move
+    to the other members.
+    """
+
+    members_file: str
+    node_id: str
+    ttl: float = 1800
+
+    def heartbeat(self, now=None):
+        """Record this node as alive, return the live members"""
+        now = now or time.time()
+        with FileLock(self.members_file + ".lock"):
+            members = self._read()
+            members[self.node_id] = now
+            members = {
+                node: seen for node, seen in members.items() if now - seen < self.ttl
+            }
+            _write_json(self.members_file, members)
+        return sorted(members)
+
+    def _read(self):
+        try:
+            with open(self.members_file, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as error:
+            logging.error(f"Ignoring corrupt members file {self.members_file}: {error}")
+            return {}
+
+
+@dataclass
+class ReleaseStore:
+    """Latest release metadata shared by the fleet, one json file per repo"""
+
+    store_dir: str
+
+    def _path(self, key):
+        return os.path.join(self.store_dir, key.replace("/", "__") + ".json")
+
+    def put(self, key, release, node_id):
+        _write_json(
+            self._path(key),
+            {"release": release, "checked_at": time.time(), "node": node_id},
+        )
+
+    def get(self, key, max_age):
+        """Return the stored release of key if it is younger than max_age"""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except OSError:
+            return None
+        except ValueError as error:
+            logging.error(f"Ignoring corrupt release metadata for {key}: {error}")
+            return None
+        if time.time() - entry.get("checked_at", 0) > max_age:
+            return None
+        return entry["release"]
+
+
+@dataclass
+class Fleet:
+    """Split the release checks of many hosts between them.
+
+    Each repo is checked against GitHub by one member only, chosen by
+    consistent hashing over the live members, and its release is published
+    in the shared store. The other members read it from there, so the API
+    calls of the whole fleet scale with the number of repos, not with
+    repos × hosts. A repo whose stored release is older than max_age (its
+    member died before the membership noticed) is checked by whoever needs it.
+    """
+
+    membership: Membership
+    store: ReleaseStore
+    max_age: float = 7200
+    ring: HashRing = field(default=None, init=False)
+
+    def join(self):
+        """Send a heartbeat and rebuild the ring from the live members"""
+        try:
+            self.ring = HashRing(self.membership.heartbeat())
+        except OSError as error:
+            # shared storage unreachable, check everything here meanwhile
+            logging.error(f"Fleet membership unavailable: {error}")
+            self.ring = HashRing([])
+
+    @property
+    def node_id(self):
+        return self.membership.node_id
+
+    def owns(self, key):
+        if self.ring is None:
+            self.join()
+        return self.ring.owner(key) in (None, self.node_id)
+
+    def shared_release(self, key):
+        """Return the release another member published for key.
+
+        None when key is this node's to check, or its stored release is
+        older than max_age.
+        """
+        if self.owns(key):
+            return None
+        return self.store.get(key, self.max_age)
+
+    def confirm(self, key, version):
+        """Mark the stored release of key fresh if it still is version.
+
+        For the owner, when a probe shows the release didn't change: the
+        other members keep reading the store instead of checking key too.
+        """
+        release = self.store.get(key, float("inf"))
+        if release is None or release.get("tag_name", "").replace("v", "") != version:
+            return
+        try:
+            self.store.put(key, release, self.node_id)
+        except OSError as error:
+            logging.error(f"Couldn't publish the release of {key}: {error}")
+
+    def release(self, key, fetch):
+        """Return the latest release of key, calling fetch() only if needed"""
+        if not self.owns(key):
+            release = self.store.get(key, self.max_age)
+            if release is not None:
+                return release
+            logging.info(f"No fresh fleet metadata for {key}, checking it here")
+        release = fetch()
+        try:
+            self.store.put(key, release, self.node_id)
+        except OSError as error:
+            logging.error(f"Couldn't publish the release of {key}: {error}")
+        return release
+
+
+def load_fleet(config_path):
+    """Return the Fleet of fleet.json, None if the host is not in a fleet"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            settings = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    members_file = settings.get("members_file")
+    store_dir = settings.get("store_dir")
+    if not members_file or not store_dir:
+        return None
+    membership = Membership(
+        os.path.expanduser(members_file),
+        settings.get("node_id") or socket.gethostname(),
+        ttl=settings.get("member_ttl_minutes", 30) * 60,
+    )
+    return Fleet(
+        membership,
+        ReleaseStore(os.path.expanduser(store_dir)),
+        max_age=settings.get("max_age_minutes", 120) * 60,
+    )
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from dataclasses import dataclass, field
+
+# 1 MiB keeps memory flat for multi-hundred-MB appimages
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path, hash_type, chunk_size=CHUNK_SIZE):
+    """Return the hex digest of a file without reading it into memory at once"""
+    hasher = hashlib.new(hash_type)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def format_digest(hash_type, digest):
+    """Return a self-describing digest such as 'sha256:ab12...'"""
+    return f"{hash_type}:{digest.lower()}"
+
+
+def split_digest(value):
+    """Split 'sha256:ab12...' into ('sha256', 'ab12...')"""
+    hash_type, _sep, digest = value.partition(":")
+    return hash_type.lower(), digest.lower()
+
+
+@dataclass
+class DigestCache:
+    """Remember file digests so unchanged files are not hashed again.
+
+    An entry is only trusted while the file keeps the same inode, size, mtime
+    and ctime. ctime can't be set from userspace, so rewriting a file and
+    restoring its mtime still invalidates the entry.
+    """
+
+    cache_path: str
+    entries: dict = field(default_factory=dict, init=False)
+    _changed: bool = field(default=False, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            self.entries = {}
+        except ValueError as error:
+            logging.error(f"Ignoring corrupt digest cache {self.cache_path}: {error}")
+            self.entries = {}
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns]
+
+    def get(self, path, hash_type):
+        """Return the cached digest of path, None if unknown or outdated"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            if entry["stamp"] != self._stamp(path):
+                return None
+        except FileNotFoundError:
+            return None
+        return entry["digests"].get(hash_type)
+
+    def put(self, path, hash_type, digest):
+        """Remember the digest of path for its current inode/size/mtime"""
+        path = os.path.abspath(path)
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is None or entry["stamp"] != stamp:
+                entry = {"stamp": stamp, "digests": {}}
+                self.entries[path] = entry
+            if entry["digests"].get(hash_type) != digest.lower():
+                entry["digests"][hash_type] = digest.lower()
+                self._changed = True
+
+    def digest(self, path, hash_type):
+        """Return the digest of path, hashing it only if it changed"""
+        digest = self.get(path, hash_type)
+        if digest is None:
+            digest = hash_file(path, hash_type)
+            self.put(path, hash_type, digest)
+        return digest
+
+    def save(self):
+        """Write the cache atomically, dropping entries of deleted files.
+
+        Nothing is written when no digest was added or dropped.
+        """
+        with self._lock:
+            entries = {
+                path: entry
+                for path, entry in self.entries.items()
+                if os.path.exists(path)
+            }
+            if not self._changed and len(entries) == len(self.entries):
+                return
+            self.entries = entries
+            self._changed = False
+            data = json.dumps(self.entries)
+
+        directory = os.path.dirname(self.cache_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".digest_cache-")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(tmp_path, self.cache_path)
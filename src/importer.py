@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from src.hashing import format_digest, hash_file, split_digest
+from src.jobs import AppConfig
+from src.squashfs import ZSTD_MISSING, SquashfsError, open_appimage
+from src.update_info import UpdateInfo, read_update_info
+
+# a .desktop entry is a few hundred bytes, don't read more of a broken one
+DESKTOP_LIMIT = 64 * 1024
+VERSION_IN_NAME = re.compile(r"(\d+(?:\.\d+)+)")
+
+
+@dataclass
+class ScannedAppImage:
+    """What an AppImage says about itself, read from its headers"""
+
+    path: str
+    update_info: UpdateInfo = None
+    name: str = None  # Name= of its .desktop entry
+    version: str = None  # X-AppImage-Version= of its .desktop entry
+    digest: str = None  # "hash_type:hex"
+    error: str = None
+
+
+@dataclass
+class ImportResult:
+    """Outcome of importing one AppImage"""
+
+    path: str
+    status: str  # "imported", "exists", "duplicate", "no_update_info" or "failed"
+    repo: str = None
+    version: str = None
+    message: str = None
+
+
+def parse_desktop_entry(text):
+    """Return the keys of the [Desktop Entry] group of a .desktop file"""
+    entry = {}
+    in_group = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            in_group = line == "[Desktop Entry]"
+        elif in_group and "=" in line and not line.startswith("#"):
+            key, value = line.split("=", 1)
+            entry.setdefault(key.strip(), value.strip())
+    return entry
+
+
+def scan_appimage(path, hash_type, digest=None):
+    """Read the update info and .desktop entry of an AppImage and hash it.
+
+    Runs in a worker process. Only the ELF/squashfs headers and the .desktop
+    file are read from the image, hashing is skipped if digest is known.
+    """
+    scanned = ScannedAppImage(path, update_info=read_update_info(path))
+    try:
+        with open_appimage(path) as image:
+            for name in sorted(image.listdir(image.root())):
+                if not name.endswith(".desktop"):
+                    continue
+                inode = image.lookup(name)
+                if inode is not None and inode.is_file:
+                    text = image.read_file(inode, DESKTOP_LIMIT).decode(
+                        "utf-8", errors="replace"
+                    )
+                    entry = parse_desktop_entry(text)
+                    scanned.name = entry.get("Name")
+                    scanned.version = entry.get("X-AppImage-Version")
+                    break
+    except (SquashfsError, OSError) as error:
+        # the update info alone is enough to import it
+        scanned.error = str(error)
+
+    try:
+        scanned.digest = digest or format_digest(hash_type, hash_file(path, hash_type))
+    except OSError as error:
+        scanned.error = str(error)
+    return scanned
+
+
+def guess_version(scanned):
+    """Return the version from the .desktop entry or the file name"""
+    if scanned.version:
+        return scanned.version.lstrip("v")
+    match = VERSION_IN_NAME.search(os.path.basename(scanned.path))
+    # an unknown version just makes the next check update it
+    return match.group(1) if match else "unknown"
+
+
+def find_appimages(folder):
+    """Return the AppImage files directly inside folder"""
+    return sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.lower().endswith(".appimage")
+        and os.path.isfile(os.path.join(folder, name))
+    )
+
+
+def import_appimages(
+    folder, file_path, digest_cache, hash_type="sha256", workers=None, dry_run=False
+):
+    """Create a config file for every AppImage in folder.
+
+    The AppImages are scanned in parallel, one process per core. Each one is
+    renamed to {repo}.AppImage, as if it had been installed by my-unicorn, and
+    its digest is recorded as installed_digest so neither the next update nor
+    an audit has to hash it again. AppImages without GitHub update information
+    or whose repo already has a config file are left alone.
+    """
+    folder = os.path.join(os.path.abspath(os.path.expanduser(folder)), "")
+    paths = find_appimages(folder)
+    if not paths:
+        return []
+
+    known = [digest_cache.get(path, hash_type) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        scans = list(
+            executor.map(
+                scan_appimage,
+                paths,
+                [hash_type] * len(paths),
+                [format_digest(hash_type, d) if d else None for d in known],
+            )
+        )
+
+    if any(scanned.error == ZSTD_MISSING for scanned in scans):
+        print(
+            _(
+                "\033[43mThe zstandard package is missing, the .desktop entries of zstd compressed AppImages are skipped. Install it with: pip install zstandard\033[0m"
+            )
+        )
+
+    results = []
+    claimed = set()
+    for scanned in scans:
+        info = scanned.update_info
+        if info is None or not info.is_github:
+            results.append(
+                ImportResult(
+                    scanned.path,
+                    "no_update_info",
+                    message=scanned.error or scanned.name,
+                )
+            )
+            continue
+        if scanned.digest is None:
+            results.append(ImportResult(scanned.path, "failed", message=scanned.error))
+            continue
+
+        repo = info.repo
+        version = guess_version(scanned)
+        target = os.path.join(folder, f"{repo}.AppImage")
+        config_path = os.path.join(file_path, f"{repo}.json")
+        if repo in claimed:
+            results.append(ImportResult(scanned.path, "duplicate", repo, version))
+            continue
+        if os.path.exists(config_path) or (
+            os.path.exists(target) and not os.path.samefile(target, scanned.path)
+        ):
+            results.append(ImportResult(scanned.path, "exists", repo, version))
+            continue
+        claimed.add(repo)
+
+        config = AppConfig(
+            owner=info.owner,
+            repo=repo,
+            version=version,
+            hash_type=hash_type,
+            appimage=os.path.basename(scanned.path),
+            choice=3,
+            appimage_folder=folder,
+            appimage_folder_backup=os.path.join(folder, "backup", ""),
+            installed_digest=scanned.digest,
+        )
+        if not dry_run:
+            try:
+                os.replace(scanned.path, target)
+                with open(config_path, "w", encoding="utf-8") as file:
+                    json.dump(config.to_dict(), file, indent=4)
+            except OSError as error:
+                logging.error(f"Couldn't import {scanned.path}: {error}")
+                results.append(
+                    ImportResult(scanned.path, "failed", repo, version, str(error))
+                )
+                continue
+            # the rename changes the ctime, stamp the file at its new path
+            digest_cache.put(target, hash_type, split_digest(scanned.digest)[1])
+        results.append(ImportResult(scanned.path, "imported", repo, version))
+
+    if not dry_run:
+        digest_cache.save()
+    return results
+
+
+def print_import_report(results, dry_run=False):
+    """Print the import results"""
+    print("=================================================")
+    for result in results:
+        name = os.path.basename(result.path)
+        if result.status == "imported":
+            message = (
+                _("{name} -> {repo}.json (version {version})")
+                if dry_run
+                else _("\033[42m{name} imported as {repo} (version {version})\033[0m")
+            )
+            print(message.format(name=name, repo=result.repo, version=result.version))
+        elif result.status == "no_update_info":
+            print(
+                _("{name} has no GitHub update information, add it manually").format(
+                    name=name
+                )
+            )
+        elif result.status in ("exists", "duplicate"):
+            print(
+                _("{name} skipped, {repo} is already configured").format(
+                    name=name, repo=result.repo
+                )
+            )
+        else:
+            print(
+                _("\033[41;30mCouldn't import {name}: {error}\033[0m").format(
+                    name=name, error=result.message
+                )
+            )
+    imported = sum(result.status == "imported" for result in results)
+    print("=================================================")
+    print(
+        _("{imported} of {total} appimages imported").format(
+            imported=imported, total=len(results)
+        )
+    )
@@ -0,0 +1,128 @@
+import os
+import json
+from types import MappingProxyType
+from dataclasses import MISSING, dataclass, field, fields
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    """Immutable view of one {repo}.json config file.
+
+    Keys this version doesn't know about are kept in extra and written back
+    unchanged by to_dict().
+    """
+
+    owner: str
+    repo: str
+    version: str
+    hash_type: str
+    appimage: str = None
+    sha: str = None
+    choice: int = 4
+    appimage_folder: str = "~/Documents/appimages/"
+    appimage_folder_backup: str = "~/Documents/appimages/backup/"
+    installed_digest: str = None
+    priority: int = None  # higher runs first with the "priority" planner order
+    check_interval_hours: float = None  # overrides the learned check interval
+    sources: list = None  # alternative download sources, see src/mirrors.py
+    asset_pattern: str = None  # glob or "re:<regex>" of the AppImage asset
+    sha_pattern: str = None  # glob or "re:<regex>" of the checksum asset
+    # globs made from the assets picked last time, written by my-unicorn
+    learned_asset_pattern: str = None
+    learned_sha_pattern: str = None
+    extra: MappingProxyType = field(
+        default_factory=lambda: MappingProxyType({}), compare=False
+    )
+
+    @classmethod
+    def from_dict(cls, data, source="config"):
+        """Build a config from the parsed json.
+
+        Raises ValueError naming source when data isn't a config, e.g. a
+        required key is missing.
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"{source} is not a json object")
+        missing = [
+            item.name
+            for item in fields(cls)
+            if item.default is MISSING
+            and item.default_factory is MISSING
+            and item.name not in data
+        ]
+        if missing:
+            raise ValueError(f"{source} is missing {', '.join(missing)}")
+        names = {item.name for item in fields(cls)} - {"extra"}
+        known = {key: value for key, value in data.items() if key in names}
+        extra = {key: value for key, value in data.items() if key not in names}
+        return cls(**known, extra=MappingProxyType(extra))
+
+    @classmethod
+    def load(cls, path):
+        """Read a config from a {repo}.json file"""
+        with open(path, "r", encoding="utf-8") as file:
+            return cls.from_dict(json.load(file), os.path.basename(path))
+
+    def to_dict(self):
+        """Return the config as a fresh, mutable dict in the json layout"""
+        data = {}
+        for item in fields(self):
+            if item.name == "extra":
+                continue
+            value = getattr(self, item.name)
+            if value is not None:
+                data[item.name] = value
+        data.update(self.extra)
+        return data
+
+    @property
+    def folder(self):
+        """appimage_folder with ~ expanded"""
+        return os.path.expanduser(self.appimage_folder)
+
+    @property
+    def backup_folder(self):
+        """appimage_folder_backup with ~ expanded"""
+        return os.path.expanduser(self.appimage_folder_backup)
+
+    @property
+    def installed_path(self):
+        """Path of the installed {repo}.AppImage"""
+        return os.path.join(self.folder, f"{self.repo}.AppImage")
+
+    @property
+    def backs_up(self):
+        """True if the old appimage is kept in the backup folder on update"""
+        return self.choice in (1, 3)
+
+
+@dataclass(frozen=True)
+class UpdateJob:
+    """One appimage to update.
+
+    batch_mode=False asks before touching the installed files, which is only
+    possible when jobs run one after another.
+    """
+
+    config: AppConfig
+    batch_mode: bool = True
+
+    @property
+    def repo(self):
+        return self.config.repo
+
+
+@dataclass(frozen=True)
+class JobResult:
+    """Outcome of an update or check of one appimage"""
+
+    repo: str
+    status: str  # "updated", "up_to_date", "outdated", "staged", "skipped" or "failed"
+    message: str = None
+    version: str = None
+    size: int = None  # bytes of the release asset, set by check()
+    published_at: str = None  # of the latest release, when the API was asked
+
+    @property
+    def ok(self):
+        return self.status != "failed"
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import logging
+import uuid
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from src.locks import FileLock, LockBusy
+
+# the stages an app goes through in an update run, in order
+STAGES = (
+    "pending",
+    "checked",
+    "downloaded",
+    "verified",
+    "backed_up",
+    "installed",
+    "config_written",
+)
+# up to "verified" nothing outside the download folder changed yet
+UNTOUCHED_STAGES = STAGES[: STAGES.index("verified") + 1]
+# an app stopped in one of these may be half installed
+INSTALL_STAGES = ("backed_up", "installed")
+
+
+def _run_id():
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+@dataclass
+class RunJournal:
+    """Crash-safe record of the progress of one update run.
+
+    Every run has its own {run_id}.json in the journal directory, so runs
+    working side by side never write each other's journal. The run writes
+    the apps it was asked to update before it starts, and every app writes
+    each stage it completes, so an interrupted run (power loss, dropped SSH
+    session, Ctrl+C) leaves its journal behind. Every write is fsynced and
+    renamed into place, the file is always either the old or the new state.
+
+    The run holds {run_id}.lock while it is alive. The lock goes away with
+    the process, so a journal whose lock can be taken belongs to a run that
+    died: interrupted() adopts those by taking their lock, and a finished run
+    removes its journal.
+    """
+
+    directory: str
+    run_id: str = field(default_factory=_run_id)
+    apps: dict = field(default_factory=dict, init=False)
+    started: float = field(default=None, init=False)
+    _run_lock: FileLock = field(default=None, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.run_id}.json")
+
+    @property
+    def lock_path(self):
+        return os.path.join(self.directory, f"{self.run_id}.lock")
+
+    def _hold(self, blocking=True):
+        if self._run_lock is None:
+            self._run_lock = FileLock(self.lock_path).acquire(blocking=blocking)
+
+    def load(self):
+        """Read the journal, return False if it has no apps"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return False
+        except ValueError as error:
+            logging.error(f"Ignoring corrupt run journal {self.path}: {error}")
+            return False
+        with self._lock:
+            self.started = data.get("started")
+            self.apps = data.get("apps", {})
+        return bool(self.apps)
+
+    def begin(self, jobs):
+        """Start the journal of a run over the jobs"""
+        self._hold()
+        with self._lock:
+            self.started = time.time()
+            self.apps = {
+                job.repo: {
+                    "stage": "pending",
+                    "from_version": job.config.version,
+                    "batch_mode": job.batch_mode,
+                }
+                for job in jobs
+            }
+            self._save()
+
+    def mark(self, repo, stage, **details):
+        """Record that repo completed stage, with the details to recover it.
+
+        Apps that aren't part of the run (a prefetch, a single update from
+        the menu) are not journaled.
+        """
+        with self._lock:
+            entry = self.apps.get(repo)
+            if entry is None:
+                return
+            entry.update(details, stage=stage, updated_at=time.time())
+            self._save()
+
+    def unfinished(self):
+        """Return {repo: entry} of the apps the run didn't finish"""
+        with self._lock:
+            return {
+                repo: dict(entry, updated_at=entry.get("updated_at", self.started))
+                for repo, entry in self.apps.items()
+                if entry["stage"] != "config_written"
+            }
+
+    def release(self):
+        """Stop holding the journal, it stays for a later resume"""
+        if self._run_lock is not None:
+            self._run_lock.release()
+            self._run_lock = None
+
+    def close(self):
+        """The run is over, nothing is left to resume"""
+        with self._lock:
+            self.apps = {}
+            self.started = None
+            for path in (self.path, self.lock_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        self.release()
+
+    def _save(self):
+        data = {"started": self.started, "apps": self.apps}
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def interrupted(directory):
+    """Adopt the journals of every run that died, return them.
+
+    Journals of runs that are still alive are left alone. The adopted ones
+    are held until they are closed or released, so two processes never
+    recover the same run.
+    """
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    journals = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        journal = RunJournal(directory, name[: -len(".json")])
+        try:
+            journal._hold(blocking=False)
+        except LockBusy:
+            continue
+        if journal.load():
+            journals.append(journal)
+        else:
+            journal.close()
+    return journals
+
+
+def merge_unfinished(journals):
+    """Return {repo: entry} over several journals.
+
+    An app can be in more than one when runs died one after another. The
+    entry where it may be half installed wins, else the newest one.
+    """
+    merged = {}
+    for journal in journals:
+        for repo, entry in journal.unfinished().items():
+            current = merged.get(repo)
+            if current is None or (
+                entry["stage"] in INSTALL_STAGES,
+                entry["updated_at"] or 0,
+            ) > (current["stage"] in INSTALL_STAGES, current["updated_at"] or 0):
+                merged[repo] = entry
+    return merged
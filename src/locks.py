@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# what a run does when another run holds what it needs:
+# wait for it, skip the whole run, or split: take only the free apps
+LOCK_POLICIES = ("wait", "skip", "split")
+POLL_INTERVAL = 0.2
+
+
+class LockBusy(Exception):
+    """The lock is held by another my-unicorn process"""
+
+
+@dataclass
+class FileLock:
+    """Advisory fcntl lock on a file, shared between processes and threads.
+
+    flock() locks belong to the open file, so two FileLocks on the same path
+    exclude each other even inside one process. The lock goes away with the
+    process, a crashed run never leaves a stale lock behind.
+    """
+
+    path: str
+    fd: int = field(default=None, init=False)
+
+    def acquire(self, shared=False, blocking=True, timeout=None):
+        """Take the lock, raise LockBusy if it can't be had in time"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    if blocking and deadline is None:
+                        fcntl.flock(fd, operation)
+                    else:
+                        fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError as error:
+                    if not blocking or time.monotonic() >= deadline:
+                        raise LockBusy(self.path) from error
+                    time.sleep(POLL_INTERVAL)
+        except BaseException:
+            os.close(fd)
+            raise
+        self.fd = fd
+        return self
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+    @property
+    def held(self):
+        return self.fd is not None
+
+    def __enter__(self):
+        if not self.held:
+            self.acquire()
+        return self
+
+    def __exit__(self, *_exc):
+        self.release()
+
+
+@dataclass
+class LockManager:
+    """Per-app locks plus one lock for the whole config directory.
+
+    Every run holds the config directory lock shared, so runs can work side
+    by side; bulk changes like import hold it exclusively. Each app is locked
+    exclusively while a run works on it, so two runs never download, back up
+    or write the config of the same app at once.
+    """
+
+    lock_dir: str
+    policy: str = "split"
+    timeout: float = None  # seconds a "wait" run waits, None is forever
+
+    def __post_init__(self):
+        if self.policy not in LOCK_POLICIES:
+            logging.error(f"Unknown lock policy {self.policy}, using split")
+            self.policy = "split"
+
+    def app_lock(self, repo):
+        return FileLock(os.path.join(self.lock_dir, f"{repo}.lock"))
+
+    def config_lock(self):
+        return FileLock(os.path.join(self.lock_dir, "config_files.lock"))
+
+    def run_lock(self):
+        """Take the config directory lock for an update run.
+
+        "skip" only starts when no other run is active and keeps others out
+        until it is done; "wait" and "split" share it with other runs.
+        Raises LockBusy when the run can't start.
+        """
+        lock = self.config_lock()
+        if self.policy == "skip":
+            return lock.acquire(blocking=False)
+        if self.policy == "wait":
+            return lock.acquire(shared=True, timeout=self.timeout)
+        return lock.acquire(shared=True, blocking=False)
+
+    def exclusive_lock(self):
+        """Take the config directory lock for a bulk change, waiting for runs"""
+        return self.config_lock().acquire(timeout=self.timeout)
+
+    def claims(self, repos):
+        """Start claiming the apps of a run, return its AppClaims.
+
+        "split" and "skip" lock each app just before its job starts, so runs
+        started side by side divide the apps between them. "wait" locks them
+        all up front, in sorted order so waiting runs can't deadlock.
+        """
+        claims = AppClaims(self)
+        if self.policy == "wait":
+            for repo in sorted(set(repos)):
+                try:
+                    claims.held[repo] = self.app_lock(repo).acquire(
+                        timeout=self.timeout
+                    )
+                except LockBusy:
+                    continue
+        return claims
+
+    @contextmanager
+    def editing(self, repo):
+        """Hold the locks needed to write {repo}.json outside an update run.
+
+        Raises LockBusy when a run works on the app or holds the config
+        directory for a bulk change.
+        """
+        blocking = self.policy == "wait"
+        config = self.config_lock().acquire(
+            shared=True, blocking=blocking, timeout=self.timeout
+        )
+        try:
+            with self.app_lock(repo).acquire(blocking=blocking, timeout=self.timeout):
+                yield
+        finally:
+            config.release()
+
+
+@dataclass
+class AppClaims:
+    """The app locks of one run, taken one job at a time"""
+
+    manager: LockManager
+    held: dict = field(default_factory=dict)  # {repo: FileLock} locked up front
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def claim(self, repo):
+        """Return the held FileLock of repo, raise LockBusy if another run has it"""
+        with self._lock:
+            lock = self.held.pop(repo, None)
+        if lock is not None:
+            return lock
+        return self.manager.app_lock(repo).acquire(blocking=False)
+
+    def release(self):
+        """Release the locks taken up front that no job claimed"""
+        with self._lock:
+            locks, self.held = list(self.held.values()), {}
+        for lock in locks:
+            lock.release()
+
+
+def load_lock_settings(config_path):
+    """Load the lock settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
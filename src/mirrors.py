@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import requests
+from src.errors import UpdateError
+from src.progress import get_reporter
+from src.session import get_session
+from src.watchdog import DownloadGuard
+
+# bytes fetched from each source to estimate its throughput
+PROBE_BYTES = 256 * 1024
+PROBE_TIMEOUT = 5
+CHUNK_SIZE = 1024 * 1024
+
+# download url templates of the source types, filled with the release fields
+SOURCE_TEMPLATES = {
+    "gitea": "{url}/{owner}/{repo}/releases/download/{tag}/{asset}",
+    "gitlab": "{url}/{project}/-/releases/{tag}/downloads/{asset}",
+}
+
+
+def source_urls(sources, release_url, fields):
+    """Return the download urls of an asset, in the configured order.
+
+    sources come from the "sources" list of the app config, e.g.
+    [{"type": "url", "url": "http://mirror.lan/{repo}/{asset}"},
+     {"type": "gitea", "url": "https://git.example.com"}, {"type": "github"}].
+    "github" is the browser_download_url of the release, it is tried last
+    when the list doesn't name it.
+    """
+    urls = []
+    for source in sources or ():
+        kind = source.get("type", "url")
+        if kind == "github":
+            urls.append(release_url)
+            continue
+        template = source.get("url", "")
+        if kind in SOURCE_TEMPLATES:
+            template = SOURCE_TEMPLATES[kind].replace("{url}", template.rstrip("/"))
+        try:
+            urls.append(template.format(**{**fields, **source}))
+        except KeyError as error:
+            logging.error(f"Source {source} needs the field {error}")
+    if release_url not in urls:
+        urls.append(release_url)
+    return list(dict.fromkeys(url for url in urls if url))
+
+
+@dataclass
+class SourceProbe:
+    url: str
+    latency: float = None  # seconds to the first byte, None if unhealthy
+    throughput: float = None  # bytes per second of the probe transfer
+
+    def estimate(self, size):
+        """Seconds the whole download is expected to take from this source"""
+        if self.latency is None:
+            return float("inf")
+        if not size or not self.throughput:
+            return self.latency
+        return self.latency + size / self.throughput
+
+
+def probe_source(url, probe_bytes=PROBE_BYTES, timeout=PROBE_TIMEOUT):
+    """Fetch the first bytes of url and time it"""
+    started = time.monotonic()
+    try:
+        with get_session().get(
+            url,
+            headers={"Range": f"bytes=0-{probe_bytes - 1}"},
+            stream=True,
+            timeout=timeout,
+        ) as response:
+            if response.status_code not in (200, 206):
+                return SourceProbe(url)
+            latency = time.monotonic() - started
+            received = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                received += len(chunk)
+                if received >= probe_bytes:
+                    break
+            elapsed = time.monotonic() - started - latency
+    except requests.exceptions.RequestException as error:
+        logging.info(f"Source {url} unavailable: {error}")
+        return SourceProbe(url)
+    return SourceProbe(url, latency, received / elapsed if elapsed > 0 else None)
+
+
+@dataclass
+class MirrorDownloader:
+    """Download one file from the fastest of several sources of the same bytes.
+
+    Every source is probed in parallel (time to first byte and throughput of
+    a small range request) and they are tried from the fastest expected
+    download down. When a transfer fails midway the next source continues it
+    with a Range request, so nothing already received is downloaded again.
+    The sources are only trusted to serve the same file, the caller still
+    verifies the result against the release digest.
+    """
+
+    urls: list
+    size: int = None
+    timeout: float = PROBE_TIMEOUT
+    guard: DownloadGuard = None
+    probes: list = field(default_factory=list, init=False)
+
+    def __post_init__(self):
+        if self.guard is None:
+            self.guard = DownloadGuard()
+
+    def rank(self):
+        """Return the healthy sources, fastest expected download first"""
+        if len(self.urls) == 1:
+            self.probes = [SourceProbe(self.urls[0], 0)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.urls)) as executor:
+                self.probes = list(
+                    executor.map(
+                        lambda url: probe_source(url, timeout=self.timeout), self.urls
+                    )
+                )
+        healthy = [probe for probe in self.probes if probe.latency is not None]
+        return sorted(healthy, key=lambda probe: probe.estimate(self.size))
+
+    def download(self, destination, description=None):
+        """Download to destination, return the url that finished it"""
+        ranked = self.rank()
+        if not ranked:
+            raise UpdateError(
+                f"No source of {os.path.basename(destination)} is reachable"
+            )
+
+        part_path = f"{destination}.part"
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        with get_reporter().task(
+            description or os.path.basename(destination), self.size
+        ) as progress:
+            # a stalled or broken source hands over to the next one, the
+            # whole list is gone through again up to guard.reconnects times
+            for _round in range(self.guard.reconnects + 1):
+                for probe in ranked:
+                    try:
+                        if self.guard.stream(probe.url, part_path, progress, self.size):
+                            os.replace(part_path, destination)
+                            return probe.url
+                    except (requests.exceptions.RequestException, OSError) as error:
+                        logging.warning(f"Download from {probe.url} failed: {error}")
+                    print(
+                        _("Switching to the next source after {url} failed").format(
+                            url=probe.url
+                        )
+                    )
+        raise UpdateError(f"Every source of {os.path.basename(destination)} failed")
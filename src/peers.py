@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dataclasses import dataclass, field
+import requests
+from src.config_store import ConfigStore
+from src.hashing import format_digest, hash_file, split_digest
+from src.session import get_session
+
+DEFAULT_PORT = 8787
+CHUNK_SIZE = 1024 * 1024
+# a peer that takes longer than this to answer is not "nearby"
+PROBE_TIMEOUT = 2
+# how long a probe result is trusted before the peers are asked again
+PROBE_TTL = 60
+# how long the index of what this host serves is reused between requests
+INDEX_TTL = 10
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+@dataclass
+class PeerIndex:
+    """The verified appimages this host can hand out, by digest.
+
+    Sources are the artifact cache, whose entries are verified before they
+    are stored, and the installed {repo}.AppImage files that still match the
+    installed_digest recorded in their config.
+
+    Building the index walks the cache and stats every installed app, so it
+    is reused for INDEX_TTL seconds; path() checks the one file it returns.
+    """
+
+    file_path: str
+    digest_cache: object
+    artifact_cache: object = None
+    config_store: ConfigStore = field(init=False)
+    _artifacts: dict = field(default=None, init=False)
+    _built_at: float = field(default=0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        self.config_store = ConfigStore(self.file_path)
+
+    def artifacts(self):
+        """Return {"hash_type:hex": path} of everything that can be served"""
+        with self._lock:
+            if (
+                self._artifacts is None
+                or time.monotonic() - self._built_at >= INDEX_TTL
+            ):
+                self._artifacts = self._build()
+                self._built_at = time.monotonic()
+            return self._artifacts
+
+    def path(self, digest):
+        """Return the path of the artifact with digest, None if it isn't
+        served (any more)"""
+        path = self.artifacts().get(digest)
+        if path is None or not os.path.isfile(path):
+            return None
+        hash_type, expected = split_digest(digest)
+        if self.artifact_cache is not None and path.startswith(
+            self.artifact_cache.cache_dir
+        ):
+            # cache entries are named by their digest and never rewritten,
+            # unless an older version hardlinked them into an appimage folder
+            if os.stat(path).st_nlink == 1:
+                return path
+            valid = self.digest_cache.digest(path, hash_type) == expected
+            self.digest_cache.save()
+            return path if valid else None
+        # an installed app may have been updated since the index was built
+        if self.digest_cache.get(path, hash_type) != expected:
+            return None
+        return path
+
+    def _build(self):
+        artifacts = {}
+        if self.artifact_cache is not None:
+            root = self.artifact_cache.cache_dir
+            for hash_type in os.listdir(root):
+                if not os.path.isdir(os.path.join(root, hash_type)):
+                    continue
+                for prefix in os.listdir(os.path.join(root, hash_type)):
+                    directory = os.path.join(root, hash_type, prefix)
+                    if not os.path.isdir(directory):
+                        continue
+                    for name in os.listdir(directory):
+                        if not name.startswith(".") and not name.endswith(".lock"):
+                            artifacts[format_digest(hash_type, name)] = os.path.join(
+                                directory, name
+                            )
+
+        self.config_store.refresh()
+        configs = self.config_store.configs()
+        for repo, config in configs.items():
+            recorded = config.get("installed_digest")
+            folder = os.path.expanduser(config.get("appimage_folder", ""))
+            path = os.path.join(folder, f"{repo}.AppImage")
+            if not recorded or not os.path.isfile(path):
+                continue
+            hash_type, expected = split_digest(recorded)
+            # only unchanged files, the digest cache makes this a stat() call
+            if self.digest_cache.digest(path, hash_type) == expected:
+                artifacts.setdefault(recorded, path)
+        self.digest_cache.save()
+        return artifacts
+
+
+class PeerRequestHandler(BaseHTTPRequestHandler):
+    """GET /digests lists the artifacts, GET/HEAD /artifacts/{hash_type}/{hex}
+    sends one, with single-range Range requests for resuming."""
+
+    server_version = "my-unicorn-peer"
+
+    def log_message(self, format, *args):
+        logging.info(f"peer {self.client_address[0]}: {format % args}")
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def handle_request(self, send_body):
+        if self.path == "/digests":
+            body = json.dumps(sorted(self.server.index.artifacts())).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+            return
+
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "artifacts":
+            self.send_error(404)
+            return
+        # only digests from the index are served, never arbitrary paths
+        path = self.server.index.path(format_digest(parts[1], parts[2]))
+        if path is None:
+            self.send_error(404)
+            return
+        self.send_file(path, send_body)
+
+    def send_file(self, path, send_body):
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        match = RANGE.match(self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:  # suffix range, the last N bytes
+                start = max(0, size - int(match.group(2)))
+            end = min(end, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not send_body:
+            return
+
+        remaining = end - start + 1
+        with open(path, "rb") as file:
+            file.seek(start)
+            while remaining > 0:
+                chunk = file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+def make_server(index, bind="0.0.0.0", port=DEFAULT_PORT):
+    """Return a threading HTTP server serving the index"""
+    server = ThreadingHTTPServer((bind, port), PeerRequestHandler)
+    server.daemon_threads = True
+    server.index = index
+    return server
+
+
+@dataclass
+class Peer:
+    url: str
+    latency: float = None  # seconds to answer /digests, None if unreachable
+    digests: frozenset = frozenset()
+
+
+@dataclass
+class PeerClient:
+    """Fetch verified appimages from other my-unicorn hosts on the LAN.
+
+    Peers are probed with GET /digests, the fastest one that has the wanted
+    digest is used. When a transfer breaks off, the next peer resumes it with a
+    Range request. The result is hashed and compared
+    with the upstream digest before it is used, a peer is never trusted.
+    """
+
+    urls: list
+    timeout: float = PROBE_TIMEOUT
+    _probed: list = field(default=None, init=False)
+    _probed_at: float = field(default=0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def probe(self, refresh=False):
+        """Return the peers, reachable ones first and the nearest first"""
+        with self._lock:
+            if (
+                not refresh
+                and self._probed is not None
+                and time.monotonic() - self._probed_at < PROBE_TTL
+            ):
+                return self._probed
+
+            peers = []
+            for url in self.urls:
+                url = url.rstrip("/")
+                started = time.monotonic()
+                try:
+                    response = get_session().get(f"{url}/digests", timeout=self.timeout)
+                    response.raise_for_status()
+                    digests = frozenset(response.json())
+                except (requests.exceptions.RequestException, ValueError) as error:
+                    logging.info(f"Peer {url} unavailable: {error}")
+                    peers.append(Peer(url))
+                    continue
+                peers.append(Peer(url, time.monotonic() - started, digests))
+
+            peers.sort(key=lambda peer: (peer.latency is None, peer.latency or 0))
+            self._probed, self._probed_at = peers, time.monotonic()
+            return peers
+
+    def fetch(self, digest, destination):
+        """Download the artifact with digest to destination, True on success"""
+        hash_type, expected = split_digest(digest)
+        candidates = [
+            peer
+            for peer in self.probe()
+            if peer.latency is not None and digest in peer.digests
+        ]
+        if not candidates:
+            return False
+
+        part_path = f"{destination}.part"
+        for peer in candidates:
+            url = f"{peer.url}/artifacts/{hash_type}/{expected}"
+            try:
+                self._download(url, part_path)
+            except (requests.exceptions.RequestException, OSError) as error:
+                # keep the partial file, the next peer resumes it
+                logging.warning(f"Download from peer {peer.url} failed: {error}")
+                continue
+
+            if hash_file(part_path, hash_type) == expected:
+                os.replace(part_path, destination)
+                logging.info(f"Fetched {digest} from peer {peer.url}")
+                return True
+            logging.error(f"Peer {peer.url} sent a file not matching {digest}")
+            os.remove(part_path)
+
+        return False
+
+    def _download(self, url, part_path):
+        """Download url to part_path, resuming what is already there"""
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with get_session().get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as response:
+            if response.status_code == 416:
+                # the part file is already complete
+                return
+            response.raise_for_status()
+            # 200 means the peer ignored the range, start over
+            mode = "ab" if response.status_code == 206 else "wb"
+            with open(part_path, mode) as file:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(chunk)
+
+
+def load_peer_settings(config_path):
+    """Load the peer settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def load_peer_client(config_path):
+    """Return a PeerClient for the configured peers, None without peers"""
+    urls = load_peer_settings(config_path).get("peers")
+    return PeerClient(urls) if urls else None
@@ -0,0 +1,161 @@
+import queue
+import logging
+import threading
+from dataclasses import dataclass, field
+from src.diskspace import NotEnoughSpace, SpaceLedger
+from src.errors import UpdateError, UpToDate
+from src.jobs import JobResult
+
+# marks the end of the work in a stage queue
+_DONE = object()
+
+
+@dataclass
+class UpdatePipeline:
+    """Overlap the network, hash and install work of a batch update.
+
+    Every app runs through three stages, each in its own thread and connected
+    by bounded queues:
+
+    - network: get_response + download (the sha file is fetched alongside)
+    - hash: verify_sha
+    - install: make_executable + handle_file_operations
+
+    So app N+1 downloads while app N is verified and installed. The queues
+    are bounded so downloads can't run far ahead of the disk work.
+    With a SpaceLedger, an app only starts downloading once the disk space
+    it needs is reserved, and gives it back when it is done. With claim,
+    an app is locked right before its download starts and unlocked once
+    it is done, so other runs can take the apps this one hasn't reached.
+    """
+
+    spawn: object  # callable(UpdateJob) -> FileHandler with its own state
+    queue_size: int = 2
+    space: SpaceLedger = None
+    # callable(UpdateJob) -> (FileLock, UpdateJob), or (None, JobResult)
+    # when the app can't be had
+    claim: object = None
+    results: list = field(default_factory=list, init=False)
+    _claimed: dict = field(default_factory=dict, init=False)
+    _results_lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def _record(self, repo, status, message=None, version=None, published_at=None):
+        with self._results_lock:
+            self.results.append(
+                JobResult(repo, status, message, version, published_at=published_at)
+            )
+            lock = self._claimed.pop(repo, None)
+        # the app is done, whatever happened, its disk space is free again
+        if self.space is not None:
+            self.space.release(repo)
+        if lock is not None:
+            lock.release()
+
+    def _attempt(self, repo, step, func):
+        """Run one stage of one app, turn exits and errors into a result"""
+        try:
+            return func()
+        except UpToDate:
+            self._record(repo, "up_to_date")
+        except NotEnoughSpace as error:
+            self._record(repo, "skipped", str(error))
+        except UpdateError as error:
+            self._record(repo, "failed", f"{step}: {error}")
+        except SystemExit:
+            # a prompt declined inside a helper, only this app is affected
+            self._record(repo, "failed", step)
+        except Exception as error:
+            logging.error(f"{repo} failed in {step}: {error}", exc_info=True)
+            self._record(repo, "failed", f"{step}: {error}")
+        return None
+
+    def _network_stage(self, jobs, downloaded):
+        try:
+            for job in jobs:
+                if self.claim is not None:
+                    lock, claimed = self.claim(job)
+                    if lock is None:
+                        with self._results_lock:
+                            self.results.append(claimed)
+                        continue
+                    job = claimed
+                    with self._results_lock:
+                        self._claimed[job.repo] = lock
+                print(_("Updating {appimage}...").format(appimage=job.repo))
+
+                def fetch(job=job):
+                    handler = self.spawn(job)
+                    handler.get_response()
+                    handler.journal_stage("checked")
+                    if self.space is not None:
+                        # waits here while earlier apps still hold the space
+                        self.space.reserve(job.repo, handler.space_needed())
+                    handler.download()
+                    handler.journal_stage("downloaded")
+                    return handler
+
+                handler = self._attempt(job.repo, "download", fetch)
+                if handler is not None:
+                    downloaded.put(handler)
+        finally:
+            downloaded.put(_DONE)
+
+    def _hash_stage(self, downloaded, verified):
+        try:
+            while (handler := downloaded.get()) is not _DONE:
+                verified_ok = self._attempt(handler.repo, "verify", handler.verify_sha)
+                if verified_ok:
+                    handler.journal_stage("verified")
+                    verified.put(handler)
+                elif verified_ok is False:
+                    self._record(handler.repo, "failed", "verify")
+        finally:
+            verified.put(_DONE)
+
+    def _install_stage(self, verified):
+        while (handler := verified.get()) is not _DONE:
+
+            def install(handler=handler):
+                handler.make_executable()
+                handler.handle_file_operations(batch_mode=True)
+                return True
+
+            if self._attempt(handler.repo, "install", install):
+                self._record(
+                    handler.repo,
+                    "updated",
+                    version=handler.version,
+                    published_at=handler.published_at,
+                )
+
+    def run(self, jobs):
+        """Update the jobs, return one JobResult per job"""
+        self.results = []
+        self._claimed = {}
+        downloaded = queue.Queue(maxsize=self.queue_size)
+        verified = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(
+                target=self._network_stage,
+                args=(jobs, downloaded),
+                name="network",
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._hash_stage,
+                args=(downloaded, verified),
+                name="hash",
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._install_stage,
+                args=(verified,),
+                name="install",
+                daemon=True,
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.results
@@ -0,0 +1,206 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from dataclasses import dataclass, field
+
+# enough downloads to smooth out one slow mirror, few enough to follow a new network
+THROUGHPUT_SAMPLES = 20
+# downloads shorter than this mostly measure latency, not bandwidth
+MIN_SAMPLE_SECONDS = 0.5
+
+
+@dataclass
+class ThroughputHistory:
+    """Remember how fast the last downloads were, to estimate the next ones.
+
+    Only the most recent samples are kept, the rate is their total bytes over
+    their total seconds so large downloads weigh more than small ones.
+    """
+
+    history_path: str
+    samples: list = field(default_factory=list, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as file:
+                self.samples = json.load(file)["samples"]
+        except FileNotFoundError:
+            self.samples = []
+        except (ValueError, KeyError, TypeError) as error:
+            logging.error(
+                f"Ignoring corrupt throughput history {self.history_path}: {error}"
+            )
+            self.samples = []
+
+    def record(self, size, seconds):
+        """Add a finished download and save the history"""
+        if size <= 0 or seconds < MIN_SAMPLE_SECONDS:
+            return
+        with self._lock:
+            self.samples.append([int(size), round(seconds, 3)])
+            del self.samples[:-THROUGHPUT_SAMPLES]
+        self.save()
+
+    def rate(self):
+        """Return the measured bytes per second, None without history"""
+        with self._lock:
+            size = sum(sample[0] for sample in self.samples)
+            seconds = sum(sample[1] for sample in self.samples)
+        return size / seconds if seconds else None
+
+    def save(self):
+        """Write the history atomically"""
+        with self._lock:
+            data = json.dumps({"samples": self.samples})
+
+        directory = os.path.dirname(self.history_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".throughput-")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(tmp_path, self.history_path)
+
+
+@dataclass(frozen=True)
+class PlannedJob:
+    """One outdated appimage with what its download is expected to cost"""
+
+    repo: str
+    version: str = None
+    size: int = None  # bytes of the release asset, None if the API didn't say
+    priority: int = 0
+    eta: float = None  # seconds, None without throughput history
+    estimated: bool = False  # size is the one of the installed appimage
+
+
+@dataclass(frozen=True)
+class UpdatePlan:
+    """Jobs to run now, in order, and jobs left for the next run"""
+
+    scheduled: tuple
+    deferred: tuple
+    rate: float = None
+
+    @property
+    def total_bytes(self):
+        return sum(job.size or 0 for job in self.scheduled)
+
+    @property
+    def eta(self):
+        """Estimated seconds for the scheduled downloads, None if unknown"""
+        if self.rate is None:
+            return None
+        return self.total_bytes / self.rate
+
+    @property
+    def repos(self):
+        return [job.repo for job in self.scheduled]
+
+
+def plan_updates(
+    results, configs, rate=None, order="size", max_bytes=None, max_seconds=None
+):
+    """Order the outdated apps and fit them into an optional budget.
+
+    results are the "outdated" JobResults of UpdateEngine.check, configs maps
+    repo -> AppConfig for the per-app priority.
+
+    order="size" runs the smallest downloads first so most apps are done
+    early. order="priority" runs the apps with the highest "priority" in their
+    config first, smallest first among equal priorities. When the API doesn't
+    give the asset size, the installed appimage's size stands in for it; apps
+    with no size at all run last.
+
+    max_bytes / max_seconds cap what is scheduled, apps that don't fit are
+    deferred and picked up again by the next check. A time budget needs a
+    measured rate, without one only the byte budget applies. Apps of unknown
+    size never fit a budget.
+    """
+    jobs = []
+    for result in results:
+        config = configs.get(result.repo)
+        priority = getattr(config, "priority", None) or 0
+        size, estimated = result.size, False
+        if size is None and config is not None:
+            try:
+                size, estimated = os.path.getsize(config.installed_path), True
+            except OSError:
+                pass
+        eta = size / rate if rate and size is not None else None
+        jobs.append(
+            PlannedJob(result.repo, result.version, size, priority, eta, estimated)
+        )
+
+    def size_key(job):
+        return (job.size is None, job.size or 0, job.repo)
+
+    if order == "priority":
+        jobs.sort(key=lambda job: (-job.priority, *size_key(job)))
+    else:
+        jobs.sort(key=size_key)
+
+    scheduled, deferred = [], []
+    planned_bytes = 0
+    for job in jobs:
+        budget = max_bytes is not None or (max_seconds is not None and rate)
+        if job.size is None and budget:
+            # it could be any size, counting it as free would break the budget
+            deferred.append(job)
+            continue
+        size = job.size or 0
+        over_bytes = max_bytes is not None and planned_bytes + size > max_bytes
+        over_time = (
+            max_seconds is not None
+            and rate is not None
+            and (planned_bytes + size) / rate > max_seconds
+        )
+        # keep going, a smaller app further down may still fit
+        if over_bytes or over_time:
+            deferred.append(job)
+            continue
+        scheduled.append(job)
+        planned_bytes += size
+    return UpdatePlan(tuple(scheduled), tuple(deferred), rate)
+
+
+def load_planner_settings(config_path):
+    """Load the planner settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def budget_from_settings(settings):
+    """Return (max_bytes, max_seconds) from planner.json style settings"""
+    max_megabytes = settings.get("max_megabytes")
+    max_minutes = settings.get("max_minutes")
+    return (
+        int(max_megabytes * 1024 * 1024) if max_megabytes else None,
+        max_minutes * 60 if max_minutes else None,
+    )
+
+
+def format_size(size):
+    """Return a size in bytes as a short human readable string"""
+    if size is None:
+        return "?"
+    if size < 1024:
+        return f"{size} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024
+        if size < 1024 or unit == "GiB":
+            break
+    return f"{size:.1f} {unit}"
+
+
+def format_eta(seconds):
+    """Return an ETA in seconds as m:ss, '?' without an estimate"""
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,86 @@
+import json
+import logging
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import unquote, urlsplit
+import requests
+from src.session import http_get, http_head
+
+# "api" asks the REST API every time, "web" learns the latest tag from
+# github.com first and only calls the API when the version changed
+PROBE_BACKENDS = ("api", "web")
+ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+def tag_from_url(url):
+    """Return the tag of a .../releases/tag/{tag} url, None for other urls"""
+    parts = urlsplit(url).path.split("/releases/tag/", 1)
+    if len(parts) != 2:
+        return None
+    return unquote(parts[1]).strip("/") or None
+
+
+def redirect_tag(owner, repo, timeout=10):
+    """Learn the latest tag from where github.com/{owner}/{repo}/releases/latest
+    redirects to, without using API quota"""
+    response = http_head(
+        f"https://github.com/{owner}/{repo}/releases/latest",
+        allow_redirects=False,
+        timeout=timeout,
+    )
+    if response.status_code not in (301, 302, 303, 307, 308):
+        return None
+    # a repo without releases redirects to the release list
+    return tag_from_url(response.headers.get("Location", ""))
+
+
+def atom_tag(owner, repo, timeout=10):
+    """Learn the newest tag from the releases.atom feed of the repo.
+
+    The feed lists pre-releases too, so this is only a fallback for the
+    redirect.
+    """
+    response = http_get(
+        f"https://github.com/{owner}/{repo}/releases.atom", timeout=timeout
+    )
+    if response.status_code != 200:
+        return None
+    entry = ElementTree.fromstring(response.content).find(f"{ATOM}entry")
+    if entry is None:
+        return None
+    link = entry.find(f"{ATOM}link")
+    return tag_from_url(link.get("href", "")) if link is not None else None
+
+
+def probe_latest_tag(owner, repo, atom_fallback=True):
+    """Return the latest release tag without the API, None if unknown"""
+    try:
+        tag = redirect_tag(owner, repo)
+        if tag is None and atom_fallback:
+            tag = atom_tag(owner, repo)
+    except (requests.exceptions.RequestException, ElementTree.ParseError) as error:
+        logging.info(f"Couldn't probe {owner}/{repo}, using the API: {error}")
+        return None
+    return tag
+
+
+def probed_up_to_date(owner, repo, version, update_info=None, atom_fallback=True):
+    """True if github.com says the latest release is still version.
+
+    Releases pinned to a tag by the embedded update information are left to
+    the API.
+    """
+    if update_info is not None and update_info.is_github:
+        if not update_info.release.startswith("latest"):
+            return False
+        owner, repo = update_info.owner, update_info.repo
+    tag = probe_latest_tag(owner, repo, atom_fallback)
+    return tag is not None and tag.replace("v", "") == version
+
+
+def load_probe_settings(config_path):
+    """Load the version probe settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
@@ -0,0 +1,269 @@
+import sys
+import json
+import time
+import threading
+from dataclasses import dataclass, field
+from src.planner import format_eta, format_size
+
+# auto: bars on a terminal, json lines otherwise
+PROGRESS_MODES = ("auto", "bar", "json", "none")
+# seconds between two redraws, however many chunks arrive in between
+DEFAULT_INTERVAL = 0.25
+BAR_WIDTH = 30
+
+_reporter = None
+_reporter_lock = threading.Lock()
+
+
+@dataclass
+class ProgressTask:
+    """Progress of one transfer, owned by a ProgressReporter.
+
+    advance() is called for every chunk, so it only adds to a counter and
+    looks at the clock; the reporter draws at most once per interval.
+    """
+
+    reporter: object
+    name: str
+    total: int = None
+    done: int = 0
+    started: float = field(default_factory=time.monotonic)
+    _next_render: float = field(default=0, init=False)
+
+    def advance(self, amount):
+        self.done += amount
+        now = time.monotonic()
+        if now >= self._next_render:
+            self._next_render = now + self.reporter.interval
+            self.reporter.render(self)
+
+    def restart(self):
+        """Start counting from zero again, e.g. after a source ignored a range"""
+        self.done = 0
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0
+
+    def close(self, status="done"):
+        self.reporter.finish(self, status)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_exc):
+        self.close("done" if exc_type is None else "failed")
+
+
+@dataclass
+class ProgressReporter:
+    """Draw the progress of every running transfer of the process.
+
+    "bar" keeps one block at the bottom of the terminal: an aggregate bar over
+    all transfers of the run plus one line per transfer still running, so
+    concurrent downloads share the screen instead of garbling it. "json"
+    writes one json object per line (start, progress, done/failed events)
+    for the systemd journal, CI logs and GUIs. "none" draws nothing.
+
+    Status lines printed while bars are drawn go through message(), which
+    clears the block, writes them to output and draws the block again below
+    them.
+    """
+
+    mode: str = "bar"
+    interval: float = DEFAULT_INTERVAL
+    stream: object = None
+    output: object = None  # where status messages go, stdout by default
+    tasks: list = field(default_factory=list, init=False)
+    finished_bytes: int = field(default=0, init=False)
+    finished_total: int = field(default=0, init=False)
+    finished_count: int = field(default=0, init=False)
+    _drawn: int = field(default=0, init=False)
+    _partial: bool = field(default=False, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        if self.stream is None:
+            self.stream = sys.stderr
+        if self.output is None:
+            self.output = _real_stdout()
+
+    def start_batch(self):
+        """Start a new aggregate, e.g. at the beginning of an update run"""
+        with self._lock:
+            self.finished_bytes = self.finished_total = self.finished_count = 0
+
+    def task(self, name, total=None):
+        """Start tracking a transfer of total bytes (None if unknown)"""
+        task = ProgressTask(self, name, total or None)
+        with self._lock:
+            self.tasks.append(task)
+            if self.mode == "json":
+                self._emit(task, "start")
+            elif self.mode == "bar":
+                self._draw()
+        return task
+
+    def render(self, task):
+        with self._lock:
+            if self.mode == "json":
+                self._emit(task, "progress")
+            elif self.mode == "bar":
+                self._draw()
+
+    def finish(self, task, status):
+        with self._lock:
+            if task not in self.tasks:
+                return
+            self.tasks.remove(task)
+            self.finished_bytes += task.done
+            self.finished_total += task.total or task.done
+            self.finished_count += 1
+            if self.mode == "json":
+                self._emit(task, status)
+            elif self.mode == "bar":
+                self._clear()
+                elapsed = time.monotonic() - task.started
+                self.stream.write(
+                    f"{task.name}: {status} {format_size(task.done)} "
+                    f"in {format_eta(elapsed)}\n"
+                )
+                self._draw()
+
+    def message(self, text):
+        """Write status text to output without garbling the bars.
+
+        While a line is incomplete, e.g. a prompt waiting for input, no bars
+        are drawn below it.
+        """
+        if not text:
+            return
+        with self._lock:
+            if self.mode == "bar":
+                self._clear()
+            self.output.write(text)
+            self.output.flush()
+            if self.mode == "bar":
+                self._partial = not text.endswith("\n")
+                self._draw()
+
+    def _emit(self, task, event):
+        line = {
+            "event": event,
+            "name": task.name,
+            "bytes": task.done,
+            "total": task.total,
+            "rate": round(task.rate),
+            "time": round(time.time(), 3),
+        }
+        self.stream.write(json.dumps(line) + "\n")
+        self.stream.flush()
+
+    def _clear(self):
+        """Remove the block drawn last time"""
+        if self._drawn:
+            self.stream.write(f"\033[{self._drawn}F\033[J")
+            self._drawn = 0
+
+    def _draw(self):
+        self._clear()
+        if not self.tasks or self._partial:
+            self.stream.flush()
+            return
+        lines = []
+        if len(self.tasks) + self.finished_count > 1:
+            done = self.finished_bytes + sum(task.done for task in self.tasks)
+            total = self.finished_total + sum(
+                task.total or task.done for task in self.tasks
+            )
+            count = len(self.tasks) + self.finished_count
+            lines.append(
+                _bar_line(
+                    _("Total ({finished}/{count})").format(
+                        finished=self.finished_count, count=count
+                    ),
+                    done,
+                    total,
+                    sum(task.rate for task in self.tasks),
+                )
+            )
+        for task in self.tasks:
+            lines.append(_bar_line(task.name, task.done, task.total, task.rate))
+        self.stream.write("".join(line + "\n" for line in lines))
+        self.stream.flush()
+        self._drawn = len(lines)
+
+
+def _bar_line(label, done, total, rate):
+    """Return "label [####    ]  45% 12.0 MiB / 27.0 MiB 3.1 MiB/s" """
+    speed = f"{format_size(int(rate))}/s"
+    if not total:
+        return f"{label} {format_size(done)} {speed}"
+    fraction = min(done / total, 1)
+    filled = int(fraction * BAR_WIDTH)
+    bar = "#" * filled + " " * (BAR_WIDTH - filled)
+    return (
+        f"{label} [{bar}] {fraction:4.0%} "
+        f"{format_size(done)} / {format_size(total)} {speed}"
+    )
+
+
+@dataclass
+class StatusOutput:
+    """Stand-in for sys.stdout that writes through ProgressReporter.message()"""
+
+    reporter: ProgressReporter
+    stream: object
+
+    def write(self, text):
+        self.reporter.message(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _real_stdout():
+    stdout = sys.stdout
+    return stdout.stream if isinstance(stdout, StatusOutput) else stdout
+
+
+def configure_progress(mode="auto", interval=DEFAULT_INTERVAL, stream=None):
+    """Set up the process wide reporter, auto picks by whether stderr is a tty.
+
+    With bars on a terminal, print() goes through the reporter too, so the
+    status lines of the update threads don't land inside the bars.
+    """
+    global _reporter
+    stream = stream or sys.stderr
+    if mode not in PROGRESS_MODES:
+        mode = "auto"
+    if mode == "auto":
+        mode = "bar" if stream.isatty() else "json"
+    output = _real_stdout()
+    with _reporter_lock:
+        _reporter = ProgressReporter(mode, interval, stream, output)
+        sys.stdout = output
+        if mode == "bar" and output.isatty():
+            sys.stdout = StatusOutput(_reporter, output)
+        return _reporter
+
+
+def get_reporter():
+    """Return the process wide reporter, set up with the defaults if needed"""
+    with _reporter_lock:
+        reporter = _reporter
+    return reporter or configure_progress()
+
+
+def load_progress_settings(config_path):
+    """Load the progress settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
@@ -0,0 +1,115 @@
+import time
+import random
+import logging
+import threading
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+import requests
+
+# worth retrying: rate limited or the server/CDN had a hiccup
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Calls to a host are suspended after repeated failures"""
+
+
+@dataclass
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    After failure_threshold consecutive failures a host is skipped for
+    reset_timeout seconds, then a single trial call decides whether it is
+    healthy again.
+    """
+
+    failure_threshold: int = 5
+    reset_timeout: float = 60
+    _failures: dict = field(default_factory=dict, init=False)
+    _opened_at: dict = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def allow(self, host):
+        """Return True if a call to host may be made now"""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # half open: let one trial call through
+                self._opened_at[host] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+
+    def record_failure(self, host):
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self.failure_threshold:
+                if host not in self._opened_at:
+                    logging.error(f"Circuit opened for {host}")
+                self._opened_at[host] = time.monotonic()
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def delay(self, attempt, retry_after=None):
+        """Return the seconds to wait before retry number attempt (1-based)"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def request_with_retries(session, method, url, breaker, policy, **kwargs):
+    """Make a request, retrying transient errors and honouring the breaker"""
+    host = urlsplit(url).netloc
+    for attempt in range(1, policy.attempts + 1):
+        if not breaker.allow(host):
+            raise CircuitOpenError(
+                f"Too many failures talking to {host}, skipping it for now"
+            )
+
+        try:
+            response = session.request(method, url, **kwargs)
+        except TRANSIENT_ERRORS as error:
+            breaker.record_failure(host)
+            if attempt == policy.attempts:
+                raise
+            wait = policy.delay(attempt)
+            logging.warning(f"{method} {url} failed ({error}), retry in {wait:.1f}s")
+        else:
+            if response.status_code not in TRANSIENT_STATUS:
+                breaker.record_success(host)
+                return response
+
+            breaker.record_failure(host)
+            if attempt == policy.attempts:
+                return response
+            wait = policy.delay(attempt, _retry_after(response))
+            logging.warning(
+                f"{method} {url} returned {response.status_code}, retry in {wait:.1f}s"
+            )
+            response.close()
+        time.sleep(wait)
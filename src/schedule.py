@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import statistics
+from datetime import datetime
+from dataclasses import dataclass, field
+
+HOUR = 3600
+# release timestamps kept per repo, the cadence follows the recent ones
+RELEASES_KEPT = 10
+# check a few times per typical release gap, so an update is seen soon after
+CHECKS_PER_RELEASE = 4
+MIN_INTERVAL = HOUR
+MAX_INTERVAL = 7 * 24 * HOUR
+
+
+def parse_timestamp(value):
+    """Return the epoch seconds of a GitHub timestamp like 2024-01-31T12:00:00Z"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+@dataclass
+class ReleaseSchedule:
+    """Decide per repo when it is worth asking GitHub for a new release again.
+
+    The publish times of the releases seen so far are kept for every repo.
+    The check interval is a fraction of the median gap between them, clamped
+    to [MIN_INTERVAL, MAX_INTERVAL], so an app that releases weekly is checked
+    several times a day and one that releases yearly about once a week. Repos
+    with less than two known releases are always due. A check_interval_hours
+    in the app config overrides the learned interval.
+    """
+
+    history_path: str
+    repos: dict = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as file:
+                self.repos = json.load(file)
+        except FileNotFoundError:
+            self.repos = {}
+        except ValueError as error:
+            logging.error(
+                f"Ignoring corrupt release history {self.history_path}: {error}"
+            )
+            self.repos = {}
+
+    def record(self, repo, published_at=None, up_to_date=True):
+        """Remember a check of repo and the publish time of its latest release.
+
+        Only an up to date repo starts a new interval, one with a pending
+        update stays due until it is updated.
+        """
+        with self._lock:
+            entry = self.repos.setdefault(repo, {"releases": [], "last_checked": 0})
+            if up_to_date:
+                entry["last_checked"] = time.time()
+            if published_at is None:
+                return
+            try:
+                published = parse_timestamp(published_at)
+            except ValueError:
+                return
+            if published not in entry["releases"]:
+                entry["releases"] = sorted(entry["releases"] + [published])[
+                    -RELEASES_KEPT:
+                ]
+
+    def interval(self, repo, override_hours=None):
+        """Return the seconds to wait between two checks of repo"""
+        if override_hours:
+            return override_hours * HOUR
+        with self._lock:
+            releases = list(self.repos.get(repo, {}).get("releases", []))
+        if len(releases) < 2:
+            return MIN_INTERVAL
+        gaps = [later - earlier for earlier, later in zip(releases, releases[1:])]
+        interval = statistics.median(gaps) / CHECKS_PER_RELEASE
+        return min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+    def next_check(self, repo, override_hours=None):
+        """Return the epoch seconds when repo should be checked again"""
+        with self._lock:
+            last_checked = self.repos.get(repo, {}).get("last_checked", 0)
+        return last_checked + self.interval(repo, override_hours)
+
+    def is_due(self, repo, override_hours=None, now=None):
+        return (now or time.time()) >= self.next_check(repo, override_hours)
+
+    def save(self):
+        """Write the history atomically"""
+        with self._lock:
+            data = json.dumps(self.repos)
+
+        directory = os.path.dirname(self.history_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".release_history-")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(tmp_path, self.history_path)
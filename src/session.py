@@ -0,0 +1,51 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from src.resilience import CircuitBreaker, RetryPolicy, request_with_retries
+
+_session = None
+_session_lock = threading.Lock()
+
+# shared by every request of the process, so one dead host stops all its calls
+CIRCUIT_BREAKER = CircuitBreaker()
+RETRY_POLICY = RetryPolicy()
+
+
+def get_session():
+    """Return the process wide requests session.
+
+    Reusing one session keeps TCP/TLS connections to api.github.com and the
+    release CDN alive between calls instead of reconnecting for every request.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["User-Agent"] = "my-unicorn"
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def close_session():
+    """Close the process wide session and its pooled connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def http_get(url, **kwargs):
+    """GET through the shared session with retries and the circuit breaker"""
+    return request_with_retries(
+        get_session(), "GET", url, CIRCUIT_BREAKER, RETRY_POLICY, **kwargs
+    )
+
+
+def http_head(url, **kwargs):
+    """HEAD through the shared session with retries and the circuit breaker"""
+    return request_with_retries(
+        get_session(), "HEAD", url, CIRCUIT_BREAKER, RETRY_POLICY, **kwargs
+    )
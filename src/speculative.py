@@ -0,0 +1,58 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+
+
+@dataclass
+class SpeculativeCheck:
+    """Check every app in the background while the user reads the menu.
+
+    Picking an update option from the menu used to start the slow part, one
+    release lookup per app, only after the choice. The check starts as soon
+    as the menu is shown instead, so by the time "Update all" is picked the
+    outdated list is usually complete, and the release json it fetched is
+    reused by the update. Options that don't need it cancel it, which stops
+    it before the next app.
+    """
+
+    engine: object  # UpdateEngine
+    configs: list = field(default=None, init=False)
+    outcome: list = field(default=None, init=False)
+    _cancel: threading.Event = field(default_factory=threading.Event, init=False)
+    _thread: threading.Thread = field(default=None, init=False)
+
+    def start(self):
+        self.configs = self.engine.configs()
+        self._thread = threading.Thread(
+            target=self._check, name="speculative-check", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _check(self):
+        try:
+            results = self.engine.check(self.configs, cancel=self._cancel)
+        except Exception as error:
+            # only a head start, the real check reports errors
+            logging.error(f"Background check failed: {error}", exc_info=True)
+            return
+        if not self._cancel.is_set():
+            self.outcome = results
+
+    def cancel(self, wait=True):
+        """Stop the check, wait for the lookup in flight to end if wait"""
+        self._cancel.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def results(self, configs):
+        """Return the check results of configs, waiting for the check to end.
+
+        None if it was cancelled or the configs changed since it started,
+        the caller checks them itself then.
+        """
+        if self._thread is not None:
+            self._thread.join()
+        if self.outcome is None or configs != self.configs:
+            return None
+        return self.outcome
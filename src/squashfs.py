@@ -0,0 +1,359 @@
+import lzma
+import mmap
+import zlib
+import struct
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+SQUASHFS_MAGIC = b"hsqs"
+METADATA_SIZE = 8192
+NO_FRAGMENT = 0xFFFFFFFF
+# bit set in a data/fragment block size when the block is stored uncompressed
+UNCOMPRESSED_BLOCK = 1 << 24
+# bit set in a metadata block header when the block is stored uncompressed
+UNCOMPRESSED_METADATA = 0x8000
+
+DIRECTORY_TYPES = {1, 8}
+FILE_TYPES = {2, 9}
+SYMLINK_TYPES = {3, 10}
+
+
+class SquashfsError(Exception):
+    """The image is not a squashfs image this reader understands"""
+
+
+# error of zstd images when the zstandard package is missing
+ZSTD_MISSING = "zstd compressed AppImage, install the zstandard package to read it"
+
+
+def _zstd_decompress(data):
+    try:
+        import zstandard
+    except ImportError as error:
+        raise SquashfsError(ZSTD_MISSING) from error
+    try:
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=1 << 20)
+    except zstandard.ZstdError as error:
+        raise SquashfsError(f"corrupt zstd block: {error}") from error
+
+
+def _lzma_decompress(data):
+    return lzma.LZMADecompressor(lzma.FORMAT_ALONE).decompress(data)
+
+
+DECOMPRESSORS = {
+    1: zlib.decompress,  # gzip
+    2: _lzma_decompress,
+    4: lzma.decompress,  # xz
+    6: _zstd_decompress,
+}
+
+
+def elf_size(data):
+    """Return where the ELF runtime of an AppImage ends and the image starts.
+
+    The section header table is the last part of the runtime, exactly what
+    the AppImage runtime itself uses to find its squashfs.
+    """
+    if data[:4] != b"\x7fELF":
+        raise SquashfsError("not an ELF file")
+    endian = "<" if data[5] == 1 else ">"
+    if data[4] == 2:
+        (shoff,) = struct.unpack_from(endian + "Q", data, 0x28)
+        shentsize, shnum = struct.unpack_from(endian + "HH", data, 0x3A)
+    else:
+        (shoff,) = struct.unpack_from(endian + "I", data, 0x20)
+        shentsize, shnum = struct.unpack_from(endian + "HH", data, 0x2E)
+    return shoff + shentsize * shnum
+
+
+@dataclass
+class Superblock:
+    """The fields of the 96 byte squashfs 4.0 superblock this reader needs"""
+
+    inode_count: int
+    modification_time: int
+    block_size: int
+    compression: int
+    version: tuple
+    root_inode: int
+    bytes_used: int
+    inode_table: int
+    directory_table: int
+    fragment_table: int
+
+    @classmethod
+    def parse(cls, data, offset):
+        if data[offset : offset + 4] != SQUASHFS_MAGIC:
+            raise SquashfsError("no squashfs image found")
+        inodes, mtime, block_size, _fragments, compression = struct.unpack_from(
+            "<IIIIH", data, offset + 4
+        )
+        major, minor, root_inode, bytes_used = struct.unpack_from(
+            "<HHQQ", data, offset + 28
+        )
+        inode_table, directory_table, fragment_table = struct.unpack_from(
+            "<QQQ", data, offset + 64
+        )
+        if major != 4:
+            raise SquashfsError(f"unsupported squashfs version {major}.{minor}")
+        if compression not in DECOMPRESSORS:
+            raise SquashfsError(f"unsupported squashfs compression {compression}")
+        return cls(
+            inodes,
+            mtime,
+            block_size,
+            compression,
+            (major, minor),
+            root_inode,
+            bytes_used,
+            inode_table,
+            directory_table,
+            fragment_table,
+        )
+
+
+@dataclass
+class Inode:
+    type: int
+    size: int = 0
+    # directories
+    block: int = 0
+    offset: int = 0
+    # files
+    blocks_start: int = 0
+    block_sizes: tuple = ()
+    fragment: int = NO_FRAGMENT
+    fragment_offset: int = 0
+    # symlinks
+    target: str = None
+
+    @property
+    def is_dir(self):
+        return self.type in DIRECTORY_TYPES
+
+    @property
+    def is_file(self):
+        return self.type in FILE_TYPES
+
+    @property
+    def is_symlink(self):
+        return self.type in SYMLINK_TYPES
+
+
+@dataclass
+class SquashfsImage:
+    """Read files from the root of a squashfs image without mounting it.
+
+    Only what opening a handful of small files needs is implemented: the
+    superblock, inodes, directories, data blocks and fragments. Metadata
+    blocks are decompressed on demand and cached, the data of files that
+    aren't read is never touched, so even a multi-GB AppImage only costs a
+    few reads.
+    """
+
+    data: object  # bytes-like, usually an mmap of the AppImage
+    offset: int = 0
+    superblock: Superblock = field(init=False)
+    _metadata: dict = field(default_factory=dict, init=False)
+
+    def __post_init__(self):
+        self.superblock = Superblock.parse(self.data, self.offset)
+        self.decompress = DECOMPRESSORS[self.superblock.compression]
+
+    @classmethod
+    def from_appimage(cls, data):
+        """Open the squashfs image appended to an AppImage runtime"""
+        return cls(data, elf_size(data))
+
+    def _metadata_block(self, position):
+        """Return (contents, position of the next block) of a metadata block"""
+        if position not in self._metadata:
+            start = self.offset + position
+            (header,) = struct.unpack_from("<H", self.data, start)
+            size = header & ~UNCOMPRESSED_METADATA
+            raw = bytes(self.data[start + 2 : start + 2 + size])
+            contents = raw if header & UNCOMPRESSED_METADATA else self.decompress(raw)
+            self._metadata[position] = (contents, position + 2 + size)
+        return self._metadata[position]
+
+    def _read_metadata(self, table, block, offset, size):
+        """Read size bytes at block/offset of a metadata table"""
+        position = table + block
+        contents, next_position = self._metadata_block(position)
+        result = contents[offset:]
+        while len(result) < size:
+            contents, next_position = self._metadata_block(next_position)
+            result += contents
+        return result[:size]
+
+    def inode(self, reference):
+        """Return the Inode of an inode reference (block << 16 | offset)"""
+        block, offset = reference >> 16, reference & 0xFFFF
+        table = self.superblock.inode_table
+
+        def read(size, skip=0):
+            return self._read_metadata(table, block, offset + skip, size)
+
+        (inode_type,) = struct.unpack("<H", read(2))
+        if inode_type == 1:
+            dir_block, _links, size, dir_offset, _parent = struct.unpack(
+                "<IIHHI", read(16, 16)
+            )
+            return Inode(inode_type, size, dir_block, dir_offset)
+        if inode_type == 8:
+            _links, size, dir_block, _parent, _index, dir_offset, _xattr = (
+                struct.unpack("<IIIIHHI", read(24, 16))
+            )
+            return Inode(inode_type, size, dir_block, dir_offset)
+        if inode_type in FILE_TYPES:
+            if inode_type == 2:
+                blocks_start, fragment, fragment_offset, size = struct.unpack(
+                    "<IIII", read(16, 16)
+                )
+                header_size = 32
+            else:
+                blocks_start, size, _sparse = struct.unpack("<QQQ", read(24, 16))
+                fragment, fragment_offset = struct.unpack("<II", read(8, 44))
+                header_size = 56
+            block_size = self.superblock.block_size
+            if fragment == NO_FRAGMENT:
+                count = (size + block_size - 1) // block_size
+            else:
+                count = size // block_size
+            block_sizes = struct.unpack(f"<{count}I", read(4 * count, header_size))
+            return Inode(
+                inode_type,
+                size,
+                blocks_start=blocks_start,
+                block_sizes=block_sizes,
+                fragment=fragment,
+                fragment_offset=fragment_offset,
+            )
+        if inode_type in SYMLINK_TYPES:
+            _links, target_size = struct.unpack("<II", read(8, 16))
+            target = read(target_size, 24).decode("utf-8", errors="replace")
+            return Inode(inode_type, target_size, target=target)
+        return Inode(inode_type)
+
+    def listdir(self, inode):
+        """Return {name: inode reference} of a directory inode"""
+        entries = {}
+        # the size counts the implicit "." and ".." entries as 3 bytes
+        remaining = inode.size - 3
+        listing = self._read_metadata(
+            self.superblock.directory_table,
+            inode.block,
+            inode.offset,
+            max(0, remaining),
+        )
+        position = 0
+        while position + 12 <= len(listing):
+            count, start, _inode_number = struct.unpack_from("<IIi", listing, position)
+            position += 12
+            for _entry in range(count + 1):
+                entry_offset, _inode_delta, _type, name_size = struct.unpack_from(
+                    "<HhHH", listing, position
+                )
+                position += 8
+                name = listing[position : position + name_size + 1]
+                position += name_size + 1
+                entries[name.decode("utf-8", errors="replace")] = (
+                    start << 16
+                ) | entry_offset
+        return entries
+
+    def root(self):
+        return self.inode(self.superblock.root_inode)
+
+    def _fragment(self, index):
+        """Return the decompressed fragment block index"""
+        entries_per_block = METADATA_SIZE // 16
+        pointer_position = self.offset + self.superblock.fragment_table
+        (block_position,) = struct.unpack_from(
+            "<Q", self.data, pointer_position + 8 * (index // entries_per_block)
+        )
+        entry = self._read_metadata(
+            block_position, 0, (index % entries_per_block) * 16, 16
+        )
+        start, size, _unused = struct.unpack("<QII", entry)
+        return self._block(start, size)
+
+    def _block(self, position, size):
+        start = self.offset + position
+        raw = bytes(self.data[start : start + (size & ~UNCOMPRESSED_BLOCK)])
+        return raw if size & UNCOMPRESSED_BLOCK else self.decompress(raw)
+
+    def read_file(self, inode, limit=None):
+        """Return the contents of a file inode, at most limit bytes"""
+        limit = inode.size if limit is None else min(limit, inode.size)
+        chunks = []
+        total = 0
+        position = inode.blocks_start
+        for size in inode.block_sizes:
+            if total >= limit:
+                break
+            if size == 0:
+                # sparse block
+                chunk = b"\0" * self.superblock.block_size
+            else:
+                chunk = self._block(position, size)
+                position += size & ~UNCOMPRESSED_BLOCK
+            chunks.append(chunk)
+            total += len(chunk)
+        if total < limit and inode.fragment != NO_FRAGMENT:
+            fragment = self._fragment(inode.fragment)
+            tail = inode.size - self.superblock.block_size * len(inode.block_sizes)
+            chunks.append(
+                fragment[inode.fragment_offset : inode.fragment_offset + tail]
+            )
+        return b"".join(chunks)[:limit]
+
+    def lookup(self, path, max_links=8):
+        """Return the inode at a path inside the image, None if there is none.
+
+        Relative symlinks are followed, e.g. the .DirIcon -> app.png link of
+        an AppImage. Absolute ones point outside the image and aren't.
+        """
+        parts = [part for part in path.split("/") if part not in ("", ".")]
+        directory, parents, links = self.root(), [], 0
+        while parts:
+            name = parts.pop(0)
+            if name == "..":
+                directory = parents.pop() if parents else self.root()
+                continue
+            entries = self.listdir(directory)
+            if name not in entries:
+                return None
+            inode = self.inode(entries[name])
+            if inode.is_symlink:
+                links += 1
+                if links > max_links or inode.target.startswith("/"):
+                    return None
+                target = inode.target.split("/")
+                parts = [part for part in target if part not in ("", ".")] + parts
+            elif not parts:
+                return inode
+            elif inode.is_dir:
+                parents.append(directory)
+                directory = inode
+            else:
+                return None
+        return directory
+
+
+@contextmanager
+def open_appimage(path):
+    """Open the squashfs image of an AppImage through mmap"""
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                yield SquashfsImage.from_appimage(data)
+            except (
+                struct.error,
+                ValueError,
+                IndexError,
+                zlib.error,
+                lzma.LZMAError,
+            ) as error:
+                raise SquashfsError(f"corrupt squashfs image: {error}") from error
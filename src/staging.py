@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+from dataclasses import dataclass, asdict
+
+STAGING_DIR = ".staging"
+
+
+@dataclass(frozen=True)
+class StagedRelease:
+    """A downloaded and verified release waiting to be activated"""
+
+    repo: str
+    version: str  # version of the staged release
+    from_version: str  # installed version it was prefetched for
+    digest: str  # "hash_type:hex", verified before staging
+    size: int
+    mtime_ns: int
+    staged_at: float
+    path: str = None
+
+
+@dataclass
+class StagingArea:
+    """Releases prefetched into {appimage_folder}/.staging/.
+
+    The staging directory is on the same filesystem as the installed
+    AppImages, so activating a release is a rename and takes no time however
+    large it is. Each {repo}.AppImage has a {repo}.json manifest next to it,
+    written after the file, so a staged release without a manifest was never
+    finished and is ignored.
+    """
+
+    folder: str
+
+    @property
+    def directory(self):
+        return os.path.join(os.path.expanduser(self.folder), STAGING_DIR)
+
+    def _paths(self, repo):
+        return (
+            os.path.join(self.directory, f"{repo}.AppImage"),
+            os.path.join(self.directory, f"{repo}.json"),
+        )
+
+    def stage(self, repo, appimage, version, from_version, digest):
+        """Move a verified appimage into the staging area"""
+        path, manifest_path = self._paths(repo)
+        os.makedirs(self.directory, exist_ok=True)
+        self.discard(repo)
+        # copies if the download is on another filesystem, the rename into
+        # place is atomic either way
+        tmp_path = os.path.join(self.directory, f".{repo}.AppImage.tmp")
+        shutil.move(appimage, tmp_path)
+        os.replace(tmp_path, path)
+
+        stat = os.stat(path)
+        staged = StagedRelease(
+            repo,
+            version,
+            from_version,
+            digest,
+            stat.st_size,
+            stat.st_mtime_ns,
+            time.time(),
+        )
+        data = asdict(staged)
+        data.pop("path")
+        fd, tmp_manifest = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4)
+        os.replace(tmp_manifest, manifest_path)
+        return staged
+
+    def get(self, repo, installed_version):
+        """Return the staged release of repo if it still applies, else None.
+
+        A release staged for another installed version (the app was updated
+        some other way meanwhile) or whose file changed since it was verified
+        is discarded.
+        """
+        path, manifest_path = self._paths(repo)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as file:
+                staged = StagedRelease(**json.load(file), path=path)
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as error:
+            logging.error(f"Ignoring corrupt staging manifest of {repo}: {error}")
+            self.discard(repo)
+            return None
+
+        stale = staged.version == installed_version
+        if stale or staged.from_version != installed_version:
+            self.discard(repo)
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (staged.size, staged.mtime_ns):
+            logging.error(f"Staged {repo}.AppImage changed after it was verified")
+            self.discard(repo)
+            return None
+        return staged
+
+    def activate(self, staged, destination, backup=None):
+        """Put the staged release in place of destination by renaming it.
+
+        The old file is hard linked to backup first when a backup is wanted,
+        so destination is never missing.
+        """
+        if backup and os.path.exists(destination):
+            os.makedirs(os.path.dirname(backup), exist_ok=True)
+            tmp_backup = f"{backup}.tmp"
+            try:
+                if os.path.exists(tmp_backup):
+                    os.remove(tmp_backup)
+                os.link(destination, tmp_backup)
+            except OSError:
+                # another filesystem or no hard links, copy it
+                shutil.copy2(destination, tmp_backup)
+            os.replace(tmp_backup, backup)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(staged.path, destination)
+        self.discard(staged.repo)
+
+    def discard(self, repo):
+        for path in self._paths(repo):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,129 @@
+import os
+import mmap
+import struct
+import logging
+from dataclasses import dataclass
+
+ELF_MAGIC = b"\x7fELF"
+# section that appimagetool writes the update information into
+UPDATE_INFO_SECTION = ".upd_info"
+
+
+@dataclass(frozen=True)
+class UpdateInfo:
+    """Update information embedded in an AppImage, e.g.
+
+    gh-releases-zsync|owner|repo|latest|*x86_64.AppImage.zsync
+    zsync|https://example.com/app-latest-x86_64.AppImage.zsync
+    """
+
+    transport: str
+    owner: str = None
+    repo: str = None
+    release: str = "latest"
+    pattern: str = None
+    url: str = None
+
+    @classmethod
+    def parse(cls, text):
+        """Parse the section contents, None if the format is unknown"""
+        parts = text.strip().split("|")
+        if parts[0] == "gh-releases-zsync" and len(parts) == 5:
+            return cls(parts[0], parts[1], parts[2], parts[3] or "latest", parts[4])
+        if parts[0] == "zsync" and len(parts) == 2:
+            return cls(parts[0], url=parts[1])
+        return None
+
+    @property
+    def is_github(self):
+        return self.transport == "gh-releases-zsync"
+
+    @property
+    def asset_pattern(self):
+        """Glob of the AppImage asset, the pattern names its .zsync file"""
+        if self.pattern is None:
+            return None
+        return (
+            self.pattern[: -len(".zsync")]
+            if self.pattern.endswith(".zsync")
+            else self.pattern
+        )
+
+    @property
+    def api_url(self):
+        """GitHub API url of the release the AppImage follows"""
+        base = f"https://api.github.com/repos/{self.owner}/{self.repo}/releases"
+        # latest-pre/latest-all would need the release list, follow latest
+        if self.release.startswith("latest"):
+            return f"{base}/latest"
+        return f"{base}/tags/{self.release}"
+
+
+def _unpack(data, fmt, offset):
+    return struct.unpack_from(fmt, data, offset)
+
+
+def read_elf_section(path, name):
+    """Return the contents of an ELF section of a file, None if it has none.
+
+    Only the ELF header, the section headers and the section itself are
+    touched through mmap, the squashfs image appended to an AppImage is never
+    read.
+    """
+    try:
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _find_section(data, name.encode())
+    except (OSError, ValueError, struct.error) as error:
+        # empty files can't be mapped, truncated headers fail to unpack
+        logging.debug(f"Couldn't read {name} from {path}: {error}")
+        return None
+
+
+def _find_section(data, name):
+    if len(data) < 64 or data[:4] != ELF_MAGIC:
+        return None
+    elf_class, byte_order = data[4], data[5]
+    endian = "<" if byte_order == 1 else ">"
+    if elf_class == 2:  # 64 bit
+        (shoff,) = _unpack(data, endian + "Q", 0x28)
+        shentsize, shnum, shstrndx = _unpack(data, endian + "HHH", 0x3A)
+        header_fmt, offset_index, size_index = endian + "IIQQQQ", 4, 5
+    elif elf_class == 1:  # 32 bit
+        (shoff,) = _unpack(data, endian + "I", 0x20)
+        shentsize, shnum, shstrndx = _unpack(data, endian + "HHH", 0x2E)
+        header_fmt, offset_index, size_index = endian + "IIIIII", 4, 5
+    else:
+        return None
+
+    if shnum == 0 or shstrndx >= shnum or shoff + shnum * shentsize > len(data):
+        return None
+
+    def section(index):
+        header = _unpack(data, header_fmt, shoff + index * shentsize)
+        return header[0], header[offset_index], header[size_index]
+
+    _name, strtab_offset, strtab_size = section(shstrndx)
+    for index in range(shnum):
+        name_offset, offset, size = section(index)
+        if name_offset >= strtab_size:
+            continue
+        start = strtab_offset + name_offset
+        end = data.find(b"\0", start, strtab_offset + strtab_size)
+        if data[start:end] == name:
+            if offset + size > len(data):
+                return None
+            return bytes(data[offset : offset + size])
+    return None
+
+
+def read_update_info(path):
+    """Return the UpdateInfo embedded in an AppImage, None if there is none"""
+    if not path or not os.path.isfile(path):
+        return None
+    contents = read_elf_section(path, UPDATE_INFO_SECTION)
+    if not contents:
+        return None
+    # the section has a fixed size and is padded with NUL bytes
+    text = contents.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+    return UpdateInfo.parse(text) if text else None
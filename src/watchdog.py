@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import socket
+import logging
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+import requests
+from src.session import http_get
+
+CHUNK_SIZE = 64 * 1024
+# below this many bytes per second over a whole window a connection is stalled
+DEFAULT_MIN_RATE = 16 * 1024
+DEFAULT_WINDOW = 30
+# new connections per download after a stall or a dropped connection
+DEFAULT_RECONNECTS = 3
+# socket timeout before anything was learned about a host
+DEFAULT_TIMEOUT = 10
+# learned timeouts stay within these bounds, in seconds
+MIN_TIMEOUT = 3
+MAX_TIMEOUT = 30
+# a learned timeout is this many times the usual wait of the host
+TIMEOUT_FACTOR = 4
+# weight of the newest transfer in the learned values of a host
+SMOOTHING = 0.3
+
+
+class TransferStalled(requests.exceptions.ConnectionError):
+    """The transfer stayed under the minimum rate for a whole window"""
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+def _socket(response):
+    """Return the socket the body of response is read from, None if unknown"""
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        # urllib3 2 keeps it only in the http.client response it wraps
+        fp = getattr(getattr(response.raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    return sock
+
+
+def _abort(response, sock):
+    """Shut the connection of response down, failing a read blocked on it.
+
+    Closing the response doesn't wake a recv() running in another thread,
+    shutting the socket down does.
+    """
+    if sock is None:
+        response.close()
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+@dataclass
+class RateWatchdog:
+    """Sliding window over the received bytes, checked by a timer thread.
+
+    The socket timeout only fires when nothing arrives at all, a server that
+    sends a few bytes every few seconds never trips it. The watchdog shuts
+    the connection down once less than min_rate bytes/s arrived over the last
+    window seconds, so the read blocked on it fails right away.
+    """
+
+    min_rate: float = DEFAULT_MIN_RATE
+    window: float = DEFAULT_WINDOW
+    stalled: bool = field(default=False, init=False)
+    _samples: deque = field(default_factory=deque, init=False)
+    _received: int = field(default=0, init=False)
+    _started: float = field(default_factory=time.monotonic, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def feed(self, amount):
+        with self._lock:
+            self._samples.append((time.monotonic(), amount))
+            self._received += amount
+
+    def rate(self, now=None):
+        """Bytes per second over the last window"""
+        now = now or time.monotonic()
+        with self._lock:
+            while self._samples and self._samples[0][0] < now - self.window:
+                self._received -= self._samples.popleft()[1]
+            return self._received / self.window
+
+    def is_stalled(self, now=None):
+        now = now or time.monotonic()
+        # the first window also covers the slow start of the connection
+        return now - self._started >= self.window and self.rate(now) < self.min_rate
+
+    @contextmanager
+    def watch(self, response):
+        """Watch response while the block runs, raise TransferStalled if cut"""
+        done = threading.Event()
+        # found before the body is read, the check thread needs it mid-read
+        sock = _socket(response)
+
+        def check():
+            while not done.wait(min(1, self.window / 4)):
+                if self.is_stalled():
+                    self.stalled = True
+                    _abort(response, sock)
+                    return
+
+        thread = threading.Thread(target=check, name="watchdog", daemon=True)
+        thread.start()
+        try:
+            yield self
+        except (requests.exceptions.RequestException, OSError) as error:
+            if self.stalled:
+                raise TransferStalled(
+                    f"{response.url} sent less than {self.min_rate:.0f} B/s "
+                    f"for {self.window:.0f}s"
+                ) from error
+            raise
+        finally:
+            done.set()
+            thread.join()
+        if self.stalled:
+            raise TransferStalled(f"{response.url} stalled")
+
+
+@dataclass
+class DownloadGuard:
+    """Stall-proof downloads with timeouts learned per host.
+
+    Every transfer records how long the host took to answer and the longest
+    wait between two chunks. The socket timeout of the next request to that
+    host is a few times those (3 to 30 seconds), so a fast mirror is dropped
+    quickly when it hangs and a slow but steady one is left alone. Stalled or
+    broken transfers reconnect and resume from where they stopped.
+    """
+
+    history_path: str = None
+    min_rate: float = DEFAULT_MIN_RATE
+    window: float = DEFAULT_WINDOW
+    reconnects: int = DEFAULT_RECONNECTS
+    hosts: dict = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self):
+        if not self.history_path:
+            return
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as file:
+                self.hosts = json.load(file)
+        except FileNotFoundError:
+            pass
+        except ValueError as error:
+            logging.error(f"Ignoring corrupt timeout history: {error}")
+
+    def timeout(self, url):
+        """Return the (connect, read) timeout for the host of url"""
+        with self._lock:
+            learned = self.hosts.get(_host(url))
+        if not learned:
+            return (DEFAULT_TIMEOUT, DEFAULT_TIMEOUT)
+        connect = learned["first_byte"] * TIMEOUT_FACTOR
+        read = max(learned["first_byte"], learned["gap"]) * TIMEOUT_FACTOR
+        return (
+            min(max(connect, MIN_TIMEOUT), MAX_TIMEOUT),
+            min(max(read, MIN_TIMEOUT), MAX_TIMEOUT),
+        )
+
+    def record(self, url, first_byte, gap):
+        """Fold one transfer into the learned values of its host"""
+        host = _host(url)
+        with self._lock:
+            learned = self.hosts.get(host)
+            if learned is None:
+                learned = {"first_byte": first_byte, "gap": gap}
+            else:
+                for key, value in (("first_byte", first_byte), ("gap", gap)):
+                    learned[key] += SMOOTHING * (value - learned[key])
+            self.hosts[host] = learned
+        self.save()
+
+    def save(self):
+        if not self.history_path:
+            return
+        with self._lock:
+            data = json.dumps(self.hosts, indent=4)
+        directory = os.path.dirname(self.history_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(tmp_path, self.history_path)
+
+    def stream(self, url, part_path, progress, size=None):
+        """Continue part_path from url over one connection.
+
+        Returns True once the file is complete. Raises TransferStalled or the
+        requests error when the connection stalls or breaks.
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if size and offset >= size:
+            return True
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        started = time.monotonic()
+        with http_get(
+            url, headers=headers, stream=True, timeout=self.timeout(url)
+        ) as response:
+            if offset and response.status_code == 416:
+                # nothing left to send, the part file is already complete
+                return size is None or offset >= size
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                # the server ignored the range, start the file over
+                progress.restart()
+                offset = 0
+            total = size or _total_size(response, offset)
+            first_byte = time.monotonic() - started
+            gap, last = 0, time.monotonic()
+            watchdog = RateWatchdog(self.min_rate, self.window)
+            with watchdog.watch(response), open(
+                part_path, "ab" if offset else "wb"
+            ) as file:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(chunk)
+                    watchdog.feed(len(chunk))
+                    progress.advance(len(chunk))
+                    now = time.monotonic()
+                    gap, last = max(gap, now - last), now
+        self.record(url, first_byte, gap)
+        received = os.path.getsize(part_path)
+        return total is None or received >= total
+
+    def fetch(self, url, part_path, progress, size=None):
+        """Download url to part_path, reconnecting and resuming on stalls"""
+        for attempt in range(self.reconnects + 1):
+            try:
+                if self.stream(url, part_path, progress, size):
+                    return
+                error = requests.exceptions.ConnectionError(f"{url} ended early")
+            except requests.exceptions.HTTPError as caught:
+                # the server answered, another connection won't change that
+                if caught.response is not None and caught.response.status_code < 500:
+                    raise
+                error = caught
+            except (requests.exceptions.RequestException, OSError) as caught:
+                error = caught
+            if attempt < self.reconnects:
+                logging.warning(f"Reconnecting to {url} after: {error}")
+                print(
+                    _("Download from {host} interrupted, resuming...").format(
+                        host=_host(url)
+                    )
+                )
+        raise error
+
+
+def _total_size(response, offset):
+    """Return the full size of the file from the response headers"""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    length = response.headers.get("content-length")
+    return offset + int(length) if length else None
+
+
+def load_watchdog_settings(config_path):
+    """Load the watchdog settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def load_download_guard(config_path, history_path):
+    """Return a DownloadGuard from watchdog.json and the learned timeouts"""
+    settings = load_watchdog_settings(config_path)
+    return DownloadGuard(
+        history_path,
+        min_rate=settings.get("min_rate_kib", DEFAULT_MIN_RATE / 1024) * 1024,
+        window=settings.get("window_seconds", DEFAULT_WINDOW),
+        reconnects=settings.get("reconnects", DEFAULT_RECONNECTS),
+    )
@@ -0,0 +1,121 @@
+import json
+import random
+import signal
+import logging
+import threading
+from dataclasses import dataclass, field
+from src.engine import UpdateEngine
+from src.session import close_session
+
+
+@dataclass
+class Watcher:
+    """Keep one process running and re-check the configured appimages.
+
+    The HTTP session and the parsed configs stay warm between checks, changes
+    in config_files/ are picked up on the next cycle. Each cycle only queries
+    the repos that are due by their release cadence, full_check=True queries
+    every repo every time.
+    """
+
+    file_handler: object
+    interval: float = 3600
+    jitter: float = 300
+    auto_update: bool = False
+    full_check: bool = False
+    lock_policy: str = None  # overrides the policy of locks.json
+    engine: UpdateEngine = field(init=False)
+    stop_event: threading.Event = field(default_factory=threading.Event, init=False)
+
+    def __post_init__(self):
+        self.engine = UpdateEngine.from_file_handler(self.file_handler)
+        if self.lock_policy:
+            self.engine.locks.policy = self.lock_policy
+
+    def check_once(self):
+        """Check every configured appimage once, return the outdated results"""
+        added, changed, removed = self.engine.config_store.refresh()
+        for name in added:
+            logging.info(f"Watching new config {name}")
+        for name in changed:
+            logging.info(f"Reloaded changed config {name}")
+        for name in removed:
+            logging.info(f"Stopped watching removed config {name}")
+
+        configs = self.engine.configs(refresh=False)
+        outdated = []
+        results = self.engine.check(configs, scheduled=not self.full_check)
+        for config, result in zip(configs, results):
+            if result.status == "skipped":
+                # not due yet, it rarely releases
+                logging.info(f"Skipped {config.repo}: {result.message}")
+            elif result.status == "failed":
+                print(
+                    _("Error checking {repo}: {error}").format(
+                        repo=config.repo, error=result.message
+                    )
+                )
+            elif result.status == "outdated":
+                print(
+                    _("{repo}: {current} -> {latest}").format(
+                        repo=config.repo, current=config.version, latest=result.version
+                    )
+                )
+                logging.info(f"{config.repo} {config.version} -> {result.version}")
+                outdated.append(result)
+
+        if not outdated:
+            print(_("All appimages are up to date"))
+        return outdated
+
+    def update(self, outdated):
+        """Apply the updates that fit the planner budget without prompting"""
+        plan = self.engine.plan(outdated)
+        for job in plan.deferred:
+            # still outdated on the next check, so it's retried then
+            logging.info(f"{job.repo} deferred, doesn't fit the update budget")
+            print(_("{repo}: deferred").format(repo=job.repo))
+        # failed appimages are simply retried on the next check
+        for result in self.engine.run(self.engine.jobs(plan.repos)):
+            logging.info(f"{result.repo}: {result.status} {result.message or ''}")
+            print(_("{repo}: {status}").format(repo=result.repo, status=result.status))
+
+    def next_delay(self):
+        """Return the seconds until the next check, spread by a random jitter"""
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    def run(self):
+        """Run the check loop until SIGINT/SIGTERM"""
+        self.install_signal_handlers()
+        print(
+            _(
+                "Watching appimages every {minutes} minutes. Press Ctrl+C to stop."
+            ).format(minutes=round(self.interval / 60, 1))
+        )
+        try:
+            while not self.stop_event.is_set():
+                outdated = self.check_once()
+                if outdated and self.auto_update and not self.stop_event.is_set():
+                    self.update(outdated)
+                self.stop_event.wait(self.next_delay())
+        finally:
+            close_session()
+            print(_("Watcher stopped."))
+
+    def stop(self, *_args):
+        """Stop the loop after the current check"""
+        self.stop_event.set()
+
+    def install_signal_handlers(self):
+        """Stop cleanly on SIGINT/SIGTERM (e.g. systemctl stop)"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+
+def load_watch_settings(config_path):
+    """Load the watch settings, missing keys are left out"""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
@@ -0,0 +1,8 @@
+import os
+import sys
+import gettext
+
+# the tests import src.* like main.py does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the modules print through the _() gettext installs
+gettext.install("messages")
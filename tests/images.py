@@ -0,0 +1,194 @@
+"""Build small AppImages for the tests: an ELF runtime plus a squashfs image.
+
+squashfs() writes a gzip compressed squashfs 4.0 image of a tree like
+{"app.desktop": b"...", "usr": {"bin": {...}}, ".DirIcon": ("link", "app.png")}.
+Only what the reader supports is written: basic inodes, one metadata block
+per table and, with fragments=True, the tails of files packed in a fragment.
+"""
+
+import zlib
+import struct
+
+BLOCK_SIZE = 131072
+METADATA_SIZE = 8192
+
+
+def elf(sections=None):
+    """Return a 64 bit little endian ELF file holding the named sections.
+
+    The section headers come last, as in the AppImage runtime, so the image
+    appended to it starts right after them.
+    """
+    sections = dict(sections or {})
+    body = bytearray(b"\0" * 64)
+    placed = []
+    for name, contents in sections.items():
+        placed.append((name, len(body), len(contents)))
+        body += contents
+    names = bytearray(b"\0")
+    name_offsets = {}
+    for name in list(sections) + [".shstrtab"]:
+        name_offsets[name] = len(names)
+        names += name.encode() + b"\0"
+    placed.append((".shstrtab", len(body), len(names)))
+    body += names
+
+    headers = bytearray(b"\0" * 64)  # the null section
+    for name, offset, size in placed:
+        headers += struct.pack(
+            "<IIQQQQIIQQ", name_offsets[name], 1, 0, 0, offset, size, 0, 0, 1, 0
+        )
+    shoff = len(body)
+    header = struct.pack(
+        "<4sBBBB8sHHIQQQIHHHHHH",
+        b"\x7fELF",
+        2,  # 64 bit
+        1,  # little endian
+        1,
+        0,
+        b"\0" * 8,
+        2,
+        62,
+        1,
+        0,
+        0,
+        shoff,
+        0,
+        64,
+        0,
+        0,
+        64,
+        len(placed) + 1,
+        len(placed),  # .shstrtab is the last section
+    )
+    body[:64] = header
+    return bytes(body + headers)
+
+
+def _metadata(raw):
+    assert len(raw) <= METADATA_SIZE, "the tests only need one metadata block"
+    packed = zlib.compress(raw)
+    if len(packed) < len(raw):
+        return struct.pack("<H", len(packed)) + packed
+    return struct.pack("<H", len(raw) | 0x8000) + raw
+
+
+def squashfs(tree, fragments=False):
+    """Return a squashfs image of tree"""
+    data = bytearray(b"\0" * 96)
+    inodes, directories, fragment = bytearray(), bytearray(), bytearray()
+    count = [0]
+
+    def add(node):
+        """Write node, return (inode reference, inode number, type)"""
+        if isinstance(node, dict):
+            children = [(name,) + add(node[name]) for name in sorted(node)]
+            count[0] += 1
+            number = count[0]
+            listing = bytearray()
+            if children:
+                listing += struct.pack("<IIi", len(children) - 1, 0, children[0][2])
+                for name, reference, child, kind in children:
+                    listing += struct.pack(
+                        "<HhHH",
+                        reference,
+                        child - children[0][2],
+                        kind,
+                        len(name.encode()) - 1,
+                    )
+                    listing += name.encode()
+            offset = len(directories)
+            directories.extend(listing)
+            reference = len(inodes)
+            inodes.extend(struct.pack("<HHHHII", 1, 0o755, 0, 0, 0, number))
+            inodes.extend(
+                struct.pack("<IIHHI", 0, 2, len(listing) + 3, offset, number + 1)
+            )
+            return reference, number, 1
+        if isinstance(node, tuple):
+            count[0] += 1
+            target = node[1].encode()
+            reference = len(inodes)
+            inodes.extend(struct.pack("<HHHHII", 3, 0o777, 0, 0, 0, count[0]))
+            inodes.extend(struct.pack("<II", 1, len(target)) + target)
+            return reference, count[0], 3
+
+        count[0] += 1
+        start, sizes = len(data), []
+        tail = len(node) % BLOCK_SIZE if fragments else 0
+        full = node[: len(node) - tail]
+        for index in range(0, len(full), BLOCK_SIZE):
+            block = full[index : index + BLOCK_SIZE]
+            packed = zlib.compress(block)
+            if len(packed) < len(block):
+                data.extend(packed)
+                sizes.append(len(packed))
+            else:
+                data.extend(block)
+                sizes.append(len(block) | (1 << 24))
+        if tail:
+            fragment_index, fragment_offset = 0, len(fragment)
+            fragment.extend(node[-tail:])
+        else:
+            fragment_index, fragment_offset = 0xFFFFFFFF, 0
+        reference = len(inodes)
+        inodes.extend(struct.pack("<HHHHII", 2, 0o644, 0, 0, 0, count[0]))
+        inodes.extend(
+            struct.pack("<IIII", start, fragment_index, fragment_offset, len(node))
+        )
+        inodes.extend(struct.pack(f"<{len(sizes)}I", *sizes))
+        return reference, count[0], 2
+
+    root, _number, _kind = add(tree)
+    fragment_table, fragment_count = 0xFFFFFFFFFFFFFFFF, 0
+    if fragment:
+        start = len(data)
+        packed = zlib.compress(bytes(fragment))
+        data.extend(packed)
+        entries = len(data)
+        data.extend(_metadata(struct.pack("<QII", start, len(packed), 0)))
+        fragment_table, fragment_count = len(data), 1
+        data.extend(struct.pack("<Q", entries))
+    inode_table = len(data)
+    data.extend(_metadata(bytes(inodes)))
+    directory_table = len(data)
+    data.extend(_metadata(bytes(directories)))
+    id_block = len(data)
+    data.extend(_metadata(struct.pack("<I", 0)))
+    id_table = len(data)
+    data.extend(struct.pack("<Q", id_block))
+    data[:96] = struct.pack(
+        "<4sIIIIHHHHHHQQQQQQQQ",
+        b"hsqs",
+        count[0],
+        0,
+        BLOCK_SIZE,
+        fragment_count,
+        1,  # gzip
+        17,
+        0,
+        1,
+        4,
+        0,
+        root,
+        len(data),
+        id_table,
+        0xFFFFFFFFFFFFFFFF,
+        inode_table,
+        directory_table,
+        fragment_table,
+        0xFFFFFFFFFFFFFFFF,
+    )
+    data.extend(b"\0" * (-len(data) % 4096))
+    return bytes(data)
+
+
+def appimage(path, tree, update_info=None, fragments=True):
+    """Write an AppImage of tree to path, with update_info in .upd_info"""
+    sections = {}
+    if update_info is not None:
+        sections[".upd_info"] = update_info.encode().ljust(1024, b"\0")
+    with open(path, "wb") as file:
+        file.write(elf(sections))
+        file.write(squashfs(tree, fragments))
+    return path
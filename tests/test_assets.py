@@ -0,0 +1,64 @@
+from src.assets import rule_for, select_appimage_asset, select_sha_asset
+from src.update_info import UpdateInfo
+
+
+def assets(*names):
+    return [{"name": name} for name in names]
+
+
+def picked(*args, **kwargs):
+    asset = select_appimage_asset(*args, **kwargs)
+    return asset["name"] if asset is not None else None
+
+
+RELEASE = assets(
+    "App-2.0-arm64.AppImage",
+    "App-2.0-x86_64.AppImage",
+    "App-2.0.AppImage",
+    "latest-linux.yml",
+)
+
+
+def test_native_build_first_then_generic():
+    assert picked(RELEASE, arch="x86_64") == "App-2.0-x86_64.AppImage"
+    assert picked(RELEASE, arch="armv7l") == "App-2.0.AppImage"
+
+
+def test_rule_never_picks_another_architecture():
+    only_arm = assets("App-2.0-arm64.AppImage")
+    assert picked(only_arm, rule="App-*.AppImage", arch="x86_64") is None
+
+
+def test_embedded_pattern_wins_over_learned_rule():
+    info = UpdateInfo.parse("gh-releases-zsync|o|app|latest|App-?.?.AppImage.zsync")
+    chosen = picked(RELEASE, info, learned="App-*-x86_64.AppImage", arch="x86_64")
+    assert chosen == "App-2.0.AppImage"
+
+
+def test_user_rule_wins_over_embedded_pattern():
+    info = UpdateInfo.parse("gh-releases-zsync|o|app|latest|App-?.?.AppImage.zsync")
+    chosen = picked(RELEASE, info, rule="re:App-.*-x86_64\\.AppImage", arch="x86_64")
+    assert chosen == "App-2.0-x86_64.AppImage"
+
+
+def test_stale_rule_falls_back_to_guessing():
+    assert picked(RELEASE, rule="Other-*.AppImage", arch="x86_64") == (
+        "App-2.0-x86_64.AppImage"
+    )
+
+
+def test_sha_asset_by_rule_learned_or_name():
+    release = assets("App.AppImage", "SHA256SUMS.txt", "checksums-linux.sha256")
+    assert select_sha_asset(release, rule="SHA*")["name"] == "SHA256SUMS.txt"
+    assert (
+        select_sha_asset(release, learned="checksums-*")["name"]
+        == "checksums-linux.sha256"
+    )
+    assert select_sha_asset(assets("App.AppImage")) is None
+
+
+def test_rule_for_replaces_the_version():
+    assert rule_for("Joplin-3.0.1-x86_64.AppImage", "3.0.1") == (
+        "Joplin-*-x86_64.AppImage"
+    )
+    assert rule_for("App[beta].AppImage", None) == "App[[]beta].AppImage"
@@ -0,0 +1,74 @@
+import os
+import hashlib
+import pytest
+import src.file_handler as file_handler_module
+from src.cache import ArtifactCache
+from src.file_handler import FileHandler
+from src.hashing import DigestCache, format_digest
+from src.peers import PeerIndex
+
+DATA = b"\x7fELF appimage" * 1000
+HEX = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    source = tmp_path / "download.AppImage"
+    source.write_bytes(DATA)
+    cache.store(str(source), "sha256", HEX)
+    return cache
+
+
+def test_installs_are_not_linked_to_the_cache(cache, tmp_path):
+    destination = tmp_path / "apps" / "app.AppImage"
+    assert cache.materialize("sha256", HEX, str(destination))
+    entry = cache.lookup("sha256", HEX)
+    assert os.stat(entry).st_ino != os.stat(destination).st_ino
+    assert os.stat(entry).st_nlink == 1
+
+    with open(destination, "r+b") as file:
+        file.write(b"patched")
+    with open(entry, "rb") as file:
+        assert file.read() == DATA
+    assert not cache.materialize("sha256", "00" * 32, str(destination))
+
+
+def test_changed_hardlinked_entries_are_not_served(cache, tmp_path):
+    index = PeerIndex(
+        str(tmp_path / "config_files"),
+        DigestCache(str(tmp_path / "digests.json")),
+        cache,
+    )
+    digest = format_digest("sha256", HEX)
+    entry = cache.lookup("sha256", HEX)
+    assert index.path(digest) == entry
+
+    # installs of older versions were hardlinks of the entry
+    installed = tmp_path / "app.AppImage"
+    os.link(entry, installed)
+    assert index.path(digest) == entry
+    os.chmod(entry, 0o644)
+    with open(installed, "r+b") as file:
+        file.write(b"patched")
+    assert index.path(digest) is None
+
+
+def test_download_hashed_on_its_way_in_is_not_hashed_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "app-2.0.AppImage").write_bytes(DATA)
+    handler = FileHandler(
+        file_path=str(tmp_path / "config_files"),
+        appimage_folder=str(tmp_path / "apps"),
+        repo="app",
+        appimage_name="app-2.0.AppImage",
+    )
+    handler.asset_digest = format_digest("sha256", HEX)
+    handler.downloaded_digest = handler.asset_digest
+
+    def hash_file(path, hash_type):
+        pytest.fail(f"{path} hashed again")
+
+    monkeypatch.setattr(file_handler_module, "hash_file", hash_file)
+    assert handler.verify_sha()
+    assert handler.verified_digest == handler.asset_digest
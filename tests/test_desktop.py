@@ -0,0 +1,83 @@
+import pytest
+from tests.images import appimage
+from src.desktop import (
+    PNG_SIGNATURE,
+    exec_arguments,
+    icon_extension,
+    load_desktop_integrator,
+    read_integration,
+    rewrite_desktop_entry,
+)
+
+PNG = PNG_SIGNATURE + b"\0\0\0\rIHDR" + b"\0\0\0\x40\0\0\0\x40" + b"\0" * 16
+SVG = b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg"/>\n'
+XPM = b'/* XPM */\nstatic char *app[] = {\n"16 16 2 1",\n};\n'
+
+
+@pytest.mark.parametrize(
+    "value, arguments",
+    [
+        ("AppRun %U", "%U"),
+        ("AppRun", ""),
+        ('"/opt/My App/run" %U', "%U"),
+        ('"/opt/My App/run"', ""),
+        (r'"/opt/say \"hi\"/run" --flag %F', "--flag %F"),
+        ("  app   --new-window  ", "--new-window"),
+    ],
+)
+def test_exec_arguments(value, arguments):
+    assert exec_arguments(value) == arguments
+
+
+def test_rewrite_keeps_arguments_of_a_quoted_program():
+    text = (
+        "[Desktop Entry]\n"
+        'Exec="/opt/My App/run" %U\n'
+        "TryExec=run\n"
+        "Icon=app\n"
+        "[Desktop Action new]\n"
+        'Exec="/opt/My App/run" --new-window\n'
+    )
+    rewritten = rewrite_desktop_entry(text, "/apps/My App.AppImage", "my-unicorn-app")
+    assert rewritten.splitlines() == [
+        "[Desktop Entry]",
+        'Exec="/apps/My App.AppImage" %U',
+        "TryExec=/apps/My App.AppImage",
+        "Icon=my-unicorn-app",
+        "[Desktop Action new]",
+        'Exec="/apps/My App.AppImage" --new-window',
+    ]
+
+
+def test_icon_extension():
+    assert icon_extension(PNG) == ".png"
+    assert icon_extension(SVG) == ".svg"
+    assert icon_extension(b"\xef\xbb\xbf<svg/>") == ".svg"
+    assert icon_extension(XPM) is None
+    assert icon_extension(b"\xff\xd8\xff\xe0JFIF") is None
+    assert icon_extension(b"<?xml version='1.0'?><html/>") is None
+
+
+def test_other_icon_formats_are_skipped(tmp_path):
+    entry = b"[Desktop Entry]\nName=App\nExec=AppRun %U\nIcon=app\n"
+    path = appimage(
+        str(tmp_path / "app.AppImage"),
+        {"app.desktop": entry, "app.svg": XPM, ".DirIcon": PNG},
+    )
+    text, icon, extension = read_integration(path)
+    assert text.startswith("[Desktop Entry]")
+    assert (icon, extension) == (PNG, ".png")
+
+    path = appimage(
+        str(tmp_path / "xpm.AppImage"), {"app.desktop": entry, ".DirIcon": XPM}
+    )
+    assert read_integration(path)[1:] == (None, None)
+
+
+def test_integration_is_opt_in(tmp_path):
+    assert not load_desktop_integrator(str(tmp_path / "missing.json")).enabled
+    settings = tmp_path / "desktop.json"
+    settings.write_text("{}", encoding="utf-8")
+    assert not load_desktop_integrator(str(settings)).enabled
+    settings.write_text('{"enabled": true}', encoding="utf-8")
+    assert load_desktop_integrator(str(settings)).enabled
@@ -0,0 +1,110 @@
+import os
+import json
+import pytest
+import src.engine as engine_module
+from src.engine import UpdateEngine
+from src.fleet import Fleet, HashRing, Membership, ReleaseStore
+
+REPOS = [f"owner{index}/app{index}" for index in range(300)]
+
+
+def test_ring_is_the_same_on_every_host():
+    first = HashRing(["host-a", "host-b", "host-c"])
+    second = HashRing(["host-c", "host-a", "host-b"])
+    assert [first.owner(repo) for repo in REPOS] == [
+        second.owner(repo) for repo in REPOS
+    ]
+    assert {first.owner(repo) for repo in REPOS} == {"host-a", "host-b", "host-c"}
+
+
+def test_joining_member_only_takes_repos():
+    before = HashRing(["host-a", "host-b", "host-c"])
+    after = HashRing(["host-a", "host-b", "host-c", "host-d"])
+    moved = [repo for repo in REPOS if before.owner(repo) != after.owner(repo)]
+    assert 0 < len(moved) < len(REPOS) / 2
+    assert all(after.owner(repo) == "host-d" for repo in moved)
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([]).owner("owner/app") is None
+
+
+def fleet(tmp_path, node_id):
+    membership = Membership(str(tmp_path / "members.json"), node_id)
+    return Fleet(membership, ReleaseStore(str(tmp_path / "store")))
+
+
+def test_only_the_owner_asks_github(tmp_path):
+    hosts = [fleet(tmp_path, "host-a"), fleet(tmp_path, "host-b")]
+    for host in hosts:
+        host.membership.heartbeat()
+    for host in hosts:
+        host.join()
+    repo = next(repo for repo in REPOS if hosts[0].owns(repo))
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"tag_name": "v2"}
+
+    assert hosts[0].release(repo, fetch) == {"tag_name": "v2"}
+    assert hosts[1].release(repo, fetch) == {"tag_name": "v2"}
+    assert len(calls) == 1
+
+
+def test_stale_release_is_checked_by_whoever_needs_it(tmp_path):
+    host = fleet(tmp_path, "host-b")
+    host.max_age = -1
+    host.ring = HashRing(["host-a"])
+    host.store.put("owner/app", {"tag_name": "v1"}, "host-a")
+    assert host.release("owner/app", lambda: {"tag_name": "v2"}) == {"tag_name": "v2"}
+
+
+def test_owner_keeps_a_probed_release_fresh(tmp_path):
+    owner, other = fleet(tmp_path, "host-a"), fleet(tmp_path, "host-b")
+    owner.ring = other.ring = HashRing(["host-a"])
+    path = owner.store._path("owner/app")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"release": {"tag_name": "v2"}, "checked_at": 0}, file)
+    assert other.shared_release("owner/app") is None
+
+    owner.confirm("owner/app", "1")  # not the stored release, nothing to confirm
+    assert other.shared_release("owner/app") is None
+    owner.confirm("owner/app", "2")
+    assert other.shared_release("owner/app") == {"tag_name": "v2"}
+    assert owner.shared_release("owner/app") is None
+
+
+def test_check_reads_other_hosts_repos_without_probing(tmp_path, monkeypatch):
+    host = fleet(tmp_path / "shared", "host-b")
+    host.join = lambda: None
+    host.ring = HashRing(["host-a", "host-b"])
+    ours = next(repo for repo in REPOS if host.owns(repo))
+    theirs = next(repo for repo in REPOS if not host.owns(repo))
+    host.store.put(theirs, {"tag_name": "v2"}, "host-a")
+    for key in (ours, theirs):
+        owner, repo = key.split("/")
+        (tmp_path / f"{repo}.json").write_text(
+            json.dumps(
+                {"owner": owner, "repo": repo, "version": "1", "hash_type": "sha256"}
+            ),
+            encoding="utf-8",
+        )
+
+    probed = []
+
+    def probe(owner, repo, version, update_info, atom_fallback):
+        probed.append(f"{owner}/{repo}")
+        return True
+
+    monkeypatch.setattr(engine_module, "probed_up_to_date", probe)
+    engine = UpdateEngine(str(tmp_path), fleet=host, probe_backend="web")
+    engine.latest_release = lambda config, update_info=None: pytest.fail(
+        "no API call expected"
+    )
+    results = {result.repo: result for result in engine.check()}
+    assert probed == [ours]
+    assert results[ours.split("/")[1]].status == "up_to_date"
+    assert results[theirs.split("/")[1]].status == "outdated"
+    assert results[theirs.split("/")[1]].version == "2"
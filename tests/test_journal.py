@@ -0,0 +1,92 @@
+import json
+import os
+from src.jobs import AppConfig, UpdateJob
+from src.journal import RunJournal, interrupted, merge_unfinished
+
+
+def job(repo, version="1.0"):
+    config = AppConfig(owner="o", repo=repo, version=version, hash_type="sha256")
+    return UpdateJob(config)
+
+
+def dead_run(directory, repos):
+    """Leave the journal of a run that died behind"""
+    journal = RunJournal(str(directory))
+    journal.begin([job(repo) for repo in repos])
+    journal.release()
+    return journal
+
+
+def test_finished_run_leaves_nothing(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    journal.begin([job("a")])
+    journal.mark("a", "config_written", version="2.0")
+    assert journal.unfinished() == {}
+    journal.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_mark_ignores_apps_outside_the_run(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    journal.begin([job("a")])
+    journal.mark("other", "checked")
+    with open(journal.path, encoding="utf-8") as file:
+        assert list(json.load(file)["apps"]) == ["a"]
+    journal.close()
+
+
+def test_live_runs_are_not_adopted(tmp_path):
+    live = RunJournal(str(tmp_path))
+    live.begin([job("a")])
+    assert interrupted(str(tmp_path)) == []
+    live.close()
+
+
+def test_dead_runs_are_adopted_once(tmp_path):
+    dead = dead_run(tmp_path, ["a", "b"])
+    dead_run(tmp_path, ["c"])
+    adopted = interrupted(str(tmp_path))
+    assert len(adopted) == 2
+    # held by this process now, a second resume doesn't take them too
+    assert interrupted(str(tmp_path)) == []
+    assert dead.run_id in {journal.run_id for journal in adopted}
+    for journal in adopted:
+        journal.close()
+    assert interrupted(str(tmp_path)) == []
+
+
+def test_empty_and_corrupt_journals_are_dropped(tmp_path):
+    empty = dead_run(tmp_path, [])
+    corrupt = tmp_path / "1-corrupt.json"
+    corrupt.write_text("{", encoding="utf-8")
+    assert interrupted(str(tmp_path)) == []
+    assert not os.path.exists(empty.path)
+    assert not corrupt.exists()
+
+
+def test_unfinished_entries_keep_the_recovery_details(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    journal.begin([job("a"), job("b")])
+    journal.mark("a", "backed_up", version="2.0", backup="/backup/a.AppImage")
+    journal.mark("b", "config_written")
+    journal.release()
+    (adopted,) = interrupted(str(tmp_path))
+    entry = adopted.unfinished()["a"]
+    assert entry["stage"] == "backed_up"
+    assert entry["backup"] == "/backup/a.AppImage"
+    assert entry["from_version"] == "1.0"
+    assert "b" not in adopted.unfinished()
+    adopted.close()
+
+
+def test_merge_prefers_half_installed_then_newest(tmp_path):
+    older = dead_run(tmp_path, ["a", "b"])
+    older.mark("a", "installed", version="2.0")
+    older.mark("b", "checked")
+    newer = dead_run(tmp_path, ["a", "b"])
+    newer.mark("a", "downloaded")
+    newer.mark("b", "downloaded")
+    merged = merge_unfinished(interrupted(str(tmp_path)))
+    # a may be half installed by the older run, that entry is what to recover
+    assert merged["a"]["stage"] == "installed"
+    assert merged["b"]["stage"] == "downloaded"
@@ -0,0 +1,72 @@
+import pytest
+from src.locks import LockBusy, LockManager
+
+
+@pytest.fixture
+def lock_dir(tmp_path):
+    return str(tmp_path / "locks")
+
+
+def test_split_claims_apps_one_at_a_time(lock_dir):
+    first, second = LockManager(lock_dir), LockManager(lock_dir)
+    ours = first.claims(["a", "b"])
+    theirs = second.claims(["a", "b"])
+    assert ours.held == {} and theirs.held == {}
+
+    lock = ours.claim("a")
+    with pytest.raises(LockBusy):
+        theirs.claim("a")
+    # b is free until a job of either run reaches it
+    theirs.claim("b").release()
+    lock.release()
+    theirs.claim("a").release()
+
+
+def test_wait_claims_everything_up_front(lock_dir):
+    manager = LockManager(lock_dir, policy="wait", timeout=0.2)
+    claims = manager.claims(["b", "a", "a"])
+    assert sorted(claims.held) == ["a", "b"]
+    other = LockManager(lock_dir, policy="wait", timeout=0.2).claims(["a"])
+    assert other.held == {}
+    with pytest.raises(LockBusy):
+        other.claim("a")
+
+    lock = claims.claim("a")
+    assert lock.held and "a" not in claims.held
+    claims.release()  # b was never used
+    lock.release()
+    LockManager(lock_dir).claims(["a", "b"]).claim("b").release()
+
+
+def test_run_lock_policies(lock_dir):
+    shared = LockManager(lock_dir).run_lock()
+    LockManager(lock_dir).run_lock().release()
+    with pytest.raises(LockBusy):
+        LockManager(lock_dir, policy="skip").run_lock()
+    shared.release()
+
+    exclusive = LockManager(lock_dir, policy="skip").run_lock()
+    with pytest.raises(LockBusy):
+        LockManager(lock_dir).run_lock()
+    exclusive.release()
+
+
+def test_editing_excludes_runs_on_the_same_app(lock_dir):
+    manager = LockManager(lock_dir)
+    lock = manager.claims(["a"]).claim("a")
+    with pytest.raises(LockBusy):
+        with manager.editing("a"):
+            pass
+    with manager.editing("b"):
+        pass
+    lock.release()
+
+    bulk = manager.exclusive_lock()
+    with pytest.raises(LockBusy):
+        with manager.editing("a"):
+            pass
+    bulk.release()
+
+
+def test_unknown_policy_falls_back_to_split(lock_dir):
+    assert LockManager(lock_dir, policy="sometimes").policy == "split"
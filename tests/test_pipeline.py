@@ -0,0 +1,111 @@
+import pytest
+from src.diskspace import NotEnoughSpace
+from src.errors import UpdateError, UpToDate
+from src.jobs import AppConfig, JobResult, UpdateJob
+from src.pipeline import UpdatePipeline
+
+
+class FakeHandler:
+    """Stands in for FileHandler, fails in the stage given by outcome"""
+
+    def __init__(self, job, outcome):
+        self.repo = job.repo
+        self.version = "2.0"
+        self.published_at = "2026-01-02T03:04:05Z"
+        self.outcome = outcome
+        self.stages = []
+
+    def get_response(self):
+        if self.outcome == "up_to_date":
+            raise UpToDate()
+        if self.outcome == "no_space":
+            raise NotEnoughSpace("not enough space for app")
+
+    def journal_stage(self, stage):
+        self.stages.append(stage)
+
+    def space_needed(self):
+        return 0
+
+    def download(self):
+        if self.outcome == "download":
+            raise UpdateError("connection reset")
+        if self.outcome == "crash":
+            raise RuntimeError("boom")
+
+    def verify_sha(self):
+        return self.outcome != "verify"
+
+    def make_executable(self):
+        pass
+
+    def handle_file_operations(self, batch_mode=False):
+        assert batch_mode
+        if self.outcome == "install":
+            # e.g. a prompt answered with no inside a helper
+            raise SystemExit(1)
+
+
+def job(repo):
+    return UpdateJob(AppConfig(owner="o", repo=repo, version="1.0", hash_type="sha256"))
+
+
+def run(outcomes, **kwargs):
+    jobs = [job(repo) for repo in outcomes]
+    pipeline = UpdatePipeline(
+        lambda job: FakeHandler(job, outcomes[job.repo]), **kwargs
+    )
+    return {result.repo: result for result in pipeline.run(jobs)}
+
+
+@pytest.mark.parametrize(
+    "outcome, status, message",
+    [
+        ("up_to_date", "up_to_date", None),
+        ("no_space", "skipped", "not enough space for app"),
+        ("download", "failed", "download: connection reset"),
+        ("crash", "failed", "download: boom"),
+        ("verify", "failed", "verify"),
+        ("install", "failed", "install"),
+    ],
+)
+def test_errors_become_results(outcome, status, message):
+    result = run({"app": outcome})["app"]
+    assert (result.status, result.message) == (status, message)
+
+
+def test_one_failure_does_not_stop_the_batch():
+    results = run({"a": "download", "b": "ok", "c": "install", "d": "ok"})
+    assert {repo: result.status for repo, result in results.items()} == {
+        "a": "failed",
+        "b": "updated",
+        "c": "failed",
+        "d": "updated",
+    }
+    assert results["b"].version == "2.0"
+    assert results["b"].published_at == "2026-01-02T03:04:05Z"
+
+
+class FakeLock:
+    def __init__(self):
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+def test_claims_are_released_whatever_happens():
+    locks = {}
+
+    def claim(job):
+        if job.repo == "busy":
+            return None, JobResult(job.repo, "skipped", "locked")
+        locks[job.repo] = FakeLock()
+        return locks[job.repo], job
+
+    results = run({"busy": "ok", "a": "ok", "b": "verify"}, claim=claim)
+    assert results["busy"].status == "skipped"
+    assert results["a"].status == "updated"
+    assert results["b"].status == "failed"
+    assert sorted(locks) == ["a", "b"]
+    assert all(lock.released for lock in locks.values())
@@ -0,0 +1,81 @@
+from src.jobs import AppConfig, JobResult
+from src.planner import plan_updates
+
+MB = 1024 * 1024
+
+
+def outdated(repo, size):
+    return JobResult(repo, "outdated", version="2.0", size=size)
+
+
+def configs(tmp_path, installed=None):
+    """AppConfigs of a, b, c and unknown, with installed {repo: bytes}"""
+    result = {}
+    for repo in ("a", "b", "c", "unknown"):
+        result[repo] = AppConfig(
+            owner="o",
+            repo=repo,
+            version="1.0",
+            hash_type="sha256",
+            appimage_folder=str(tmp_path),
+        )
+    for repo, size in (installed or {}).items():
+        with open(result[repo].installed_path, "wb") as file:
+            file.truncate(size)
+    return result
+
+
+def test_smallest_first_unknown_last(tmp_path):
+    plan = plan_updates(
+        [outdated("unknown", None), outdated("b", 20 * MB), outdated("a", 10 * MB)],
+        configs(tmp_path),
+    )
+    assert plan.repos == ["a", "b", "unknown"]
+    assert plan.deferred == ()
+
+
+def test_installed_size_stands_in_for_a_missing_one(tmp_path):
+    plan = plan_updates(
+        [outdated("a", 10 * MB), outdated("c", None)],
+        configs(tmp_path, {"c": 5 * MB}),
+        rate=MB,
+    )
+    assert plan.repos == ["c", "a"]
+    job = plan.scheduled[0]
+    assert (job.size, job.estimated, job.eta) == (5 * MB, True, 5)
+    assert not plan.scheduled[1].estimated
+
+
+def test_estimates_count_against_the_budget(tmp_path):
+    plan = plan_updates(
+        [outdated("a", 10 * MB), outdated("c", None)],
+        configs(tmp_path, {"c": 50 * MB}),
+        max_bytes=30 * MB,
+    )
+    assert plan.repos == ["a"]
+    assert [job.repo for job in plan.deferred] == ["c"]
+
+
+def test_unknown_sizes_never_fit_a_budget(tmp_path):
+    results = [outdated("a", 10 * MB), outdated("unknown", None)]
+    plan = plan_updates(results, configs(tmp_path), max_bytes=100 * MB)
+    assert plan.repos == ["a"]
+    assert [job.repo for job in plan.deferred] == ["unknown"]
+
+    plan = plan_updates(results, configs(tmp_path), rate=MB, max_seconds=3600)
+    assert [job.repo for job in plan.deferred] == ["unknown"]
+
+    # without a rate a time budget doesn't apply at all
+    plan = plan_updates(results, configs(tmp_path), max_seconds=3600)
+    assert plan.repos == ["a", "unknown"]
+
+
+def test_priority_order(tmp_path):
+    apps = configs(tmp_path)
+    apps["b"] = AppConfig(
+        owner="o", repo="b", version="1.0", hash_type="sha256", priority=5
+    )
+    plan = plan_updates(
+        [outdated("a", 10 * MB), outdated("b", 20 * MB)], apps, order="priority"
+    )
+    assert plan.repos == ["b", "a"]
@@ -0,0 +1,55 @@
+import os
+import pytest
+from src.cache import ArtifactCache
+from src.diskspace import NotEnoughSpace, SpaceLedger
+from src.file_handler import FileHandler
+
+DIGEST = "sha256:" + "ab" * 32
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    handler = FileHandler(
+        file_path=str(tmp_path / "config_files"),
+        appimage_folder=str(tmp_path / "apps"),
+        artifact_cache=ArtifactCache(str(tmp_path / "cache")),
+        repo="app",
+    )
+    handler.asset_size = 1000
+    handler.asset_digest = DIGEST
+    return handler
+
+
+def test_uncached_release_needs_room_in_the_cache(handler, tmp_path):
+    assert (str(tmp_path / "cache"), 1000) in handler.space_needed()
+
+
+def test_cached_release_needs_no_cache_room(handler, tmp_path):
+    path = handler.artifact_cache.path_for("sha256", "ab" * 32)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as file:
+        file.write(b"x" * 1000)
+    needs = handler.space_needed()
+    assert all(folder != str(tmp_path / "cache") for folder, _size in needs)
+    assert len(needs) == 2
+
+
+def test_every_copy_is_reserved_on_the_same_filesystem(handler):
+    ledger = SpaceLedger(margin=0)
+    reservation = ledger.reserve("app", handler.space_needed())
+    # download, install and cache copy all land on tmp_path's filesystem
+    assert list(reservation.needs.values()) == [3000]
+    ledger.release("app")
+    assert set(ledger.reserved.values()) == {0}
+
+
+def test_unknown_size_reserves_nothing(handler):
+    handler.asset_size = None
+    assert handler.space_needed() == []
+
+
+def test_job_that_cannot_fit_is_refused(handler):
+    handler.asset_size = 2**62
+    with pytest.raises(NotEnoughSpace):
+        SpaceLedger(margin=0).reserve("app", handler.space_needed())
@@ -0,0 +1,78 @@
+import pytest
+from tests.images import appimage
+from src.squashfs import SquashfsError, _zstd_decompress, open_appimage
+
+
+def test_zstd_block_round_trip():
+    zstandard = pytest.importorskip("zstandard")
+    block = zstandard.ZstdCompressor().compress(b"[Desktop Entry]\n" * 8)
+    assert _zstd_decompress(block) == b"[Desktop Entry]\n" * 8
+
+
+def test_corrupt_zstd_block_is_a_squashfs_error():
+    pytest.importorskip("zstandard")
+    with pytest.raises(SquashfsError):
+        _zstd_decompress(b"\x28\xb5\x2f\xfd not a zstd frame")
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = appimage(
+        str(tmp_path / "app.AppImage"),
+        {
+            "app.desktop": b"[Desktop Entry]\nName=App\nIcon=app\n",
+            "app.png": b"\x89PNG" + b"i" * 200,
+            ".DirIcon": ("link", "app.png"),
+            "usr": {
+                "bin": {"app": b"#!/bin/sh\n"},
+                "share": {"icon": ("link", "../../app.png")},
+            },
+            "outside": ("link", "/etc/passwd"),
+            "big": b"0123456789" * 30000,
+        },
+        update_info="gh-releases-zsync|o|app|latest|App-*x86_64.AppImage.zsync",
+    )
+    with open_appimage(path) as opened:
+        yield opened
+
+
+def test_lookup_files_and_directories(image):
+    assert sorted(image.listdir(image.root()))[:3] == [
+        ".DirIcon",
+        "app.desktop",
+        "app.png",
+    ]
+    desktop = image.lookup("app.desktop")
+    assert desktop.is_file
+    assert image.read_file(desktop).startswith(b"[Desktop Entry]")
+    assert image.read_file(image.lookup("usr/bin/app")) == b"#!/bin/sh\n"
+    assert image.lookup("usr/bin").is_dir
+    assert image.lookup("./usr/../usr/bin/app").is_file
+
+
+def test_lookup_follows_relative_links_only(image):
+    icon = image.lookup(".DirIcon")
+    assert image.read_file(icon).startswith(b"\x89PNG")
+    assert image.read_file(image.lookup("usr/share/icon")) == image.read_file(icon)
+    assert image.lookup("outside") is None
+
+
+def test_lookup_missing_paths(image):
+    assert image.lookup("nothing") is None
+    assert image.lookup("app.desktop/child") is None
+    assert image.lookup("usr/bin/nothing") is None
+
+
+def test_read_file_with_blocks_and_a_fragment(image):
+    big = image.lookup("big")
+    assert len(big.block_sizes) == 2 and big.fragment != 0xFFFFFFFF
+    assert image.read_file(big) == b"0123456789" * 30000
+    assert image.read_file(big, 25) == b"0123456789012345678901234"
+
+
+def test_garbage_is_not_an_image(tmp_path):
+    path = tmp_path / "broken.AppImage"
+    path.write_bytes(b"\x7fELF" + b"\0" * 200)
+    with pytest.raises(SquashfsError):
+        with open_appimage(str(path)):
+            pass
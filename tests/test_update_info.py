@@ -0,0 +1,48 @@
+from src.update_info import UpdateInfo, read_elf_section, read_update_info
+from tests.images import appimage, elf
+
+
+def test_parse_github_releases():
+    info = UpdateInfo.parse(
+        "gh-releases-zsync|owner|app|latest|App-*x86_64.AppImage.zsync"
+    )
+    assert info.is_github
+    assert (info.owner, info.repo, info.release) == ("owner", "app", "latest")
+    assert info.asset_pattern == "App-*x86_64.AppImage"
+    assert info.api_url == "https://api.github.com/repos/owner/app/releases/latest"
+
+
+def test_parse_empty_release_means_latest():
+    info = UpdateInfo.parse("gh-releases-zsync|owner|app||App.AppImage.zsync\n")
+    assert info.release == "latest"
+
+
+def test_parse_zsync_and_unknown():
+    info = UpdateInfo.parse("zsync|https://example.com/App.AppImage.zsync")
+    assert not info.is_github
+    assert info.url == "https://example.com/App.AppImage.zsync"
+    assert UpdateInfo.parse("bintray-zsync|a|b|c|d") is None
+    assert UpdateInfo.parse("gh-releases-zsync|too|few") is None
+
+
+def test_read_update_info_from_the_elf_section(tmp_path):
+    path = appimage(
+        str(tmp_path / "app.AppImage"),
+        {"app.desktop": b"[Desktop Entry]\n"},
+        update_info="gh-releases-zsync|o|app|latest|*.AppImage.zsync",
+    )
+    info = read_update_info(path)
+    assert (info.owner, info.repo) == ("o", "app")
+
+
+def test_files_without_update_info(tmp_path):
+    no_section = tmp_path / "plain.AppImage"
+    no_section.write_bytes(elf({".text": b"\x90" * 16}))
+    assert read_update_info(str(no_section)) is None
+    assert read_elf_section(str(no_section), ".text") == b"\x90" * 16
+
+    for name, data in (("empty", b""), ("truncated", elf()[:40]), ("text", b"hello")):
+        path = tmp_path / name
+        path.write_bytes(data)
+        assert read_update_info(str(path)) is None
+    assert read_update_info(str(tmp_path / "missing")) is None
@@ -0,0 +1,54 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.watchdog import DownloadGuard, TransferStalled
+
+
+class TrickleHandler(BaseHTTPRequestHandler):
+    """Announce 1 MiB, then send 10 bytes every half second"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(1024 * 1024))
+        self.end_headers()
+        try:
+            while not self.server.stopping.is_set():
+                self.wfile.write(b"x" * 10)
+                self.wfile.flush()
+                time.sleep(0.5)
+        except OSError:
+            pass
+
+
+class Progress:
+    def advance(self, amount):
+        pass
+
+    def restart(self):
+        pass
+
+
+@pytest.fixture
+def trickle_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TrickleHandler)
+    server.daemon_threads = True
+    server.stopping = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/app.AppImage"
+    server.stopping.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_trickling_server_is_cut_off(trickle_url, tmp_path):
+    guard = DownloadGuard(min_rate=1024, window=3, reconnects=0)
+    started = time.monotonic()
+    with pytest.raises(TransferStalled):
+        guard.fetch(trickle_url, str(tmp_path / "app.part"), Progress())
+    # one window plus a check interval, not the whole trickle
+    assert time.monotonic() - started < 8